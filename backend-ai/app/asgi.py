@@ -0,0 +1,474 @@
+"""
+Production entry point: REST + Socket.IO trên asyncio (uvicorn), CPU chạy trong process pool.
+
+    python -m app.asgi --port 8080 --cpu-workers 4
+    uvicorn app.asgi:asgi_app --host 0.0.0.0 --port 8080      # CPU_WORKERS qua env
+
+- Socket.IO: python-socketio AsyncServer; decode/MediaPipe/classify của mỗi frame chạy trong
+  1 trong CPU_WORKERS process con (app/services/cpu_worker.py). Mỗi sid luôn gắn với cùng 1
+  process nên detector tracking-mode của client nằm ở đúng 1 chỗ.
+- REST (Flask app trong app/main.py, import ở request đầu tiên) chạy trên thread pool REST_THREADS;
+  decode/MediaPipe/classify của route ảnh cũng chạy trong CPU worker (offload_service) nên
+  process cha không bao giờ load model / detector.
+- /metrics, /healthz của process cha gộp histogram + stats của mọi CPU worker (WorkerPool.snapshots,
+  tối đa WORKER_STATS_TIMEOUT giây / lần, worker bận → snapshot lần trước).
+- Nhiều process / node: đặt SOCKETIO_MESSAGE_QUEUE=redis://... và sticky session ở LB
+  (xem app/services/cluster_service.py). SIGTERM → drain session rồi mới thoát.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+import socketio
+from app.services import cpu_worker, metrics_service, offload_service
+from app.services.cluster_service import async_client_manager, NODE_ID, STICKY_COOKIE, DRAIN_TIMEOUT
+from app.services.log_service import get_logger
+from app.services.warmup_service import warmup, WARMUP_ON_START
+from app.services.session_service import FRAME_STATS_EVERY, MAX_TARGET_FPS
+
+log = get_logger("asgi")
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+REST_THREADS = int(os.getenv("REST_THREADS", "16"))
+MAX_SOCKET_BUFFER = int(os.getenv("MAX_SOCKET_BUFFER", str(1024 * 1024)))   # bytes / message
+WSGI_SPOOL_BYTES = int(os.getenv("WSGI_SPOOL_BYTES", str(1024 * 1024)))     # body REST lớn hơn → file tạm
+WORKER_STATS_TIMEOUT = float(os.getenv("WORKER_STATS_TIMEOUT", "2"))        # giây chờ snapshot metrics của worker
+
+
+class WorkerPool:
+    """
+    CPU_WORKERS process con, mỗi process 1 executor riêng (max_workers=1) để sid → process cố định:
+    tracking session + ROI của client luôn ở cùng process.
+    """
+
+    def __init__(self, size=CPU_WORKERS):
+        self.size = max(1, int(size))
+        ctx = multiprocessing.get_context("spawn")   # parent có thread (reaper, batcher) → không fork
+        self._executors = [
+            ProcessPoolExecutor(max_workers=1, mp_context=ctx, initializer=cpu_worker.init_worker)
+            for _ in range(self.size)
+        ]
+        self.calls = [0] * self.size
+        self._snapshots = [None] * self.size
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()
+
+    def index_for(self, key):
+        """sid / content key → process cố định; int → chỉ số worker; None → xoay vòng."""
+        if key is None:
+            return next(self._round_robin) % self.size
+        if isinstance(key, int):
+            return key % self.size
+        return zlib.crc32(key.encode() if isinstance(key, str) else key) % self.size
+
+    def submit(self, key, fn, *args):
+        """Gọi được từ mọi thread (route REST) → concurrent.futures.Future."""
+        i = self.index_for(key)
+        with self._lock:
+            self.calls[i] += 1
+        return self._executors[i].submit(fn, *args)
+
+    async def run(self, sid, fn, *args):
+        return await asyncio.wrap_future(self.submit(sid, fn, *args))
+
+    def warm_up(self):
+        """
+        Component `cpu_workers` của warm-up nền: spawn mọi worker cùng lúc (init_worker load model +
+        detector) rồi đợi tất cả. Worker load lỗi → BrokenProcessPool → component failed, /readyz 503.
+        """
+        start = time.time()
+        pids = [f.result() for f in [ex.submit(cpu_worker.ping) for ex in self._executors]]
+        log.info("Started %d CPU workers %s in %.2fs", self.size, pids, time.time() - start)
+
+    def snapshots(self, timeout=WORKER_STATS_TIMEOUT):
+        """
+        Metrics / stats của từng worker (metrics_service.process_snapshot) cho /metrics, /healthz của
+        process cha. Worker chưa trả lời sau timeout (đang load model, frame dài, đã chết) → snapshot
+        lần trước (None nếu chưa có lần nào).
+        """
+        futures = []
+        for ex in self._executors:
+            try:
+                futures.append(ex.submit(cpu_worker.metrics_snapshot))
+            except RuntimeError:   # BrokenProcessPool / đã shutdown
+                futures.append(None)
+        wait([f for f in futures if f is not None], timeout)
+        with self._lock:
+            for i, fut in enumerate(futures):
+                if fut is None:
+                    continue
+                if fut.done() and not fut.cancelled() and fut.exception() is None:
+                    self._snapshots[i] = fut.result()
+                else:
+                    fut.cancel()
+            return list(self._snapshots)
+
+    def shutdown(self):
+        for ex in self._executors:
+            ex.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        return {"size": self.size, "calls": list(self.calls)}
+
+
+def _wsgi_environ(scope, body):
+    """ASGI http scope → WSGI environ (PEP 3333)."""
+    path, root = scope["path"], scope.get("root_path", "")
+    if root and path.startswith(root):
+        path = path[len(root):]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root.encode("utf8").decode("latin1"),
+        "PATH_INFO": path.encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("ascii"),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin1"), value.decode("latin1")
+        if name == "content-length":
+            key = "CONTENT_LENGTH"
+        elif name == "content-type":
+            key = "CONTENT_TYPE"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class ThreadedWsgiToAsgi:
+    """
+    Chạy Flask (WSGI) sau uvicorn: mỗi request chạy trên thread pool `threads`, song song thật sự
+    (WsgiToAsgi của asgiref chạy mọi request trên cùng 1 thread → REST tuần tự).
+    Chỉ dùng giao diện ASGI / WSGI công khai: body request đọc trên event loop (spool ra file tạm
+    khi lớn), response gửi lại event loop từ thread qua run_coroutine_threadsafe.
+    load_app() (import Flask app) chỉ chạy ở request đầu tiên, trong thread pool.
+    """
+
+    def __init__(self, load_app, threads=REST_THREADS):
+        self.wsgi_application = None
+        self._load_app = load_app
+        self._load_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="rest")
+
+    def _app(self):
+        with self._load_lock:
+            if self.wsgi_application is None:
+                self.wsgi_application = self._load_app()
+            return self.wsgi_application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close"})
+            return
+        body = tempfile.SpooledTemporaryFile(max_size=WSGI_SPOOL_BYTES)
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                body.close()
+                return
+            body.write(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body.seek(0)
+
+        loop = asyncio.get_running_loop()
+        app = self.wsgi_application
+        if app is None:
+            app = await loop.run_in_executor(self.executor, self._app)
+        try:
+            await loop.run_in_executor(self.executor, self._run, app, _wsgi_environ(scope, body), send, loop)
+        finally:
+            body.close()
+
+    @staticmethod
+    def _run(app, environ, send, loop):
+        """Trong thread REST: gọi app WSGI, đẩy từng chunk response về event loop."""
+        response = {}
+
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def write(data):
+            if "sent" not in response:
+                emit(response["start"])
+                response["sent"] = True
+            if data:
+                emit({"type": "http.response.body", "body": bytes(data), "more_body": True})
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and "sent" in response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["start"] = {
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers],
+            }
+            return write
+
+        result = app(environ, start_response)
+        try:
+            for chunk in result:
+                write(chunk)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        write(b"")
+        emit({"type": "http.response.body", "body": b""})
+
+
+def _load_flask_app():
+    from app.main import app
+    return app
+
+
+class FrameSlot:
+    """
+    "Latest frame wins" của 1 client trên event loop (cùng ngữ nghĩa Session.run_latest):
+    tối đa 1 frame đang ở worker + 1 frame chờ; frame chờ cũ bị thay bằng frame mới hơn.
+    """
+
+    def __init__(self):
+        self.busy = False
+        self.pending = None
+        self.target_fps = None
+        self._last_accepted = 0.0
+        self.received = self.processed = self.dropped = self.rate_limited = 0
+        self.reused = self.classified = self.suppressed = 0   # motion gate / smoothing trong CPU worker
+
+    def set_target_fps(self, fps):
+        self.target_fps = min(float(fps), MAX_TARGET_FPS) if fps else None
+
+    async def run_latest(self, frame, process):
+        now = time.monotonic()
+        self.received += 1
+        if self.target_fps and now - self._last_accepted < 1.0 / self.target_fps:
+            self.rate_limited += 1
+            self.dropped += 1
+            return False
+        self._last_accepted = now
+        if self.busy:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = frame
+            return False
+
+        self.busy = True
+        try:
+            while frame is not None:
+                await process(frame)
+                self.processed += 1
+                frame, self.pending = self.pending, None
+        finally:
+            self.busy, self.pending = False, None
+        return True
+
+    def should_report(self):
+        return FRAME_STATS_EVERY > 0 and self.processed % FRAME_STATS_EVERY == 0
+
+    def record(self, counters):
+        self.reused, self.classified = counters["reused"], counters["classified"]
+        self.suppressed = counters["suppressed"]
+
+    def frame_stats(self):
+        total = self.reused + self.classified
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "rate_limited": self.rate_limited,
+            "target_fps": self.target_fps,
+            "reused": self.reused,
+            "skip_rate": round(self.reused / total, 3) if total else 0.0,
+            "suppressed": self.suppressed,
+        }
+
+
+# =====================================
+# 🔌 SOCKET.IO (async)
+# =====================================
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*", client_manager=async_client_manager(),
+                           cookie=STICKY_COOKIE, max_http_buffer_size=MAX_SOCKET_BUFFER)
+workers = WorkerPool()
+offload_service.set_runner(workers)   # trước khi import app.main: route REST gửi CPU sang workers
+slots = {}
+draining = False
+
+
+@metrics_service.register_gauges
+def _asgi_gauges():
+    if not offload_service.offloaded():
+        return {}   # CPU worker import lại module này (spawn, __mp_main__): không báo pool / socket của nó
+    return {
+        "asl_asgi_sockets": ("Connected Socket.IO clients on this process", len(slots)),
+        "asl_asgi_draining": ("1 while this node drains sessions before shutdown", int(draining)),
+        "asl_asgi_cpu_workers": ("CPU worker processes", workers.size),
+        "asl_asgi_worker_calls_total": ("Calls dispatched to each CPU worker",
+                                        {f'worker="{i}"': n for i, n in enumerate(workers.calls)}),
+    }
+
+
+@sio.event
+async def connect(sid, environ):
+    if draining:
+        return False   # LB / client reconnect sang node khác
+    slots[sid] = FrameSlot()
+    await workers.run(sid, cpu_worker.open_session, sid)
+    await sio.emit("server_status", {"status": "connected", "node": NODE_ID}, to=sid)
+
+
+@sio.event
+async def disconnect(sid):
+    slots.pop(sid, None)
+    await workers.run(sid, cpu_worker.close_session, sid)
+
+
+@sio.event
+async def set_fps(sid, data):
+    slot = slots.get(sid)
+    if slot is None:
+        return
+    try:
+        slot.set_target_fps((data or {}).get("fps"))
+    except (TypeError, ValueError, AttributeError):
+        await sio.emit("frame_stats", {"error": "Invalid fps"}, to=sid)
+        return
+    await sio.emit("frame_stats", slot.frame_stats(), to=sid)
+
+
+@sio.event
+async def frame(sid, data):
+    slot = slots.get(sid)
+    if slot is None:
+        return
+
+    async def _process(f):
+        payload, counters = await workers.run(sid, cpu_worker.process_frame, sid, f)
+        slot.record(counters)
+        if payload is not None:   # None → nhãn ổn định không đổi (emit-on-change)
+            await sio.emit("prediction", payload, to=sid)
+        if slot.should_report():
+            await sio.emit("frame_stats", slot.frame_stats(), to=sid)
+
+    await slot.run_latest(data, _process)
+
+
+@sio.event
+async def keypoints(sid, data):
+    if sid not in slots:
+        return
+    event, payload = await workers.run(sid, cpu_worker.process_keypoints, data)
+    await sio.emit(event, payload, to=sid)
+
+
+# =====================================
+# 🌐 ASGI APP
+# =====================================
+async def _on_startup():
+    # không await warm-up: /healthz trả lời ngay, /readyz 503 tới khi mọi CPU worker load xong
+    warmup.add("cpu_workers", workers.warm_up)
+    if WARMUP_ON_START:
+        warmup.start()
+
+
+async def drain(timeout=DRAIN_TIMEOUT):
+    """
+    Ngừng nhận client mới, báo `draining` cho client của node này, đợi frame đang xử lý
+    rồi ngắt kết nối và đóng tracking session trong mọi CPU worker. Gọi lại nhiều lần không sao.
+    """
+    global draining
+    if draining:
+        return
+    draining = True
+    local = list(slots)
+    log.info("Draining %d sockets on %s", len(local), NODE_ID)
+    # emit từng sid (không broadcast): với Redis manager broadcast sẽ tới client của mọi node
+    for sid in local:
+        await sio.emit("server_status", {"status": "draining", "node": NODE_ID}, to=sid)
+
+    deadline = time.monotonic() + timeout
+    while any(slot.busy for slot in slots.values()) and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    for sid in local:
+        await sio.disconnect(sid)
+
+    loop = asyncio.get_running_loop()
+    remaining = max(0.0, deadline - time.monotonic())
+    closed = await asyncio.gather(*(loop.run_in_executor(ex, cpu_worker.drain_sessions, remaining)
+                                    for ex in workers._executors))
+    log.info("Drained %d tracking sessions", sum(closed))
+
+
+async def _on_shutdown():
+    await drain()
+    workers.shutdown()
+
+
+def build_app(rest_threads=REST_THREADS):
+    """Socket.IO + REST (thread pool rest_threads) → ASGI app cho uvicorn."""
+    return socketio.ASGIApp(sio, other_asgi_app=ThreadedWsgiToAsgi(_load_flask_app, rest_threads),
+                            on_startup=_on_startup, on_shutdown=_on_shutdown)
+
+
+asgi_app = build_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    class DrainingServer(uvicorn.Server):
+        """SIGTERM/SIGINT đầu tiên → drain khi server vẫn đang chạy; lần 2 → thoát ngay."""
+
+        def handle_exit(self, sig, frame):
+            if draining or self.should_exit:
+                return super().handle_exit(sig, frame)
+            loop = asyncio.get_event_loop()
+            loop.call_soon_threadsafe(lambda: loop.create_task(self._drain_and_exit(sig, frame)))
+
+        async def _drain_and_exit(self, sig, frame):
+            try:
+                await drain()
+            finally:
+                super().handle_exit(sig, frame)
+
+    parser = argparse.ArgumentParser(description="ASL backend — production server (uvicorn + process pool)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--cpu-workers", type=int, default=CPU_WORKERS, help="Số process chạy MediaPipe/classifier")
+    parser.add_argument("--rest-threads", type=int, default=REST_THREADS, help="Thread pool cho route Flask")
+    parser.add_argument("--max-connections", type=int, default=1000, help="uvicorn limit_concurrency")
+    args = parser.parse_args()
+
+    if args.cpu_workers != workers.size:
+        workers.shutdown()
+        workers = WorkerPool(args.cpu_workers)
+        offload_service.set_runner(workers)
+    if args.rest_threads != REST_THREADS:
+        asgi_app = build_app(args.rest_threads)
+    print(f"🚀 ASL backend (production) on http://{args.host}:{args.port} — node {NODE_ID}, "
+          f"{workers.size} CPU workers, {args.rest_threads} REST threads")
+    config = uvicorn.Config(asgi_app, host=args.host, port=args.port, limit_concurrency=args.max_connections,
+                            backlog=2048, log_level="warning")
+    DrainingServer(config).run()
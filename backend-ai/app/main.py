@@ -1,45 +1,67 @@
-from flask import Flask, jsonify, request
+import time
+_import_start = time.time()
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-from flasgger import Swagger
-import base64, cv2, numpy as np, mediapipe as mp, os, json
-from app.services.classifier_service import classifier_predict
+import atexit, os, json
+# mediapipe / cv2 / model chỉ được import-load lười (warm-up nền hoặc request đầu tiên)
+from app.services.classifier_service import disable_batching, get_model
+from app.services.detector_pool import get_hands_pool, DetectorPoolTimeout
+from app.services.log_service import get_logger, StageTimer
+from app.services.metrics_service import render_prometheus, stats_snapshot
+from app.services.session_service import sessions
+from app.services.socket_service import classify_gated
+from app.services import motion_gate  # noqa: F401 — đăng ký section /healthz
+from app.services.smoothing_service import smooth
+from app.services.cluster_service import flask_socketio_options, cluster_info, NODE_ID, DRAIN_TIMEOUT
+from app.services.frame_codec import decode_frame
+from app.services.preprocess_service import detect_keypoints
+from app.services.result_cache import content_key
+from app.services.mediapipe_service import read_upload, UploadTooLarge
+from app.services.batch_predict_service import (
+    BatchInputError, collect_uploads, iter_batch_results, predict_batch, predict_upload, wants_stream,
+)
+from app.services.offload_service import offloaded, run_cpu
+from app.services.warmup_service import warmup, WARMUP_ON_START
+from app.services.keypoints_service import KeypointsError, parse_keypoints, predict_keypoints, keypoints_prediction
 
 # =====================================
 # ⚙️ INIT
 # =====================================
+SWAGGER_ENABLED = os.getenv("SWAGGER_ENABLED", "1") == "1"
+
 app = Flask(__name__)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
-swagger = Swagger(app)
+socketio = SocketIO(app, cors_allowed_origins="*", **flask_socketio_options())
+if SWAGGER_ENABLED:
+    from flasgger import Swagger
+    swagger = Swagger(app)
 
-mp_hands = mp.solutions.hands
+log = get_logger("main")
+atexit.register(sessions.drain, DRAIN_TIMEOUT)   # đóng detector của mọi session khi process thoát
 BENCHMARK_PATH = "app/models/model_benchmark.json"
 
+warmup.record("app_import", round(time.time() - _import_start, 3))
+if not offloaded():   # app/asgi.py: model + detector chỉ load trong CPU worker process
+    warmup.add("classifier", get_model)
+    warmup.add("detector_pool", get_hands_pool)
+    warmup.add("opencv", lambda: __import__("cv2"))
+else:
+    disable_batching()   # process cha không classify; CPU worker cũng tắt batcher (cpu_worker.init_worker)
+if WARMUP_ON_START:
+    warmup.start()
+
 # =====================================
 # 🔧 UTIL
 # =====================================
-def decode_base64_image(base64_string: str):
-    """Decode base64 image string -> OpenCV image."""
-    try:
-        img_data = base64.b64decode(base64_string.split(",")[1])
-        np_arr = np.frombuffer(img_data, np.uint8)
-        return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-    except Exception:
-        return None
-
-
-def extract_keypoints(img):
-    """Extract 21 Mediapipe hand keypoints from an image."""
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    with mp_hands.Hands(
-        static_image_mode=True, max_num_hands=1, min_detection_confidence=0.5
-    ) as hands:
-        result = hands.process(img_rgb)
-        if not result.multi_hand_landmarks:
-            return None
-        lm = result.multi_hand_landmarks[0]
-        return np.array([[p.x * 200, p.y * 200] for p in lm.landmark])
+def extract_keypoints(img, timer=None, session=None):
+    """
+    Extract 21 Mediapipe hand keypoints from an image.
+    session: detector tracking-mode + ROI của socket client; None → detector static từ pool.
+    """
+    if session is None:
+        return detect_keypoints(img, get_hands_pool(), timer)
+    return detect_keypoints(img, session, timer, roi=session.roi)
 
 
 # =====================================
@@ -47,29 +69,86 @@ def extract_keypoints(img):
 # =====================================
 @socketio.on("connect")
 def on_connect():
-    print("✅ [socket_service] Client connected")
-    emit("server_status", {"status": "connected"})
+    log.info("Client connected")
+    sessions.open(request.sid)
+    emit("server_status", {"status": "connected", "node": NODE_ID})
 
 
 @socketio.on("disconnect")
 def on_disconnect():
-    print("❌ [socket_service] Client disconnected")
+    log.info("Client disconnected")
+    sessions.close(request.sid)
+
+
+@socketio.on("set_fps")
+def handle_set_fps(data):
+    """Client yêu cầu tốc độ xử lý tối đa: {"fps": 10}; 0/null → không giới hạn."""
+    session = sessions.get(request.sid)
+    if session is None:
+        return
+    try:
+        session.set_target_fps((data or {}).get("fps"))
+    except (TypeError, ValueError, AttributeError):
+        emit("frame_stats", {"error": "Invalid fps"})
+        return
+    emit("frame_stats", session.frame_stats())
 
 
 @socketio.on("frame")
-def handle_frame(base64_frame):
-    img = decode_base64_image(base64_frame)
+def handle_frame(frame):
+    """frame: data URL base64 (client cũ) hoặc bytes JPEG/WebP + header tuỳ chọn (xem frame_codec)."""
+    session = sessions.get(request.sid)
+    if session is None:
+        process_frame(frame, None)
+        return
+
+    def _process(f):
+        process_frame(f, session)
+        if session.should_report():
+            emit("frame_stats", session.frame_stats())
+
+    # đang có frame xử lý dở → frame này chỉ thay frame chờ (latest frame wins)
+    session.run_latest(frame, _process)
+
+
+@socketio.on("keypoints")
+def handle_keypoints(data):
+    """21 landmark (x, y) chuẩn hoá do client tự detect (JSON hoặc float32 packed) → `prediction` / `predictions`."""
+    event, payload = keypoints_prediction(data)
+    emit(event, payload)
+
+
+def process_frame(frame, session):
+    timer = StageTimer("socket:frame")
+    with timer.stage("decode"):
+        img, meta = decode_frame(frame)
+    seq = {"seq": meta["seq"]} if "seq" in meta else {}
     if img is None:
-        emit("prediction", {"prediction": "INVALID", "confidence": 0})
+        emit("prediction", {"prediction": "INVALID", "confidence": 0, **seq})
+        timer.finish(result="INVALID")
         return
 
-    kps = extract_keypoints(img)
+    try:
+        kps = extract_keypoints(img, timer, session)
+    except DetectorPoolTimeout:
+        emit("prediction", {"prediction": "BUSY", "confidence": 0, **seq})
+        timer.finish(result="BUSY")
+        return
+    smoothing = session is not None and session.smoother is not None
     if kps is None:
-        emit("prediction", {"prediction": "NO_HAND", "confidence": 0})
+        if session is not None:
+            session.motion.reset()
+        payload = smooth(session, None, seq) if smoothing else {"prediction": "NO_HAND", "confidence": 0, **seq}
+        if payload is not None:
+            emit("prediction", payload)
+        timer.finish(result="NO_HAND")
         return
 
-    pred, conf = classifier_predict(kps)
-    emit("prediction", {"prediction": pred, "confidence": conf})
+    pred, conf, probs = classify_gated(kps, session, timer)
+    payload = smooth(session, probs, seq) if smoothing else {"prediction": pred, "confidence": conf, **seq}
+    if payload is not None:   # None → nhãn ổn định không đổi (emit-on-change)
+        emit("prediction", payload)
+    timer.finish(result=pred, confidence=round(conf, 3), binary=not isinstance(frame, str))
 
 
 # =====================================
@@ -105,28 +184,165 @@ def predict_image():
               example: 0.93
       400:
         description: Invalid input
+      413:
+        description: Upload exceeds MAX_UPLOAD_BYTES
+      503:
+        description: No free hand detector
     """
     if "file" not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
 
-    file = request.files["file"]
-    file_bytes = np.frombuffer(file.read(), np.uint8)
-    img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-    if img is None:
+    try:
+        data = read_upload(request.files["file"])
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+
+    key = content_key(data)
+    status, pred, conf = run_cpu(key, predict_upload, data, "/predict_image", key)
+    if status == "invalid":
         return jsonify({"error": "Invalid image"}), 400
+    if status == "busy":
+        return jsonify({"error": "Server busy, try again"}), 503
+    return jsonify({"prediction": pred, "confidence": conf})
 
-    kps = extract_keypoints(img)
-    if kps is None:
-        return jsonify({"prediction": "NO_HAND", "confidence": 0.0})
 
-    pred, conf = classifier_predict(kps)
-    return jsonify({"prediction": pred, "confidence": conf})
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch_route():
+    """
+    Upload many images (multipart `files` and/or .zip archives) and get one prediction per image.
+    Decode + detect chạy song song trên detector pool, classify 1 lần predict_proba cho cả batch.
+    ---
+    tags:
+      - Hand Sign Classification
+    consumes:
+      - multipart/form-data
+      - application/zip
+    parameters:
+      - name: files
+        in: formData
+        type: file
+        required: true
+        description: Image files or zip archives of images (repeat the field)
+      - name: stream
+        in: query
+        type: boolean
+        required: false
+        description: Stream NDJSON lines in completion order (or send Accept application/x-ndjson)
+    responses:
+      200:
+        description: Per-image results in input order
+        schema:
+          type: object
+          properties:
+            count:
+              type: integer
+              example: 2
+            results:
+              type: array
+              items:
+                type: object
+                properties:
+                  index:
+                    type: integer
+                    example: 0
+                  filename:
+                    type: string
+                    example: "a.jpg"
+                  prediction:
+                    type: string
+                    example: "A"
+                  confidence:
+                    type: number
+                    example: 0.93
+      400:
+        description: No files or invalid zip
+      413:
+        description: Too many images or batch too large
+    """
+    try:
+        items = collect_uploads(request.files.getlist("files") + request.files.getlist("file"),
+                                request.get_data() if not request.files else None, request.mimetype)
+    except BatchInputError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    timer = StageTimer("/predict/batch")
+    if wants_stream(request.args, request.headers.get("Accept")):
+        def generate():
+            for result in iter_batch_results(items, timer, stream=True):
+                yield json.dumps(result) + "\n"
+            timer.finish(images=len(items), stream=True)
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    results = predict_batch(items, timer)
+    timer.finish(images=len(items))
+    return jsonify({"count": len(results), "results": results})
+
+
+@app.route("/predict/keypoints", methods=["POST"])
+def predict_keypoints_route():
+    """
+    Predict from 21 hand landmarks detected on the client (no image upload, no server-side MediaPipe).
+    Body JSON [[x, y] * 21] (normalized 0..1, z optional), a batch of those, or {"keypoints": ...};
+    or application/octet-stream float32 little-endian x,y (N × 21 × 2).
+    ---
+    tags:
+      - Hand Sign Classification
+    consumes:
+      - application/json
+      - application/octet-stream
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            keypoints:
+              type: array
+              description: 21 [x, y] pairs, or a list of such hands
+              items:
+                type: array
+                items:
+                  type: number
+    responses:
+      200:
+        description: Prediction (single hand) or {"count", "results"} (batch)
+        schema:
+          type: object
+          properties:
+            prediction:
+              type: string
+              example: "A"
+            confidence:
+              type: number
+              example: 0.93
+      400:
+        description: Wrong shape or out-of-range landmarks
+    """
+    timer = StageTimer("/predict/keypoints")
+    try:
+        with timer.stage("parse"):
+            body = request.get_data() if request.mimetype == "application/octet-stream" else request.get_json(silent=True)
+            if body is None:
+                raise KeypointsError("Expected a JSON body or application/octet-stream")
+            kps, batched, _ = parse_keypoints(body)
+    except KeypointsError as e:
+        timer.finish(result="INVALID")
+        return jsonify({"error": str(e)}), 400
+
+    with timer.stage("classify"):
+        preds = run_cpu(None, predict_keypoints, kps)
+    timer.finish(result=preds[0][0] if len(preds) == 1 else "BATCH", hands=len(preds))
+    results = [{"prediction": p, "confidence": round(c, 3)} for p, c in preds]
+    if not batched:
+        return jsonify(results[0])
+    return jsonify({"count": len(results), "results": [{"index": i, **r} for i, r in enumerate(results)]})
 
 
 @app.route("/healthz", methods=["GET"])
 def healthz():
     """
-    Health check endpoint.
+    Liveness: trả lời ngay cả khi model / detector còn đang warm-up (xem /readyz).
     ---
     tags:
       - System
@@ -142,8 +358,86 @@ def healthz():
             msg:
               type: string
               example: "ASL backend is running"
+            ready:
+              type: boolean
+              example: true
+            startup:
+              type: object
+              description: Warm-up state and load time (seconds) of each component
+            detector_pool:
+              type: object
+              description: Hand detector pool usage (leases, waits, timeouts)
+            classifier_batching:
+              type: object
+              description: Micro-batching queue stats and batch-size histogram
+            cascade:
+              type: object
+              description: Cheap-model-first cascade (threshold, per-stage hit rates)
+            sessions:
+              type: object
+              description: Socket tracking sessions (active, evicted, rejected)
+            motion_gate:
+              type: object
+              description: Frames that reused the previous prediction because the hand barely moved
+            smoothing:
+              type: object
+              description: Temporal smoothing of socket predictions (emitted vs suppressed unchanged labels)
+            result_cache:
+              type: object
+              description: Upload result cache (entries, bytes, hits, misses)
+            uploads:
+              type: object
+              description: Upload decoding (bytes decoded, failures, oversize rejections)
+            cpu_workers:
+              type: array
+              description: Production server only — CPU worker pid and age of its stats snapshot (sections above are summed over workers)
+            cluster:
+              type: object
+              description: Node id, Socket.IO message queue (local / redis) and drain settings
+    """
+    return jsonify({
+        "status": "ok",
+        "msg": "ASL backend is running",
+        "ready": warmup.ready,
+        "startup": warmup.status(),
+        **stats_snapshot(),   # detector_pool, classifier_batching, ... (gộp CPU worker của app/asgi.py)
+        "cluster": cluster_info(),
+    })
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """
+    Readiness: 200 khi model + detector đã load xong (app/asgi.py: khi mọi CPU worker đã load xong),
+    503 khi đang warm-up hoặc load lỗi.
+    ---
+    tags:
+      - System
+    responses:
+      200:
+        description: Ready to serve predictions
+      503:
+        description: Still warming up (or a component failed to load)
+    """
+    warmup.start()   # WARMUP_ON_START=0 → warm-up bắt đầu ở readiness probe đầu tiên
+    status = warmup.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus metrics (per-stage latency p50/p95/p99, detector pool, micro-batching).
+    ---
+    tags:
+      - System
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Prometheus text exposition format
     """
-    return jsonify({"status": "ok", "msg": "ASL backend is running"})
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/stats", methods=["GET"])
@@ -213,5 +507,6 @@ def get_stats():
 if __name__ == "__main__":
     print("🚀 ASL WebSocket + REST backend running on http://localhost:8080")
     print("📘 Swagger UI: http://localhost:8080/apidocs")
+    print("⚠️  Dev server (Werkzeug) — production: python -m app.asgi --cpu-workers N")
     socketio.run(app, host="0.0.0.0", port=8080, allow_unsafe_werkzeug=True)
 
@@ -1,14 +1,23 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify
 from flasgger import swag_from
 import os
 from datetime import datetime
+from app.services import (  # noqa: F401 — import để đăng ký các section /healthz (register_stats)
+    classifier_service, detector_pool, mediapipe_service, motion_gate, result_cache, session_service,
+    smoothing_service,
+)
+from app.services.metrics_service import render_prometheus, stats_snapshot
+from app.services.cluster_service import cluster_info
+from app.services.warmup_service import warmup
 
 health_bp = Blueprint("health_bp", __name__)
 
 @swag_from({
     "tags": ["System"],
     "summary": "Health Check Endpoint",
-    "description": "Check if backend service is alive and provide environment info.",
+    "description": "Liveness: answers while models are still warming up (see /readyz). Provides environment info. "
+                   "Under the production server (app/asgi.py) every stats section is summed over the CPU worker "
+                   "processes and `cpu_workers` lists each worker's pid and snapshot age.",
     "responses": {
         200: {
             "description": "Service status OK",
@@ -17,7 +26,33 @@ health_bp = Blueprint("health_bp", __name__)
                     "status": "ok",
                     "service": "hand-detect-ai-backend",
                     "timestamp": "2025-11-07T08:12:15Z",
-                    "environment": "local"
+                    "environment": "local",
+                    "ready": True,
+                    "startup": {"ready": True, "uptime_s": 42.1, "components": {
+                        "app_import": {"state": "ready", "seconds": 0.41},
+                        "classifier": {"state": "ready", "seconds": 3.2},
+                        "detector_pool": {"state": "ready", "seconds": 1.1}}},
+                    "detector_pool": {"size": 2, "available": 2, "leases": 120, "waits": 3,
+                                      "wait_ratio": 0.025, "avg_wait_ms": 41.7, "wait_ms_total": 125.1,
+                                      "timeouts": 0, "loaded": True},
+                    "classifier_batching": {"max_batch_size": 16, "max_wait_ms": 2.0, "queued": 0,
+                                            "batches": 80, "items": 120, "avg_batch_size": 1.5,
+                                            "batch_size_histogram": {"1": 60, "2": 10, "4": 10}},
+                    "cascade": {"enabled": True, "threshold": 0.87, "cheap_model": "ExtraTreesClassifier",
+                                "cheap_hits": 104, "fallthrough": 16, "cheap_hit_rate": 0.867},
+                    "sessions": {"active": 3, "max_sessions": 200, "idle_timeout_s": 60.0,
+                                 "opened": 12, "closed": 8, "evicted": 1, "rejected": 0},
+                    "motion_gate": {"threshold": 0.04, "refresh_every": 10, "reused": 310, "classified": 95,
+                                    "skip_rate": 0.765},
+                    "smoothing": {"enabled": True, "window": 7, "ema_alpha": 0.3, "prob_threshold": 0.45,
+                                  "emit_on_change": True, "emitted": 62, "suppressed": 343,
+                                  "suppressed_ratio": 0.847},
+                    "result_cache": {"enabled": True, "entries": 40, "bytes": 16960, "hits": 25,
+                                     "misses": 40, "hit_ratio": 0.38, "evictions": 0, "expired": 0},
+                    "uploads": {"max_upload_bytes": 10485760, "decoded_bytes": 5242880, "decoded_images": 40,
+                                "decode_failures": 1, "rejected_uploads": 0},
+                    "cluster": {"node": "api-1-4021", "message_queue": "redis", "sticky_cookie": "asl_node",
+                                "drain_timeout_s": 10.0}
                 }
             }
         }
@@ -30,4 +65,37 @@ def health_check():
         "service": os.getenv("SERVICE_NAME", "hand-detect-ai-backend"),
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "environment": os.getenv("ENVIRONMENT", "local"),
+        "ready": warmup.ready,
+        "startup": warmup.status(),
+        **stats_snapshot(),   # detector_pool, classifier_batching, ... (gộp CPU worker của app/asgi.py)
+        "cluster": cluster_info(),
     }), 200
+
+
+@swag_from({
+    "tags": ["System"],
+    "summary": "Readiness Check Endpoint",
+    "description": "200 once the classifier and hand detectors have loaded (production server: once every CPU "
+                   "worker has loaded them, component `cpu_workers`), 503 while warming up.",
+    "responses": {
+        200: {"description": "Ready to serve predictions"},
+        503: {"description": "Still warming up (or a component failed to load)"}
+    }
+})
+@health_bp.route("/readyz", methods=["GET"])
+def readiness_check():
+    warmup.start()   # WARMUP_ON_START=0 → warm-up bắt đầu ở readiness probe đầu tiên
+    status = warmup.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@swag_from({
+    "tags": ["System"],
+    "summary": "Prometheus metrics",
+    "description": "Per-stage latency quantiles (p50/p95/p99) per entry point, detector pool and micro-batching gauges.",
+    "produces": ["text/plain"],
+    "responses": {200: {"description": "Prometheus text exposition format"}}
+})
+@health_bp.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
@@ -1,7 +1,14 @@
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify
 from flasgger import swag_from
-from app.services.classifier_service import classifier_predict
-from app.services.mediapipe_service import extract_keypoints_from_image
+from app.services.mediapipe_service import read_upload, UploadTooLarge
+from app.services.log_service import StageTimer
+from app.services.offload_service import run_cpu
+from app.services.result_cache import content_key
+from app.services.keypoints_service import KeypointsError, parse_keypoints, predict_keypoints
+from app.services.batch_predict_service import (
+    BatchInputError, collect_uploads, iter_batch_results, predict_batch, predict_upload, wants_stream,
+)
 
 predict_bp = Blueprint("predict_bp", __name__)
 
@@ -25,7 +32,9 @@ predict_bp = Blueprint("predict_bp", __name__)
                     "confidence": 0.92
                 }
             }
-        }
+        },
+        413: {"description": "Upload exceeds MAX_UPLOAD_BYTES"},
+        503: {"description": "No free hand detector"}
     }
 })
 @predict_bp.route("/predict/image", methods=["POST"])
@@ -34,14 +43,113 @@ def predict_image():
     if not file:
         return jsonify({"error": "No file uploaded"}), 400
 
-    kps = extract_keypoints_from_image(file)
-    if kps is None:
-        return jsonify({"error": "No hand detected"}), 200
+    try:
+        data = read_upload(file)
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
 
-    pred, conf = classifier_predict(kps)
+    key = content_key(data)
+    status, pred, conf = run_cpu(key, predict_upload, data, "/predict/image", key)
+    if status == "invalid":
+        return jsonify({"error": "Invalid image"}), 400
+    if status == "busy":
+        return jsonify({"error": "Server busy, try again"}), 503
+    if status == "no_hand":
+        return jsonify({"error": "No hand detected"}), 200
     return jsonify({"prediction": pred, "confidence": round(conf, 3)})
 
 
+@swag_from({
+    "tags": ["ASL Recognition"],
+    "description": "Upload many images (multiple `files` fields and/or .zip archives) and predict all of them. "
+                   "Add ?stream=1 (or Accept: application/x-ndjson) to receive NDJSON lines as images finish.",
+    "consumes": ["multipart/form-data", "application/zip"],
+    "parameters": [
+        {"name": "files", "in": "formData", "type": "file", "required": True,
+         "description": "Image files or zip archives of images (repeat the field)"},
+        {"name": "stream", "in": "query", "type": "boolean", "required": False,
+         "description": "Stream results as NDJSON in completion order"},
+    ],
+    "responses": {
+        200: {
+            "description": "Per-image results in input order",
+            "examples": {
+                "application/json": {
+                    "count": 2,
+                    "results": [
+                        {"index": 0, "filename": "a.jpg", "prediction": "A", "confidence": 0.92},
+                        {"index": 1, "filename": "b.jpg", "prediction": "NO_HAND", "confidence": 0.0}
+                    ]
+                }
+            }
+        },
+        400: {"description": "No files / invalid zip"},
+        413: {"description": "Too many images or batch too large"}
+    }
+})
+@predict_bp.route("/predict/batch", methods=["POST"])
+def predict_batch_route():
+    try:
+        items = collect_uploads(request.files.getlist("files") + request.files.getlist("file"),
+                                request.get_data() if not request.files else None, request.mimetype)
+    except BatchInputError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    timer = StageTimer("/predict/batch")
+    if wants_stream(request.args, request.headers.get("Accept")):
+        def generate():
+            for result in iter_batch_results(items, timer, stream=True):
+                yield json.dumps(result) + "\n"
+            timer.finish(images=len(items), stream=True)
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    results = predict_batch(items, timer)
+    timer.finish(images=len(items))
+    return jsonify({"count": len(results), "results": results})
+
+
+@swag_from({
+    "tags": ["ASL Recognition"],
+    "description": "Predict from 21 hand landmarks detected on the client (MediaPipe in browser / mobile). "
+                   "JSON [[x, y] * 21] in normalized image coordinates (z optional), a batch of hands, "
+                   "or application/octet-stream float32 little-endian x,y (N x 21 x 2).",
+    "consumes": ["application/json", "application/octet-stream"],
+    "parameters": [{
+        "name": "body",
+        "in": "body",
+        "required": True,
+        "schema": {"type": "object", "properties": {"keypoints": {"type": "array", "items": {"type": "array"}}}}
+    }],
+    "responses": {
+        200: {
+            "description": "Prediction (single hand) or {count, results} (batch)",
+            "examples": {"application/json": {"prediction": "A", "confidence": 0.92}}
+        },
+        400: {"description": "Wrong shape or out-of-range landmarks"}
+    }
+})
+@predict_bp.route("/predict/keypoints", methods=["POST"])
+def predict_keypoints_route():
+    timer = StageTimer("/predict/keypoints")
+    try:
+        with timer.stage("parse"):
+            body = request.get_data() if request.mimetype == "application/octet-stream" else request.get_json(silent=True)
+            if body is None:
+                raise KeypointsError("Expected a JSON body or application/octet-stream")
+            kps, batched, _ = parse_keypoints(body)
+    except KeypointsError as e:
+        timer.finish(result="INVALID")
+        return jsonify({"error": str(e)}), 400
+
+    with timer.stage("classify"):
+        preds = run_cpu(None, predict_keypoints, kps)
+    timer.finish(result=preds[0][0] if len(preds) == 1 else "BATCH", hands=len(preds))
+    results = [{"prediction": p, "confidence": round(c, 3)} for p, c in preds]
+    if not batched:
+        return jsonify(results[0])
+    return jsonify({"count": len(results), "results": [{"index": i, **r} for i, r in enumerate(results)]})
+
+
 @swag_from({
     "tags": ["ASL Recognition"],
     "description": "Stream webcam frames and return predictions (for frontend live mode)",
@@ -0,0 +1,264 @@
+import io
+import os
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED, ALL_COMPLETED
+from app.services import offload_service
+from app.services.classifier_service import classifier_predict, classifier_predict_batch
+from app.services.detector_pool import get_hands_pool, DetectorPoolTimeout
+from app.services.log_service import StageTimer, NULL_TIMER
+from app.services.mediapipe_service import decode_image
+from app.services.preprocess_service import detect_keypoints
+from app.services.result_cache import result_cache, content_key
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "256"))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(64 * 1024 * 1024)))   # tổng bytes ảnh (sau giải nén zip)
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", str(min(8, os.cpu_count() or 1))))
+BATCH_SHARD_SIZE = int(os.getenv("BATCH_SHARD_SIZE", "16"))   # ảnh / job gửi CPU worker (app/asgi.py)
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+# decode (cv2.imdecode) và hands.process đều nhả GIL → thread là đủ; số detect song song
+# thực tế bị giới hạn bởi HANDS_POOL_SIZE.
+_executor = ThreadPoolExecutor(max_workers=max(1, BATCH_WORKERS), thread_name_prefix="batch-predict")
+
+
+class BatchInputError(ValueError):
+    """Input batch không hợp lệ; `status` là HTTP status nên trả về."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _is_zip(name, mimetype=None):
+    return (name or "").lower().endswith(".zip") or mimetype in ("application/zip", "application/x-zip-compressed")
+
+
+class _Budget:
+    """Đếm số ảnh + tổng bytes khi gom upload; vượt BATCH_MAX_IMAGES / BATCH_MAX_BYTES → 413 ngay."""
+
+    def __init__(self):
+        self.images = 0
+        self.bytes = 0
+
+    def add(self, size):
+        if self.images + 1 > BATCH_MAX_IMAGES:
+            raise BatchInputError(f"Too many images (> {BATCH_MAX_IMAGES})", 413)
+        if self.bytes + size > BATCH_MAX_BYTES:
+            raise BatchInputError(f"Batch exceeds {BATCH_MAX_BYTES} bytes", 413)
+        self.images += 1
+        self.bytes += size
+
+    @property
+    def remaining(self):
+        return BATCH_MAX_BYTES - self.bytes
+
+
+def _expand_zip(data, budget, prefix=""):
+    """
+    Zip (bytes hoặc file seekable) → [(tên, bytes)] theo thứ tự trong archive, bỏ thư mục và file không phải ảnh.
+    Giới hạn kiểm tra theo file_size khai báo *trước* khi giải nén từng entry (chống zip bomb);
+    zipfile không bao giờ trả về nhiều hơn file_size bytes cho 1 entry.
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data)
+    except zipfile.BadZipFile:
+        raise BatchInputError(f"Invalid zip archive: {prefix or '<body>'}")
+    items = []
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTS):
+                continue
+            budget.add(info.file_size)
+            try:
+                items.append((prefix + info.filename, archive.read(info)))
+            except (zipfile.BadZipFile, zipfile.LargeZipFile, zlib.error, NotImplementedError, EOFError) as e:
+                raise BatchInputError(f"Invalid zip entry {info.filename}: {e}")
+    return items
+
+
+def collect_uploads(files, body=None, content_type=None):
+    """
+    Gom ảnh của 1 request batch → [(tên, bytes)] theo đúng thứ tự input.
+    files: list werkzeug.FileStorage (ảnh hoặc .zip); body: raw body khi gửi thẳng application/zip.
+    """
+    budget = _Budget()
+    items = []
+    for f in files:
+        if _is_zip(f.filename, f.mimetype):
+            # zipfile đọc thẳng stream của upload (werkzeug đã spool ra đĩa), chỉ entry ảnh vào RAM
+            items.extend(_expand_zip(f.stream, budget, prefix=f"{f.filename}/"))
+            continue
+        if f.content_length and f.content_length > budget.remaining:
+            budget.add(f.content_length)                # raise 413, chưa đọc byte nào
+        data = f.stream.read(max(budget.remaining, 0) + 1)   # đọc tối đa phần budget còn lại + 1
+        budget.add(len(data))
+        items.append((f.filename or f"file{len(items)}", data))
+    if not items and body and _is_zip(None, content_type):
+        items = _expand_zip(body, budget)
+
+    if not items:
+        raise BatchInputError("No files uploaded")
+    return items
+
+
+def _detect_one(data):
+    """Chạy trong worker thread: cache → decode → detect. → (key, status, kps | giá trị cache | None)."""
+    timer = StageTimer("/predict/batch:image")
+    with timer.stage("cache"):
+        key = content_key(data)
+        cached = result_cache.get(key)
+    if cached is not None:
+        timer.finish(result=cached[1], cache="hit")
+        return key, "cached", cached
+
+    img = decode_image(data, timer)
+    if img is None:
+        timer.finish(result="INVALID")
+        return key, "invalid", None
+    try:
+        kps = detect_keypoints(img, get_hands_pool(), timer)
+    except DetectorPoolTimeout:
+        timer.finish(result="BUSY")
+        return key, "busy", None
+    if kps is None:
+        result_cache.put(key, (None, "NO_HAND", 0.0))
+        timer.finish(result="NO_HAND")
+        return key, "no_hand", None
+    timer.finish(result="HAND")
+    return key, "hand", kps
+
+
+def _result(index, name, prediction=None, confidence=0.0, error=None):
+    out = {"index": index, "filename": name}
+    if error is not None:
+        out["error"] = error
+    else:
+        out["prediction"] = prediction
+        out["confidence"] = round(float(confidence), 3)
+    return out
+
+
+def _iter_local(items, timer, stream):
+    """Detect song song trên detector pool của process này, classify gộp (xem iter_batch_results)."""
+    futures = {_executor.submit(_detect_one, data): i for i, (_, data) in enumerate(items)}
+    pending = set(futures)
+    while pending:
+        with timer.stage("detect_wait"):
+            done, pending = wait(pending, return_when=FIRST_COMPLETED if stream else ALL_COMPLETED)
+        done = sorted(done, key=futures.get)
+
+        results, hands = {}, []
+        for fut in done:
+            i = futures[fut]
+            name = items[i][0]
+            key, status, value = fut.result()
+            if status == "cached":
+                results[i] = _result(i, name, value[1], value[2])
+            elif status == "invalid":
+                results[i] = _result(i, name, error="Invalid image")
+            elif status == "busy":
+                results[i] = _result(i, name, "BUSY")
+            elif status == "no_hand":
+                results[i] = _result(i, name, "NO_HAND")
+            else:
+                hands.append((i, key, value))
+
+        if hands:
+            preds = classifier_predict_batch([kps for _, _, kps in hands], timer)
+            for (i, key, kps), (pred, conf) in zip(hands, preds):
+                result_cache.put(key, (kps, pred, conf))
+                results[i] = _result(i, items[i][0], pred, conf)
+
+        for i in sorted(results):
+            yield results[i]
+
+
+def _predict_shard(shard):
+    """Chạy trong CPU worker: [(index gốc, tên, bytes)] → kết quả theo index gốc."""
+    results = predict_batch([(name, data) for _, name, data in shard])
+    for r in results:
+        r["index"] = shard[r["index"]][0]
+    return results
+
+
+def _iter_offloaded(items, timer, stream):
+    """
+    Chia ảnh cho các CPU worker theo content key (ảnh giống nhau → cùng worker, trúng result cache
+    của worker đó), mỗi job tối đa BATCH_SHARD_SIZE ảnh để frame socket cùng worker không phải đợi lâu.
+    """
+    n = offload_service.worker_count()
+    shards = {}
+    for i, (name, data) in enumerate(items):
+        shards.setdefault(zlib.crc32(content_key(data)) % n, []).append((i, name, data))
+    size = max(1, BATCH_SHARD_SIZE)
+    futures = [offload_service.submit(worker, _predict_shard, shard[j:j + size])
+               for worker, shard in shards.items() for j in range(0, len(shard), size)]
+    if stream:
+        for fut in as_completed(futures):
+            yield from fut.result()
+        return
+    with timer.stage("detect_wait"):
+        results = [r for fut in futures for r in fut.result()]
+    yield from sorted(results, key=lambda r: r["index"])
+
+
+def iter_batch_results(items, timer=None, stream=False):
+    """
+    Yield kết quả từng ảnh dạng dict (có "index" theo thứ tự input).
+    stream=False: đợi detect xong hết rồi classify 1 lần cho cả batch, yield theo thứ tự input.
+    stream=True : mỗi khi có ảnh detect xong, classify gộp những ảnh vừa xong và yield ngay
+                  (thứ tự hoàn thành).
+    Production server (app/asgi.py): decode / detect / classify chạy trong CPU worker process.
+    """
+    timer = timer or NULL_TIMER
+    if offload_service.offloaded():
+        return _iter_offloaded(items, timer, stream)
+    return _iter_local(items, timer, stream)
+
+
+def predict_upload(data, route="/predict_image", key=None):
+    """
+    1 ảnh upload: cache → decode → detect → classify; chạy inline hoặc trong CPU worker (offload_service).
+    → (status, prediction, confidence); status: "hand" | "no_hand" | "invalid" | "busy".
+    """
+    timer = StageTimer(route)
+    with timer.stage("cache"):
+        key = key or content_key(data)
+        cached = result_cache.get(key)
+    if cached is not None:
+        kps, pred, conf = cached
+        timer.finish(result=pred, cache="hit")
+        return ("no_hand" if kps is None else "hand"), pred, conf
+
+    img = decode_image(data, timer)
+    if img is None:
+        timer.finish(result="INVALID")
+        return "invalid", None, 0.0
+    try:
+        kps = detect_keypoints(img, get_hands_pool(), timer)
+    except DetectorPoolTimeout:
+        timer.finish(result="BUSY")
+        return "busy", None, 0.0
+    if kps is None:
+        result_cache.put(key, (None, "NO_HAND", 0.0))
+        timer.finish(result="NO_HAND")
+        return "no_hand", "NO_HAND", 0.0
+
+    pred, conf = classifier_predict(kps, timer)
+    result_cache.put(key, (kps, pred, conf))
+    timer.finish(result=pred, confidence=round(conf, 3))
+    return "hand", pred, conf
+
+
+def wants_stream(args, accept):
+    """?stream=1 hoặc Accept: application/x-ndjson → trả NDJSON theo thứ tự hoàn thành."""
+    return args.get("stream") in ("1", "true") or "application/x-ndjson" in (accept or "")
+
+
+def predict_batch(items, timer=None):
+    """Toàn bộ kết quả theo thứ tự input (1 lần predict_proba cho mọi ảnh có tay)."""
+    return list(iter_batch_results(items, timer, stream=False))
@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import numpy as np
+
+_STOP = object()   # close(): báo worker thread thoát sau batch hiện tại
+
+
+class MicroBatcher:
+    """
+    Gom các request đồng thời (REST + Socket.IO) thành 1 batch rồi gọi `batch_fn` 1 lần.
+
+    Worker thread chờ item đầu tiên rồi lấy ngay các item đang xếp hàng. Chỉ khi đang có tải
+    đồng thời (batch này hoặc batch trước > 1 item) mới chờ gom thêm tới `max_batch_size` item
+    hoặc hết `max_wait_ms`; request lẻ được chạy ngay, không trả thêm độ trễ.
+    `batch_fn`: ndarray (n, d) → ndarray (n, ...), mỗi caller nhận lại đúng hàng của mình.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=2.0, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._hist = {}          # batch size → số lần
+        self._items = 0
+        self._last_size = 1      # kích thước batch trước → có đang tải đồng thời không
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        """Đưa 1 hàng vào hàng đợi → Future trả về kết quả của riêng hàng đó."""
+        fut = Future()
+        self._queue.put((np.asarray(row), fut))
+        return fut
+
+    def __call__(self, row, timeout=None):
+        """Chờ kết quả tối đa `timeout` giây; hết giờ → TimeoutError (hàng chưa chạy thì bị huỷ)."""
+        fut = self.submit(row)
+        try:
+            return fut.result(timeout)
+        except FutureTimeout:
+            fut.cancel()
+            raise
+
+    def close(self):
+        """Dừng worker thread; hàng đã xếp trước close() vẫn được chạy xong."""
+        self._queue.put((_STOP, None))
+        self._thread.join()
+
+    def _drain(self, batch):
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        self._drain(batch)
+        # không có ai chờ cùng lúc (hàng đợi trống, batch trước cũng chỉ 1 item) → chạy ngay,
+        # request lẻ không phải trả thêm max_wait; chỉ chờ gom khi vừa thấy tải đồng thời
+        if len(batch) == 1 and self._last_size == 1:
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        self._drain(batch)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = any(row is _STOP for row, _ in batch)
+            batch = [(row, f) for row, f in batch if row is not _STOP]
+            self._last_size = len(batch)
+            batch = [(row, f) for row, f in batch if f.set_running_or_notify_cancel()]   # bỏ hàng caller đã huỷ
+            if batch:
+                self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch):
+        rows, futs = zip(*batch)
+        # mọi lỗi (kể cả 1 hàng sai shape khi stack) trả về future của batch này, thread không chết
+        try:
+            out = self.batch_fn(np.stack(rows))
+            if len(out) != len(futs):
+                raise ValueError(f"batch_fn returned {len(out)} rows for {len(futs)} inputs")
+        except Exception as e:
+            for f in futs:
+                f.set_exception(e)
+            return
+        for f, r in zip(futs, out):
+            f.set_result(r)
+        with self._lock:
+            self._hist[len(batch)] = self._hist.get(len(batch), 0) + 1
+            self._items += len(batch)
+
+    def stats(self):
+        with self._lock:
+            batches = sum(self._hist.values())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queued": self._queue.qsize(),
+                "batches": batches,
+                "items": self._items,
+                "avg_batch_size": self._items / batches if batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._hist.items())},
+            }
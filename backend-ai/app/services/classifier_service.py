@@ -1,21 +1,78 @@
 from joblib import load
+import json
 import numpy as np
 import os
 import sys
+import threading
 import time
 import warnings
 warnings.filterwarnings("ignore", message="X does not have valid feature names")
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
-from features import extract_features
+from features import extract_features, extract_features_batch
+from flat_forest import FlatForestClassifier, SINGLE_SAMPLE_TARGET_MS
+from cascade import CascadeClassifier
+from app.services.batch_scheduler import MicroBatcher
+from app.services.log_service import get_logger, NULL_TIMER
+from app.services import metrics_service
+
+log = get_logger("classifier_service")
 
 MODEL_PATH = "app/models/rf_mediapipe_feature_calibrated.pkl"
 SCALER_PATH = "app/models/feature_scaler.pkl"
+FLAT_MODEL_PATH = "app/models/rf_flat.npz"          # tạo bằng: python flat_forest.py <model.pkl> <rf_flat.npz>
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "auto")   # auto | flat | sklearn
+BATCH_MAX_SIZE = int(os.getenv("CLASSIFIER_BATCH_MAX_SIZE", "16"))      # 1 → tắt micro-batching
+BATCH_MAX_WAIT_MS = float(os.getenv("CLASSIFIER_BATCH_MAX_WAIT_MS", "2"))
+BATCH_TIMEOUT = float(os.getenv("CLASSIFIER_BATCH_TIMEOUT", "10"))        # giây chờ tối đa 1 kết quả batch
+MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE") or None   # "r" → mmap mảng model, các worker process dùng chung page
+CASCADE_CONFIG_PATH = "app/models/cascade.json"     # tạo bằng: python cascade.py ... cascade.json
+CLASSIFIER_CASCADE = os.getenv("CLASSIFIER_CASCADE", "auto")   # auto (bật nếu có cascade.json) | on | off
+CASCADE_THRESHOLD = os.getenv("CASCADE_THRESHOLD")            # override threshold trong cascade.json
+CASCADE_MODEL_PATH = os.getenv("CASCADE_MODEL_PATH")          # override model rẻ (mặc định app/models/<tên trong json>)
+
+def load_classifier(mmap_mode=MODEL_MMAP_MODE):
+    """Flat-array evaluator nếu đã export (nhanh hơn nhiều), ngược lại model sklearn gốc."""
+    if CLASSIFIER_BACKEND == "flat" or (CLASSIFIER_BACKEND == "auto" and os.path.exists(FLAT_MODEL_PATH)):
+        print(f"🧠 [classifier_service] Đang load flat forest: {FLAT_MODEL_PATH}")
+        flat = FlatForestClassifier.load(FLAT_MODEL_PATH, mmap_mode=mmap_mode)
+        if flat.single_sample_ms is not None and flat.single_sample_ms > SINGLE_SAMPLE_TARGET_MS:
+            print(f"⚠️ [classifier_service] Flat forest KHÔNG đạt mục tiêu < {SINGLE_SAMPLE_TARGET_MS} ms/mẫu: "
+                  f"{flat.single_sample_ms:.2f} ms lúc export (vẫn nhanh hơn sklearn nhiều lần)")
+        return flat
+    print(f"🧠 [classifier_service] Đang load model: {MODEL_PATH}")
+    return load(MODEL_PATH, mmap_mode=mmap_mode)
+
+def load_cascade(big):
+    """Bọc model lớn bằng CascadeClassifier nếu được bật; model rẻ dùng chung scaler với RF."""
+    if CLASSIFIER_CASCADE == "off" or (CLASSIFIER_CASCADE == "auto" and not os.path.exists(CASCADE_CONFIG_PATH)):
+        return big
+    config = {}
+    if os.path.exists(CASCADE_CONFIG_PATH):
+        with open(CASCADE_CONFIG_PATH) as f:
+            config = json.load(f)
+    cheap_path = CASCADE_MODEL_PATH or os.path.join(os.path.dirname(CASCADE_CONFIG_PATH),
+                                                    os.path.basename(config.get("cheap_model", "et_shallow_feature.pkl")))
+    threshold = float(CASCADE_THRESHOLD or config.get("threshold", 0.9))
+    print(f"🪜 [classifier_service] Cascade: {cheap_path} (threshold={threshold:.3f}) → model lớn")
+    return CascadeClassifier(load(cheap_path), big, threshold)
 
-print(f"🧠 [classifier_service] Đang load model: {MODEL_PATH}")
-clf = load(MODEL_PATH)
-scaler = load(SCALER_PATH)
-print(f"✅ [classifier_service] Model đã sẵn sàng ({len(clf.classes_)} classes)\n")
+clf = scaler = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """(clf, scaler), load lần đầu được gọi (warm-up nền hoặc request đầu tiên)."""
+    global clf, scaler
+    if clf is None:
+        with _model_lock:
+            if clf is None:
+                start = time.time()
+                model = load_cascade(load_classifier())
+                scaler = load(SCALER_PATH)
+                clf = model
+                print(f"✅ [classifier_service] Model đã sẵn sàng ({len(clf.classes_)} classes, "
+                      f"{time.time() - start:.2f}s)\n")
+    return clf, scaler
 
 TRAIN_X_MEAN, TRAIN_Y_MEAN, TRAIN_PALM = 154.22, 124.29, 68.35
 
@@ -30,18 +87,119 @@ def normalize_keypoints(kps):
     kps[:, 1] += TRAIN_Y_MEAN
     return kps
 
-def classifier_predict(kps):
-    start = time.time()
-    feats = extract_features(kps).reshape(1, -1)
-    print(f"🧩 [classifier_service] Trích đặc trưng: {feats.shape} (57 features)")
-
+def timed_predict_proba(feats):
+    """feats (n,57) → (probs (n, n_classes), {"scale": ms, ["cheap": ms,] "predict": ms}) — 1 lần cho cả batch."""
+    clf, scaler = get_model()
+    t0 = time.perf_counter()
     X_input = scaler.transform(feats)
-    print("📊 [classifier_service] Đã chuẩn hóa dữ liệu, bắt đầu predict...")
+    t1 = time.perf_counter()
+    stage_ms = {"scale": (t1 - t0) * 1000}
+    if isinstance(clf, CascadeClassifier):
+        probs = clf.predict_proba(X_input, stage_ms)      # thêm "cheap" + "predict"
+    else:
+        probs = clf.predict_proba(X_input)
+        stage_ms["predict"] = (time.perf_counter() - t1) * 1000
+    return probs, stage_ms
+
+def predict_proba_batch(feats):
+    return timed_predict_proba(feats)[0]
+
+def _batch_fn(feats):
+    probs, stage_ms = timed_predict_proba(feats)
+    return [(p, stage_ms) for p in probs]
+
+batcher = MicroBatcher(_batch_fn, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS,
+                       name="classifier-batcher") if BATCH_MAX_SIZE > 1 else None
+
+def disable_batching():
+    """
+    Tắt micro-batching cho process này. CPU worker của app/asgi.py chạy job tuần tự
+    (max_workers=1) nên batcher luôn chỉ thấy batch 1 → chỉ thêm 1 lần chuyển thread;
+    process cha không classify nên cũng không cần batcher.
+    """
+    global batcher
+    if batcher is not None:
+        batcher.close()
+        batcher = None
+
+def batching_stats():
+    return batcher.stats() if batcher is not None else {"enabled": False}
+
+metrics_service.register_stats("classifier_batching", batching_stats, config=("max_batch_size", "max_wait_ms"),
+                               derive=lambda s: {"avg_batch_size": s["items"] / max(s["batches"], 1)}
+                               if "items" in s else {})
 
-    probs = clf.predict_proba(X_input)[0]
+@metrics_service.register_gauges
+def _batching_gauges():
+    if batcher is None:
+        return {}
+    s = batcher.stats()
+    return {
+        "asl_classifier_batches_total": ("Batched predict_proba calls", s["batches"]),
+        "asl_classifier_batch_items_total": ("Rows classified through the micro-batcher", s["items"]),
+        "asl_classifier_batch_queued": ("Rows waiting for the next batch", s["queued"]),
+        "asl_classifier_batch_size": ("Batch size histogram (number of batches per size)",
+                                      {f'size="{k}"': v for k, v in s["batch_size_histogram"].items()}),
+    }
+
+def cascade_stats():
+    return clf.stats() if isinstance(clf, CascadeClassifier) else {"enabled": False}
+
+metrics_service.register_stats("cascade", cascade_stats, config=("threshold",), derive=lambda s: {
+    "cheap_hit_rate": s["cheap_hits"] / max(s["cheap_hits"] + s["fallthrough"], 1)} if "cheap_hits" in s else {})
+
+@metrics_service.register_gauges
+def _cascade_gauges():
+    if not isinstance(clf, CascadeClassifier):
+        return {}
+    s = clf.stats()
+    return {
+        "asl_cascade_threshold": ("Confidence the cheap model needs to answer on its own", s["threshold"]),
+        "asl_cascade_samples_total": ("Samples answered per cascade stage",
+                                      {'stage="cheap"': s["cheap_hits"], 'stage="big"': s["fallthrough"]}),
+        "asl_cascade_cheap_hit_rate": ("Fraction of samples answered by the cheap model", s["cheap_hit_rate"]),
+    }
+
+def class_labels():
+    return get_model()[0].classes_
+
+def classifier_predict_proba(kps, timer=None):
+    """kps (21, 2) → xác suất từng class (thứ tự class_labels()), qua micro-batcher nếu bật."""
+    timer = timer or NULL_TIMER
+    with timer.stage("features"):
+        feats = extract_features(kps).reshape(1, -1)
+
+    if batcher is not None:
+        start = time.perf_counter()
+        probs, stage_ms = batcher(feats[0], timeout=BATCH_TIMEOUT)
+        waited = (time.perf_counter() - start) * 1000 - sum(stage_ms.values())
+        timer.add("batch_wait", max(waited, 0.0))
+    else:
+        probs, stage_ms = timed_predict_proba(feats)
+        probs = probs[0]
+    for name, ms in stage_ms.items():
+        timer.add(name, ms)
+    return probs
+
+def classifier_predict(kps, timer=None):
+    probs = classifier_predict_proba(kps, timer)
     pred_idx = int(np.argmax(probs))
-    pred_label = clf.classes_[pred_idx]
+    pred_label = class_labels()[pred_idx]
     conf = float(probs[pred_idx])
-
-    print(f"✅ [classifier_service] Predict={pred_label} ({conf:.3f}) | Thời gian={time.time()-start:.2f}s")
+    log.debug("Predict=%s (%.3f)", pred_label, conf)
     return pred_label, conf
+
+def classifier_predict_batch(kps_list, timer=None):
+    """Nhiều bộ keypoints (21, 2) → [(label, conf)] — features + predict_proba 1 lần cho cả batch."""
+    timer = timer or NULL_TIMER
+    if not len(kps_list):
+        return []
+    with timer.stage("features"):
+        feats = extract_features_batch(np.asarray(kps_list, dtype=np.float64))
+    probs, stage_ms = timed_predict_proba(feats)
+    for name, ms in stage_ms.items():
+        timer.add(name, ms)
+
+    classes = class_labels()
+    idx = np.argmax(probs, axis=1)
+    return [(classes[i], float(p[i])) for i, p in zip(idx, probs)]
@@ -0,0 +1,68 @@
+"""
+Chạy nhiều process / node backend sau load balancer.
+
+- SOCKETIO_MESSAGE_QUEUE: "" hoặc "memory://" → manager in-process (1 process, mặc định);
+  "redis://host:6379/0" (hoặc server tương thích Redis) → emit/broadcast/room đi qua pub-sub,
+  mọi node thấy cùng tập client.
+- Sticky session: detector tracking-mode của client nằm trong đúng 1 process, nên mọi request
+  của 1 client phải về cùng node. Client chỉ dùng transport websocket (frontend hiện tại) thì
+  tự nhiên sticky; nếu bật long-polling, LB phải pin theo cookie STICKY_COOKIE mà engine.io
+  set lúc handshake (vd. HAProxy `cookie asl_node prefix`) hoặc theo IP (nginx `ip_hash`).
+- Drain: SIGTERM → ngừng nhận client mới, báo `server_status: draining` để client reconnect
+  sang node khác, đợi frame đang xử lý tối đa DRAIN_TIMEOUT giây rồi đóng session.
+"""
+import os
+import socket
+import socketio
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "asl-socketio")
+NODE_ID = os.getenv("NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+STICKY_COOKIE = os.getenv("STICKY_COOKIE", "asl_node")
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "10"))
+
+REDIS_SCHEMES = ("redis://", "rediss://", "unix://")
+
+
+def message_queue_url():
+    """URL message queue dùng chung giữa các node; None → manager in-process."""
+    url = SOCKETIO_MESSAGE_QUEUE.strip()
+    if not url or url.startswith("memory://"):
+        return None
+    if not url.startswith(REDIS_SCHEMES):
+        raise ValueError(f"Unsupported SOCKETIO_MESSAGE_QUEUE: {url!r} (expected memory:// or redis://)")
+    try:
+        import redis  # noqa: F401 — RedisManager / AsyncRedisManager chỉ import lúc kết nối, lỗi rất khó hiểu
+    except ImportError:
+        raise RuntimeError("SOCKETIO_MESSAGE_QUEUE is a Redis URL but the `redis` package is not installed "
+                           "(pip install -r requirements.txt)") from None
+    return url
+
+
+def flask_socketio_options():
+    """kwargs cho flask_socketio.SocketIO (dev server trong app/main.py)."""
+    url = message_queue_url()
+    options = {"cookie": STICKY_COOKIE}
+    if url:
+        options.update(message_queue=url, channel=SOCKETIO_CHANNEL)
+    return options
+
+
+def async_client_manager():
+    """Client manager cho socketio.AsyncServer (app/asgi.py)."""
+    url = message_queue_url()
+    if url is None:
+        return socketio.AsyncManager()
+    return socketio.AsyncRedisManager(url, channel=SOCKETIO_CHANNEL)
+
+
+def cluster_info():
+    return {
+        "node": NODE_ID,
+        "message_queue": "redis" if message_queue_url() else "local",
+        "sticky_cookie": STICKY_COOKIE,
+        "drain_timeout_s": DRAIN_TIMEOUT,
+    }
@@ -0,0 +1,81 @@
+"""
+Code chạy trong process con của production server (app/asgi.py).
+Mỗi process giữ detector pool, classifier và tracking session riêng; event loop ở process cha
+chỉ làm I/O socket và không bao giờ bị MediaPipe / RandomForest chặn.
+"""
+import os
+import time
+from app.services.log_service import get_logger
+
+log = get_logger("cpu_worker")
+
+
+def init_worker():
+    """
+    Initializer của ProcessPoolExecutor: load model + warm detector trước frame đầu tiên.
+    Dùng warm-up của chính process này (không chạy nền) → asl_ready / asl_startup_seconds của worker
+    trong /metrics; load lỗi → raise, pool vỡ và component `cpu_workers` của process cha báo failed.
+    """
+    start = time.time()
+    from app.services import offload_service
+    offload_service.set_runner(None)   # spawn có thể chạy lại app/asgi.py (__mp_main__): process con luôn chạy inline
+    from app.services.classifier_service import disable_batching, get_model
+    from app.services.detector_pool import get_hands_pool
+    from app.services.warmup_service import warmup
+    disable_batching()   # job trong worker chạy tuần tự → batcher luôn thấy batch 1
+    warmup.add("classifier", get_model)
+    warmup.add("detector_pool", get_hands_pool)
+    warmup.start(background=False)
+    if not warmup.ready:
+        raise RuntimeError(f"CPU worker warm-up failed: {warmup.status()['components']}")
+    log.info("CPU worker %d ready in %.2fs", os.getpid(), time.time() - start)
+
+
+def ping():
+    return os.getpid()
+
+
+def open_session(sid):
+    """True nếu process này giữ được tracking session cho sid (False → dùng detector pool)."""
+    from app.services.session_service import sessions
+    return sessions.open(sid) is not None
+
+
+def close_session(sid):
+    from app.services.session_service import sessions
+    sessions.close(sid)
+
+
+def metrics_snapshot():
+    """Histogram + gauge + stats của process này → process cha gộp vào /metrics và /healthz."""
+    from app.services import metrics_service
+    return metrics_service.process_snapshot()
+
+
+def process_frame(sid, data):
+    """
+    1 frame của client sid → (payload `prediction`, counters) (dùng session tracking của process này).
+    counters: motion gate / smoothing của session cho frame_stats của client.
+    """
+    from app.services.session_service import sessions
+    from app.services.socket_service import frame_prediction
+    session = sessions.get(sid)
+    payload = frame_prediction(data, session)
+    motion = session.motion if session is not None else None
+    return payload, {
+        "reused": motion.reused if motion else 0,
+        "classified": motion.classified if motion else 0,
+        "suppressed": session.suppressed if session is not None else 0,
+    }
+
+
+def process_keypoints(data):
+    """Landmark do client tự detect → (event, payload); không cần session."""
+    from app.services.keypoints_service import keypoints_prediction
+    return keypoints_prediction(data)
+
+
+def drain_sessions(timeout):
+    """Shutdown: đóng mọi tracking session của process này (đợi frame đang chạy tối đa timeout)."""
+    from app.services.session_service import sessions
+    return sessions.drain(timeout)
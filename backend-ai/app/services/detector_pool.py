@@ -0,0 +1,131 @@
+import os, warnings, absl.logging
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+absl.logging.set_verbosity(absl.logging.ERROR)
+warnings.filterwarnings("ignore", category=UserWarning)
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from app.services import metrics_service
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+POOL_SIZE = int(os.getenv("HANDS_POOL_SIZE", "2"))
+LEASE_TIMEOUT = float(os.getenv("HANDS_LEASE_TIMEOUT", "5.0"))  # giây
+MIN_DETECTION_CONFIDENCE = 0.5
+
+
+class DetectorPoolTimeout(RuntimeError):
+    """Không có detector rảnh trong thời gian chờ cho phép."""
+
+
+class HandsPool:
+    """Pool các `mp_hands.Hands` đã warm sẵn, cho mượn thread-safe theo từng request."""
+
+    def __init__(self, size=POOL_SIZE, timeout=LEASE_TIMEOUT, **hands_kwargs):
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.hands_kwargs = {
+            "static_image_mode": True,
+            "max_num_hands": 1,
+            "min_detection_confidence": MIN_DETECTION_CONFIDENCE,
+            **hands_kwargs,
+        }
+        self._free = queue.LifoQueue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._leases = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+
+        start = time.time()
+        import mediapipe as mp   # import nặng (~1-2s) → chỉ khi thật sự tạo detector
+        for _ in range(self.size):
+            self._free.put(mp.solutions.hands.Hands(**self.hands_kwargs))
+        print(f"🖐️ [detector_pool] Đã khởi tạo {self.size} detector trong {time.time()-start:.2f}s")
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Mượn 1 detector; trả lại pool khi thoát khỏi `with`."""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            hands = self._free.get_nowait()
+            waited = 0.0
+        except queue.Empty:
+            start = time.time()
+            try:
+                hands = self._free.get(timeout=timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._timeouts += 1
+                raise DetectorPoolTimeout(f"No free hand detector after {timeout:.1f}s")
+            waited = time.time() - start
+
+        with self._lock:
+            self._leases += 1
+            if waited:
+                self._waits += 1
+                self._wait_time += waited
+        try:
+            yield hands
+        finally:
+            self._free.put(hands)
+
+    def stats(self):
+        with self._lock:
+            leases, waits = self._leases, self._waits
+            return {
+                "size": self.size,
+                "available": self._free.qsize(),
+                "leases": leases,
+                "waits": waits,
+                "wait_ratio": waits / leases if leases else 0.0,
+                "avg_wait_ms": self._wait_time / waits * 1000 if waits else 0.0,
+                "wait_ms_total": self._wait_time * 1000,
+                "timeouts": self._timeouts,
+            }
+
+    def close(self):
+        while True:
+            try:
+                self._free.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hands_pool():
+    """Pool dùng chung cho cả process (tạo 1 lần duy nhất)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HandsPool()
+                metrics_service.register_gauges(_pool_gauges)
+    return _pool
+
+
+def pool_stats():
+    """stats() của pool nếu đã tạo; không ép khởi tạo detector (dùng cho /healthz lúc đang warm-up)."""
+    return {**_pool.stats(), "loaded": True} if _pool is not None else {"size": POOL_SIZE, "loaded": False}
+
+
+metrics_service.register_stats("detector_pool", pool_stats, config=("size",), derive=lambda s: {
+    "wait_ratio": s.get("waits", 0) / max(s.get("leases", 0), 1),
+    "avg_wait_ms": s.get("wait_ms_total", 0.0) / max(s.get("waits", 0), 1),
+})
+
+
+def _pool_gauges():
+    s = _pool.stats()
+    return {
+        "asl_detector_pool_size": ("Hand detectors in the pool", s["size"]),
+        "asl_detector_pool_available": ("Idle hand detectors", s["available"]),
+        "asl_detector_pool_leases_total": ("Detector leases", s["leases"]),
+        "asl_detector_pool_waits_total": ("Leases that had to wait for a free detector", s["waits"]),
+        "asl_detector_pool_timeouts_total": ("Leases that timed out", s["timeouts"]),
+    }
@@ -0,0 +1,51 @@
+import base64
+import struct
+import numpy as np
+
+# =====================================
+# 📦 FRAME FORMAT
+# =====================================
+# Socket `frame` nhận 1 trong 2 dạng:
+#   - str  : data URL base64 ("data:image/jpeg;base64,...") — client cũ
+#   - bytes: JPEG/WebP thô, có thể kèm header 12 byte phía trước:
+#            b"ASLF" | seq uint32 | width uint16 | height uint16   (little-endian)
+FRAME_MAGIC = b"ASLF"
+FRAME_HEADER = struct.Struct("<4sIHH")
+
+
+def decode_base64_image(base64_string):
+    """Chuyển base64 data URL → numpy array (ảnh BGR), None nếu lỗi."""
+    import cv2   # lazy: cv2 chỉ load khi có frame đầu tiên (khởi động nhanh)
+    try:
+        img_data = base64.b64decode(base64_string.split(",")[1])
+        np_arr = np.frombuffer(img_data, np.uint8)
+        return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+    except Exception:
+        return None
+
+
+def parse_frame_header(data):
+    """bytes → (meta dict, offset ảnh). Không có header → ({}, 0)."""
+    if len(data) >= FRAME_HEADER.size and bytes(data[:4]) == FRAME_MAGIC:
+        _, seq, width, height = FRAME_HEADER.unpack_from(data)
+        return {"seq": seq, "width": width, "height": height}, FRAME_HEADER.size
+    return {}, 0
+
+
+def decode_binary_frame(data):
+    """bytes/bytearray/memoryview (JPEG/WebP, header tuỳ chọn) → (ảnh BGR | None, meta)."""
+    import cv2
+    meta, offset = parse_frame_header(data)
+    # frombuffer trên memoryview: không copy payload trước khi imdecode
+    np_arr = np.frombuffer(memoryview(data)[offset:], np.uint8)
+    img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR) if np_arr.size else None
+    return img, meta
+
+
+def decode_frame(data):
+    """Payload của socket `frame` (binary hoặc base64) → (ảnh BGR | None, meta)."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return decode_binary_frame(data)
+    if isinstance(data, str):
+        return decode_base64_image(data), {}
+    return None, {}
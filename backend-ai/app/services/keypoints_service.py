@@ -0,0 +1,118 @@
+import os
+import numpy as np
+from app.services.classifier_service import classifier_predict, classifier_predict_batch
+from app.services.frame_codec import parse_frame_header
+from app.services.log_service import StageTimer, NULL_TIMER
+from app.services.preprocess_service import LANDMARK_SCALE
+
+# =====================================
+# 📦 INPUT FORMAT
+# =====================================
+# Client tự chạy MediaPipe Hands (browser / mobile) và gửi landmark chuẩn hoá [0,1] theo ảnh:
+#   - JSON: [[x, y] * 21] | [[x, y, z] * 21] | [x0, y0, x1, y1, ...] (42 số) | [{"x":..,"y":..}] * 21
+#           batch: list các hand ở trên, hoặc {"keypoints": ...}
+#   - bytes: float32 little-endian x,y của N hand (N × 21 × 2 × 4 byte), header ASLF tuỳ chọn (seq)
+N_POINTS = 21
+KEYPOINTS_MAX_BATCH = int(os.getenv("KEYPOINTS_MAX_BATCH", "256"))
+KEYPOINTS_RANGE_MARGIN = float(os.getenv("KEYPOINTS_RANGE_MARGIN", "0.5"))   # chấp nhận [-0.5, 1.5]
+MIN_HAND_EXTENT = 1e-3                                                       # bbox tay quá nhỏ → không hợp lệ
+
+
+class KeypointsError(ValueError):
+    """Landmark gửi lên sai shape / ngoài khoảng giá trị."""
+
+
+def _as_array(obj):
+    """JSON (list / dict) → mảng float, chấp nhận landmark dạng {"x","y"} của MediaPipe JS."""
+    if isinstance(obj, dict):
+        if "keypoints" not in obj:
+            raise KeypointsError("Missing 'keypoints'")
+        obj = obj["keypoints"]
+    try:
+        if isinstance(obj, list) and obj:
+            first = obj[0]
+            if isinstance(first, list) and first and isinstance(first[0], dict):    # batch of {"x","y"}
+                obj = [[[p["x"], p["y"]] for p in hand] for hand in obj]
+            elif isinstance(first, dict):
+                obj = [[p["x"], p["y"]] for p in obj]
+        return np.asarray(obj, dtype=np.float64)
+    except KeyError as e:
+        raise KeypointsError(f"Landmark missing {e}") from None
+    except (TypeError, ValueError):
+        raise KeypointsError("Keypoints must be numbers") from None
+
+
+def unpack_keypoints(data):
+    """bytes float32 (header ASLF tuỳ chọn) → ((N,21,2), meta)."""
+    meta, offset = parse_frame_header(data)
+    payload = memoryview(data)[offset:]
+    hand_bytes = N_POINTS * 2 * 4
+    if not len(payload) or len(payload) % hand_bytes:
+        raise KeypointsError(f"Packed keypoints must be a multiple of {hand_bytes} bytes")
+    return np.frombuffer(payload, dtype="<f4").reshape(-1, N_POINTS, 2).astype(np.float64), meta
+
+
+def parse_keypoints(obj):
+    """
+    JSON hoặc bytes → (kps (N,21,2) chuẩn hoá [0,1], batched, meta).
+    batched=False khi input là đúng 1 bàn tay (trả kết quả dạng đơn).
+    """
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        kps, meta = unpack_keypoints(obj)
+        batched = len(kps) > 1
+    else:
+        meta = {"seq": obj["seq"]} if isinstance(obj, dict) and "seq" in obj else {}
+        kps = _as_array(obj)
+        batched = kps.ndim == 3 or (kps.ndim == 2 and kps.shape[1] == N_POINTS * 2)
+        if kps.ndim == 1 and kps.size == N_POINTS * 2:
+            kps = kps.reshape(N_POINTS, 2)
+        if kps.ndim == 2 and kps.shape[1] == N_POINTS * 2:
+            kps = kps.reshape(-1, N_POINTS, 2)
+        if kps.ndim == 2:
+            kps = kps[None]
+        if kps.ndim != 3 or kps.shape[1] != N_POINTS or kps.shape[2] not in (2, 3):
+            raise KeypointsError(f"Expected 21 (x, y) landmarks per hand, got shape {kps.shape}")
+        kps = kps[:, :, :2]                 # bỏ z nếu client gửi kèm
+
+    if len(kps) > KEYPOINTS_MAX_BATCH:
+        raise KeypointsError(f"Too many hands ({len(kps)} > {KEYPOINTS_MAX_BATCH})")
+    if not np.isfinite(kps).all():
+        raise KeypointsError("Keypoints must be finite")
+    lo, hi = -KEYPOINTS_RANGE_MARGIN, 1.0 + KEYPOINTS_RANGE_MARGIN
+    if kps.min() < lo or kps.max() > hi:
+        raise KeypointsError(f"Keypoints must be normalized image coordinates in [{lo:g}, {hi:g}]")
+    extent = (kps.max(axis=1) - kps.min(axis=1)).max(axis=1)
+    if (extent < MIN_HAND_EXTENT).any():
+        raise KeypointsError("Degenerate hand: all landmarks collapse to one point")
+    return kps, batched, meta
+
+
+def predict_keypoints(kps, timer=None):
+    """(N,21,2) chuẩn hoá → [(label, conf)]; 1 hand đi qua micro-batcher, nhiều hand 1 lần predict_proba."""
+    timer = timer or NULL_TIMER
+    pts = kps * LANDMARK_SCALE              # cùng thang với dataset / detect_keypoints
+    if len(pts) == 1:
+        return [classifier_predict(pts[0], timer)]
+    return classifier_predict_batch(pts, timer)
+
+
+def keypoints_prediction(data, entry="socket:keypoints"):
+    """
+    Payload cho socket event `keypoints` → (event, payload):
+    1 hand → ("prediction", {...}); batch → ("predictions", {"results": [...]}).
+    """
+    timer = StageTimer(entry)
+    try:
+        with timer.stage("parse"):
+            kps, batched, meta = parse_keypoints(data)
+    except KeypointsError as e:
+        timer.finish(result="INVALID")
+        return "prediction", {"error": str(e)}
+    seq = {"seq": meta["seq"]} if "seq" in meta else {}
+
+    preds = predict_keypoints(kps, timer)
+    timer.finish(result=preds[0][0] if len(preds) == 1 else "BATCH", hands=len(preds))
+    results = [{"prediction": p, "confidence": round(c, 3)} for p, c in preds]
+    if not batched:
+        return "prediction", {**results[0], **seq}
+    return "predictions", {"count": len(results), "results": results, **seq}
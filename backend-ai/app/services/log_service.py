@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from app.services import metrics_service
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))   # tỉ lệ request ghi timing record
+
+_root = logging.getLogger("asl_backend")
+if not _root.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    _root.addHandler(_handler)
+    _root.setLevel(LOG_LEVEL)
+    _root.propagate = False
+
+_timing_log = _root.getChild("timing")
+
+
+def get_logger(name):
+    """Logger con của `asl_backend` (vd. get_logger("socket_service"))."""
+    return _root.getChild(name)
+
+
+def sampled(rate=None):
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+class StageTimer:
+    """
+    Đo thời gian từng stage của 1 request (decode, detect, features, scale, predict, ...).
+    `finish()` đẩy mọi stage vào histogram của /metrics và ghi 1 record JSON (theo LOG_SAMPLE_RATE).
+    """
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.stages = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, ms):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def finish(self, **fields):
+        total_ms = (time.perf_counter() - self._start) * 1000
+        metrics_service.observe_timer(self.entry, self.stages, total_ms)
+        if sampled() and _timing_log.isEnabledFor(logging.INFO):
+            record = {
+                "entry": self.entry,
+                "total_ms": round(total_ms, 3),
+                "stages_ms": {k: round(v, 3) for k, v in self.stages.items()},
+                **fields,
+            }
+            _timing_log.info(json.dumps(record, default=str))
+        return total_ms
+
+
+class _NullTimer:
+    """Timer rỗng khi caller không cần đo (giữ code hot path không rẽ nhánh)."""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def add(self, name, ms):
+        pass
+
+    def finish(self, **fields):
+        return 0.0
+
+
+NULL_TIMER = _NullTimer()
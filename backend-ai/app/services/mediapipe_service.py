@@ -1,37 +1,91 @@
-import os, warnings, absl.logging
-os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
-absl.logging.set_verbosity(absl.logging.ERROR)
-warnings.filterwarnings("ignore", category=UserWarning)
-import mediapipe as mp
+import os
+import threading
 import numpy as np
-import cv2
-import tempfile
-import time
+from app.services import metrics_service
+from app.services.detector_pool import get_hands_pool
+from app.services.log_service import get_logger, NULL_TIMER
+from app.services.preprocess_service import detect_keypoints
 
-mp_hands = mp.solutions.hands
+log = get_logger("mediapipe_service")
 
-def extract_keypoints_from_image(file):
-    """Nhận file ảnh (werkzeug.FileStorage) → Mediapipe keypoints (x, y)"""
-    start = time.time()
-    print("📥 [mediapipe_service] Bắt đầu xử lý ảnh upload...")
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))   # 0 → không giới hạn
 
-    with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        file.save(tmp.name)
-        img = cv2.imread(tmp.name)
-    if img is None:
-        print("❌ Không đọc được ảnh từ file.")
-        return None
 
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    with mp_hands.Hands(static_image_mode=True, max_num_hands=1,
-                        min_detection_confidence=0.5) as hands:
-        result = hands.process(img_rgb)
+class UploadTooLarge(ValueError):
+    """File upload vượt MAX_UPLOAD_BYTES (route trả 413)."""
+
+
+_lock = threading.Lock()
+_decoded_bytes = _decoded_images = _decode_failures = _rejected_uploads = 0
+
+
+def read_upload(file, limit=MAX_UPLOAD_BYTES):
+    """werkzeug.FileStorage → bytes, đọc thẳng từ stream (không ghi ra đĩa), tối đa `limit` bytes."""
+    global _rejected_uploads
+    data = file.stream.read(limit + 1) if limit else file.stream.read()
+    if limit and len(data) > limit:
+        with _lock:
+            _rejected_uploads += 1
+        raise UploadTooLarge(f"Upload exceeds {limit} bytes")
+    return data
+
+
+def decode_image(data, timer=None):
+    """bytes (JPEG/PNG/WebP...) → ảnh BGR bằng cv2.imdecode, None nếu không decode được."""
+    global _decoded_bytes, _decoded_images, _decode_failures
+    import cv2   # lazy: cv2 chỉ load khi có upload đầu tiên (khởi động nhanh)
+    timer = timer or NULL_TIMER
+    with timer.stage("decode"):
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) if len(data) else None
+    with _lock:
+        _decoded_bytes += len(data)
+        if img is None:
+            _decode_failures += 1
+        else:
+            _decoded_images += 1
+    return img
+
 
-        if not result.multi_hand_landmarks:
-            print("⚠️ Không phát hiện bàn tay nào trong ảnh.")
-            return None
+def decode_stats():
+    with _lock:
+        return {
+            "max_upload_bytes": MAX_UPLOAD_BYTES,
+            "decoded_bytes": _decoded_bytes,
+            "decoded_images": _decoded_images,
+            "decode_failures": _decode_failures,
+            "rejected_uploads": _rejected_uploads,
+        }
+
+
+metrics_service.register_stats("uploads", decode_stats, config=("max_upload_bytes",))
+
+
+@metrics_service.register_gauges
+def _decode_gauges():
+    s = decode_stats()
+    return {
+        "asl_upload_decoded_bytes_total": ("Upload bytes passed to cv2.imdecode", s["decoded_bytes"]),
+        "asl_upload_decoded_images_total": ("Uploads decoded successfully", s["decoded_images"]),
+        "asl_upload_decode_failures_total": ("Uploads that were not a readable image", s["decode_failures"]),
+        "asl_upload_rejected_total": ("Uploads rejected for exceeding MAX_UPLOAD_BYTES", s["rejected_uploads"]),
+    }
+
+
+def extract_keypoints_from_image(file, timer=None):
+    """
+    Nhận file ảnh (werkzeug.FileStorage) hoặc bytes đã đọc → Mediapipe keypoints (x, y).
+    Raise UploadTooLarge nếu file vượt MAX_UPLOAD_BYTES.
+    """
+    data = file if isinstance(file, (bytes, bytearray, memoryview)) else read_upload(file)
+    img = decode_image(data, timer)
+    if img is None:
+        log.warning("Không đọc được ảnh từ file upload")
+        return None
 
-        landmarks = result.multi_hand_landmarks[0]
-        kps = np.array([[lm.x * 200, lm.y * 200] for lm in landmarks.landmark])
-        print(f"✅ Đã trích xuất {len(kps)} keypoints trong {time.time() - start:.2f}s.")
-        return kps
+    kps = detect_keypoints(img, get_hands_pool(), timer)
+    if kps is None:
+        log.debug("Không phát hiện bàn tay nào trong ảnh")
+    return kps
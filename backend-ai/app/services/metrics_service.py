@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from app.services import offload_service
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))   # số mẫu gần nhất giữ cho mỗi histogram
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """Giữ N mẫu gần nhất (ms) để tính p50/p95/p99 + tổng/đếm tích luỹ kiểu Prometheus summary."""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self._samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def copy(self):
+        """→ (samples ndarray, count, sum); copy nhanh dưới lock, percentile tính sau khi nhả lock."""
+        return np.fromiter(self._samples, float, len(self._samples)), self.count, self.sum
+
+
+def quantiles(samples, qs=QUANTILES):
+    if not len(samples):
+        return {q: 0.0 for q in qs}
+    values = np.percentile(samples, [q * 100 for q in qs])
+    return dict(zip(qs, values.tolist()))
+
+
+_lock = threading.Lock()
+_histograms = {}     # (entry, stage) → RollingHistogram
+_gauge_providers = []
+_stats_providers = {}   # section /healthz → (provider, config keys, derive)
+
+
+def _hist(entry, stage):
+    hist = _histograms.get((entry, stage))
+    if hist is None:
+        hist = _histograms[(entry, stage)] = RollingHistogram()
+    return hist
+
+
+def observe(entry, stage, ms):
+    with _lock:
+        _hist(entry, stage).observe(ms)
+
+
+def observe_timer(entry, stages_ms, total_ms):
+    """Ghi toàn bộ stage của 1 request (gọi từ StageTimer.finish)."""
+    with _lock:
+        for stage, ms in stages_ms.items():
+            _hist(entry, stage).observe(ms)
+        _hist(entry, "total").observe(total_ms)
+
+
+def register_gauges(provider):
+    """provider() → {metric_name: (help, value | {label_str: value})}, gọi mỗi lần scrape /metrics."""
+    _gauge_providers.append(provider)
+    return provider
+
+
+def register_stats(name, provider, config=(), derive=None):
+    """
+    provider() → dict cho section `name` của /healthz. Có CPU worker (app/asgi.py) thì process cha gộp
+    section của mọi process: số cộng dồn, bool → any, key trong `config` (cấu hình từng process) giữ
+    nguyên; derive(merged) → {key: value} tính lại tỉ lệ / trung bình từ tổng đã gộp.
+    """
+    _stats_providers[name] = (provider, tuple(config), derive)
+    return provider
+
+
+def _copy_histograms():
+    with _lock:
+        items = [(k, *h.copy()) for k, h in _histograms.items()]
+    return sorted(items, key=lambda item: item[0])
+
+
+def _gauges():
+    gauges = {}
+    for provider in _gauge_providers:
+        gauges.update(provider())
+    return gauges
+
+
+def process_snapshot():
+    """Histogram thô + gauge + stats của process này (picklable) — CPU worker trả về cho process cha."""
+    return {
+        "pid": os.getpid(),
+        "taken_at": time.time(),
+        "histograms": _copy_histograms(),
+        "gauges": _gauges(),
+        "stats": {name: provider() for name, (provider, _, _) in _stats_providers.items()},
+    }
+
+
+def _merged_histograms(snapshots):
+    """Histogram của process này + mọi CPU worker: nối mẫu (quantile trên cửa sổ chung), cộng count / sum."""
+    merged = {}
+    for items in [_copy_histograms()] + [snap["histograms"] for snap in snapshots if snap]:
+        for key, samples, count, total in items:
+            if key in merged:
+                prev = merged[key]
+                samples, count, total = np.concatenate([prev[0], samples]), prev[1] + count, prev[2] + total
+            merged[key] = (samples, count, total)
+    return sorted(((k, *v) for k, v in merged.items()), key=lambda item: item[0])
+
+
+def _merge_values(values, config=()):
+    first = values[0]
+    if isinstance(first, dict):
+        keys = dict.fromkeys(k for v in values for k in v)
+        return {k: next(v[k] for v in values if k in v) if k in config
+                else _merge_values([v[k] for v in values if k in v]) for k in keys}
+    if isinstance(first, (bool, np.bool_)):
+        return any(values)
+    if isinstance(first, (int, float, np.integer, np.floating)):
+        return sum(values)
+    return first
+
+
+def stats_snapshot():
+    """
+    {section: stats} cho /healthz. Có CPU worker → mỗi section gộp process này + mọi worker,
+    kèm section `cpu_workers` (pid, tuổi snapshot; None → worker chưa trả lời lần nào).
+    """
+    snapshots = offload_service.worker_snapshots()
+    out = {}
+    for name, (provider, config, derive) in _stats_providers.items():
+        values = [provider()] + [snap["stats"][name] for snap in snapshots if snap and name in snap["stats"]]
+        if len(values) == 1:
+            out[name] = values[0]
+            continue
+        merged = _merge_values(values, config)
+        out[name] = {**merged, **derive(merged)} if derive else merged
+    if offload_service.offloaded():
+        now = time.time()
+        out["cpu_workers"] = [
+            {"worker": i, "pid": snap["pid"], "snapshot_age_s": round(now - snap["taken_at"], 3)} if snap
+            else {"worker": i, "pid": None}
+            for i, snap in enumerate(snapshots)
+        ]
+    return out
+
+
+def snapshot():
+    """→ {entry: {stage: {"p50", "p95", "p99", "count", "sum"}}} (dùng cho JSON)."""
+    out = {}
+    for (entry, stage), samples, count, total in _merged_histograms(offload_service.worker_snapshots()):
+        out.setdefault(entry, {})[stage] = {
+            **{f"p{int(q * 100)}": round(v, 3) for q, v in quantiles(samples).items()},
+            "count": count,
+            "sum": round(total, 3),
+        }
+    return out
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _value(v):
+    """Số nguyên giữ nguyên, float in đủ độ chính xác (repr) → counter lớn không bị làm tròn."""
+    if isinstance(v, (bool, int, np.integer)):
+        return str(int(v))
+    v = float(v)
+    if v != v:
+        return "NaN"
+    if v in (float("inf"), float("-inf")):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(v)
+
+
+def _series(value, worker=None):
+    """Giá trị provider → {label_str: value}; worker → thêm nhãn worker="i" (series của CPU worker)."""
+    items = value.items() if isinstance(value, dict) else [("", value)]
+    if worker is None:
+        return dict(items)
+    return {",".join(filter(None, [f'worker="{worker}"', label_str])): v for label_str, v in items}
+
+
+def render_prometheus():
+    """
+    Xuất Prometheus text format: latency summary + gauge/counter (`*_total`) từ các provider đã đăng ký.
+    Có CPU worker (app/asgi.py): summary gộp mẫu của mọi process, gauge / counter của từng worker
+    mang thêm nhãn worker="i" (sum() theo worker ra tổng của node).
+    """
+    snapshots = offload_service.worker_snapshots()
+    lines = [
+        "# HELP asl_stage_latency_ms Per-stage request latency in milliseconds (rolling window quantiles)",
+        "# TYPE asl_stage_latency_ms summary",
+    ]
+    for (entry, stage), samples, count, total in _merged_histograms(snapshots):
+        labels = f'entry="{_label(entry)}",stage="{_label(stage)}"'
+        for q, v in quantiles(samples).items():
+            lines.append(f'asl_stage_latency_ms{{{labels},quantile="{q}"}} {_value(v)}')
+        lines.append(f"asl_stage_latency_ms_sum{{{labels}}} {_value(total)}")
+        lines.append(f"asl_stage_latency_ms_count{{{labels}}} {count}")
+
+    gauges = {name: (help_text, _series(value)) for name, (help_text, value) in _gauges().items()}
+    for worker, snap in enumerate(snapshots):
+        for name, (help_text, value) in (snap["gauges"] if snap else {}).items():
+            gauges.setdefault(name, (help_text, {}))[1].update(_series(value, worker))
+    for name, (help_text, series) in gauges.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+        for label_str, v in series.items():
+            lines.append(f"{name}{{{label_str}}} {_value(v)}" if label_str else f"{name} {_value(v)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,96 @@
+import os
+import sys
+import threading
+import numpy as np
+from app.services import metrics_service
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from features import normalize_xy
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "0.04"))     # dịch chuyển TB / điểm, đơn vị = palm size; 0 → tắt
+MOTION_REFRESH_EVERY = int(os.getenv("MOTION_REFRESH_EVERY", "10"))  # classify lại sau tối đa N frame dùng lại
+
+_lock = threading.Lock()
+_reused = _classified = 0
+
+
+class MotionGate:
+    """
+    Bỏ qua classifier khi bàn tay gần như đứng yên: so landmark đã chuẩn hoá (tịnh tiến / scale /
+    xoay như features.normalize_xy) với lần classify gần nhất; dịch chuyển nhỏ hơn threshold →
+    dùng lại prediction cũ. So với lần classify (không phải frame trước) để trôi chậm không bị bỏ sót.
+    """
+
+    def __init__(self, threshold=MOTION_THRESHOLD, refresh_every=MOTION_REFRESH_EVERY):
+        self.threshold = threshold
+        self.refresh_every = refresh_every
+        self.reset()
+        self.reused = self.classified = 0
+
+    def reset(self):
+        """Mất tay → lần sau bắt buộc classify."""
+        self._anchor = None
+        self._pending = None
+        self._last = None
+        self._since_refresh = 0
+
+    def lookup(self, kps):
+        """kps (21,2) → (label, conf, probs) dùng lại được, hoặc None nếu phải classify (rồi gọi update())."""
+        global _reused
+        if self.threshold <= 0:
+            return None
+        vec = normalize_xy(kps)
+        if self._anchor is not None and self._since_refresh < self.refresh_every:
+            displacement = float(np.linalg.norm(vec - self._anchor, axis=1).mean())
+            if displacement < self.threshold:
+                self._since_refresh += 1
+                self.reused += 1
+                with _lock:
+                    _reused += 1
+                return self._last
+        self._pending = vec
+        return None
+
+    def update(self, label, conf, probs=None):
+        global _classified
+        self.classified += 1
+        with _lock:
+            _classified += 1
+        if self._pending is not None:
+            self._anchor, self._pending = self._pending, None
+            self._last = (label, conf, probs)
+            self._since_refresh = 0
+
+    def skip_rate(self):
+        total = self.reused + self.classified
+        return self.reused / total if total else 0.0
+
+
+def motion_stats():
+    with _lock:
+        reused, classified = _reused, _classified
+    total = reused + classified
+    return {
+        "threshold": MOTION_THRESHOLD,
+        "refresh_every": MOTION_REFRESH_EVERY,
+        "reused": reused,
+        "classified": classified,
+        "skip_rate": reused / total if total else 0.0,
+    }
+
+
+metrics_service.register_stats("motion_gate", motion_stats, config=("threshold", "refresh_every"),
+                               derive=lambda s: {"skip_rate": s["reused"] / max(s["reused"] + s["classified"], 1)})
+
+
+@metrics_service.register_gauges
+def _motion_gauges():
+    s = motion_stats()
+    return {
+        "asl_motion_gate_frames_total": ("Socket frames by motion-gate outcome",
+                                         {'outcome="reused"': s["reused"], 'outcome="classified"': s["classified"]}),
+        "asl_motion_gate_skip_rate": ("Fraction of hand frames that reused the previous prediction", s["skip_rate"]),
+    }
@@ -0,0 +1,46 @@
+"""
+Nơi chạy phần CPU (decode / MediaPipe / classifier) của các route REST.
+
+- Dev server (app/main.py): chạy ngay trong thread của request.
+- Production (app/asgi.py): set_runner(WorkerPool) → chạy trong CPU worker process,
+  process cha chỉ làm I/O và không load model / detector.
+"""
+
+_runner = None
+
+
+def set_runner(runner):
+    """
+    runner có `.size`, `.submit(key, fn, *args)` → concurrent.futures.Future và `.snapshots()`
+    → [snapshot | None] mỗi worker (xem asgi.WorkerPool).
+    """
+    global _runner
+    _runner = runner
+
+
+def offloaded():
+    return _runner is not None
+
+
+def worker_count():
+    return _runner.size if _runner is not None else 1
+
+
+def worker_snapshots():
+    """Snapshot metrics / stats của từng CPU worker (metrics_service.process_snapshot), [] nếu chạy inline."""
+    return _runner.snapshots() if _runner is not None else []
+
+
+def submit(key, fn, *args):
+    """
+    fn(*args) trên CPU worker của key (cùng key → cùng process: dùng chung result cache của process đó;
+    None → xoay vòng) → Future. fn phải là hàm module-level (pickle được). Chỉ dùng khi offloaded().
+    """
+    return _runner.submit(key, fn, *args)
+
+
+def run_cpu(key, fn, *args):
+    """fn(*args): inline nếu chưa có runner, ngược lại chạy trong CPU worker và đợi kết quả."""
+    if _runner is None:
+        return fn(*args)
+    return submit(key, fn, *args).result()
@@ -0,0 +1,115 @@
+import os
+import numpy as np
+from app.services.log_service import NULL_TIMER
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+LANDMARK_SCALE = 200.0                                         # giống lúc build dataset (lm.x * 200)
+PREPROCESS_MAX_SIDE = int(os.getenv("PREPROCESS_MAX_SIDE", "480"))   # 0 → không resize
+ROI_ENABLED = os.getenv("ROI_ENABLED", "1") == "1"
+ROI_EXPAND = float(os.getenv("ROI_EXPAND", "2.2"))             # cạnh ROI = cạnh dài của box tay × hệ số
+ROI_INPUT_SIDE = int(os.getenv("ROI_INPUT_SIDE", "256"))       # crop ROI luôn resize về vuông cạnh này
+ROI_MIN_FRAC = 0.3                                              # ROI ≥ 30% cạnh ngắn của frame
+ROI_MARGIN = 0.1                                                # tay chạm viền trong 10% → dời ROI
+
+
+def prepare_image(img, window=None, max_side=PREPROCESS_MAX_SIDE, timer=NULL_TIMER, side=None):
+    """
+    Crop theo window (x0, y0, x1, y1) nếu có, resize để cạnh dài ≤ max_side (hoặc đúng side × side
+    nếu có `side`) rồi BGR→RGB.
+    → (ảnh RGB, transform) với transform = (x0, y0, crop_w, crop_h, frame_w, frame_h).
+    """
+    import cv2   # lazy: cv2 chỉ load khi có ảnh đầu tiên (khởi động nhanh)
+    h, w = img.shape[:2]
+    with timer.stage("resize"):
+        if window is not None:
+            x0, y0, x1, y1 = window
+            img = img[y0:y1, x0:x1]           # view, không copy
+        else:
+            x0, y0 = 0, 0
+        ch, cw = img.shape[:2]
+        if side and (cw, ch) != (side, side):
+            img = cv2.resize(img, (side, side), interpolation=cv2.INTER_AREA if cw > side else cv2.INTER_LINEAR)
+        elif max_side and max(cw, ch) > max_side:
+            s = max_side / max(cw, ch)
+            img = cv2.resize(img, (max(1, round(cw * s)), max(1, round(ch * s))), interpolation=cv2.INTER_AREA)
+    with timer.stage("color"):
+        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return rgb, (x0, y0, cw, ch, w, h)
+
+
+def to_frame_coords(pts, transform):
+    """Landmark chuẩn hoá [0,1] theo ảnh đã crop/resize → chuẩn hoá theo frame gốc."""
+    x0, y0, cw, ch, w, h = transform
+    out = np.empty_like(pts)
+    out[:, 0] = (x0 + pts[:, 0] * cw) / w
+    out[:, 1] = (y0 + pts[:, 1] * ch) / h
+    return out
+
+
+class RoiTracker:
+    """
+    Giữ ROI vuông quanh bàn tay của frame trước (toạ độ pixel frame gốc).
+    ROI "dính": chỉ dời khi tay gần chạm viền hoặc đổi kích thước nhiều, để detector
+    tracking-mode thấy hình học ảnh ổn định giữa các frame.
+    """
+
+    def __init__(self):
+        self.window = None
+
+    def reset(self):
+        self.window = None
+
+    def update(self, pts, frame_w, frame_h):
+        px, py = pts[:, 0] * frame_w, pts[:, 1] * frame_h
+        bx0, by0, bx1, by1 = px.min(), py.min(), px.max(), py.max()
+        side = max(bx1 - bx0, by1 - by0) * ROI_EXPAND
+        if self.window is not None:
+            x0, y0, x1, y1 = self.window
+            m = ROI_MARGIN * (x1 - x0)
+            inside = bx0 >= x0 + m and by0 >= y0 + m and bx1 <= x1 - m and by1 <= y1 - m
+            if inside and 0.6 * (x1 - x0) <= side <= 1.4 * (x1 - x0):
+                return self.window
+        side = min(max(side, ROI_MIN_FRAC * min(frame_w, frame_h)), frame_w, frame_h)
+        cx, cy = (bx0 + bx1) / 2, (by0 + by1) / 2
+        x0 = int(np.clip(cx - side / 2, 0, frame_w - side))
+        y0 = int(np.clip(cy - side / 2, 0, frame_h - side))
+        self.window = (x0, y0, x0 + int(side), y0 + int(side))
+        return self.window
+
+
+def detect_keypoints(img, detector, timer=None, roi=None):
+    """
+    Resize/crop → MediaPipe → 21 keypoints (x, y) * LANDMARK_SCALE theo frame gốc.
+    detector: HandsPool hoặc Session (có .lease()); roi: RoiTracker của session (tuỳ chọn).
+    Có ROI: detector tracking-mode của session chỉ nhận crop ROI resize về ROI_INPUT_SIDE vuông
+    (1 hình học ổn định giữa các frame); chưa có ROI hoặc trượt trong ROI → tìm lại trên cả frame bằng detector static
+    của pool, không đưa ảnh khác hình học vào graph tracking.
+    """
+    from app.services.detector_pool import get_hands_pool
+    timer = timer or NULL_TIMER
+    if not ROI_ENABLED or roi is None:
+        attempts = ((None, detector),)
+    elif roi.window is None:
+        attempts = ((None, get_hands_pool()),)
+    else:
+        attempts = ((roi.window, detector), (None, get_hands_pool()))
+    for window, source in attempts:
+        rgb, transform = prepare_image(img, window, timer=timer,
+                                       side=ROI_INPUT_SIDE if window is not None else None)
+        with timer.stage("detect"):
+            with source.lease() as hands:
+                result = hands.process(rgb)
+        if result.multi_hand_landmarks:
+            break
+    else:
+        if roi is not None:
+            roi.reset()
+        return None
+
+    lm = result.multi_hand_landmarks[0]
+    pts = to_frame_coords(np.array([[p.x, p.y] for p in lm.landmark]), transform)
+    if ROI_ENABLED and roi is not None:
+        roi.update(pts, transform[4], transform[5])
+    return pts * LANDMARK_SCALE
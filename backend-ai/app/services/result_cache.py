@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.services import metrics_service
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "2048"))   # 0 → tắt cache
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "0"))                     # giây, 0 → không hết hạn
+ENTRY_OVERHEAD = 256   # ước lượng bytes cho key + tuple + label/conf
+
+
+def content_key(data):
+    """Hash nhanh của bytes upload (blake2b 128-bit)."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ResultCache:
+    """
+    LRU cache theo nội dung ảnh upload: key → (keypoints | None, prediction, confidence).
+    Giới hạn theo số entry và tổng bytes; TTL tuỳ chọn.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()   # key → (expires_at, nbytes, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expired = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, nbytes, value = item
+            if expires_at and time.monotonic() > expires_at:
+                del self._data[key]
+                self._bytes -= nbytes
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """value = (kps ndarray | None, prediction, confidence)."""
+        if not self.enabled:
+            return
+        kps = value[0]
+        nbytes = ENTRY_OVERHEAD + (kps.nbytes if kps is not None else 0)
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (expires_at, nbytes, value)
+            self._bytes += nbytes
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, n, _) = self._data.popitem(last=False)
+                self._bytes -= n
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
+
+
+result_cache = ResultCache()
+metrics_service.register_stats("result_cache", result_cache.stats, config=("max_entries", "max_bytes", "ttl_s"),
+                               derive=lambda s: {"hit_ratio": s["hits"] / max(s["hits"] + s["misses"], 1)})
+
+
+@metrics_service.register_gauges
+def _cache_gauges():
+    s = result_cache.stats()
+    return {
+        "asl_result_cache_entries": ("Cached upload results", s["entries"]),
+        "asl_result_cache_bytes": ("Estimated bytes held by the result cache", s["bytes"]),
+        "asl_result_cache_hits_total": ("Result cache hits", s["hits"]),
+        "asl_result_cache_misses_total": ("Result cache misses", s["misses"]),
+        "asl_result_cache_evictions_total": ("Result cache LRU evictions", s["evictions"]),
+    }
@@ -0,0 +1,287 @@
+import os, warnings, absl.logging
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+absl.logging.set_verbosity(absl.logging.ERROR)
+warnings.filterwarnings("ignore", category=UserWarning)
+import threading
+import time
+from contextlib import contextmanager
+from app.services import metrics_service
+from app.services.detector_pool import get_hands_pool
+from app.services.log_service import get_logger
+from app.services.preprocess_service import RoiTracker
+from app.services.motion_gate import MotionGate
+from app.services.smoothing_service import new_smoother
+
+log = get_logger("session_service")
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "60"))     # giây không gửi frame → giải phóng
+SESSION_REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", "10"))
+MAX_TRACKING_SESSIONS = int(os.getenv("MAX_TRACKING_SESSIONS", "200"))   # vượt quá → dùng detector pool (static)
+TRACKING_MIN_DETECTION = float(os.getenv("TRACKING_MIN_DETECTION", "0.5"))
+TRACKING_MIN_TRACKING = float(os.getenv("TRACKING_MIN_TRACKING", "0.5"))
+FRAME_STATS_EVERY = int(os.getenv("FRAME_STATS_EVERY", "30"))   # gửi `frame_stats` cho client mỗi N frame xử lý
+MAX_TARGET_FPS = 60.0
+
+
+class Session:
+    """
+    State realtime của 1 socket client: detector tracking-mode riêng (static_image_mode=False)
+    nên các frame liên tiếp dùng lại ROI bàn tay của frame trước thay vì chạy palm detection lại.
+    """
+
+    def __init__(self, sid):
+        import mediapipe as mp   # lazy: không kéo mediapipe vào lúc import app
+        self.sid = sid
+        self.hands = mp.solutions.hands.Hands(
+            static_image_mode=False,
+            max_num_hands=1,
+            min_detection_confidence=TRACKING_MIN_DETECTION,
+            min_tracking_confidence=TRACKING_MIN_TRACKING,
+        )
+        self.lock = threading.Lock()   # Hands không thread-safe; frame của 1 session xử lý tuần tự
+        self.closed = False            # set dưới self.lock; lease() sau đó chuyển sang pool
+        self.created = self.last_seen = time.monotonic()
+        self.frames = 0
+        self.roi = RoiTracker()        # ROI bàn tay frame trước → crop trước khi detect
+        self.motion = MotionGate()     # tay gần như đứng yên → dùng lại prediction trước
+        self.smoother = new_smoother() # vote + EMA theo thời gian, chỉ emit khi nhãn ổn định đổi
+        self.suppressed = 0
+        # backpressure "latest frame wins": tối đa 1 frame đang xử lý + 1 frame chờ
+        self._slot_lock = threading.Lock()
+        self._busy = False
+        self._pending = None
+        self._last_accepted = 0.0
+        self.target_fps = None
+        self.received = self.processed = self.dropped = self.rate_limited = 0
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """
+        Cùng interface với HandsPool.lease() để extract_keypoints dùng chung.
+        Session đã đóng (disconnect / evict khi frame còn đang chờ) → mượn detector static của pool,
+        không bao giờ gọi process() trên graph MediaPipe đã close.
+        """
+        with self.lock:
+            if not self.closed:
+                self.last_seen = time.monotonic()
+                self.frames += 1
+                yield self.hands
+                return
+        with get_hands_pool().lease(timeout) as hands:
+            yield hands
+
+    def close(self):
+        """Giải phóng detector; caller phải đang giữ self.lock. Gọi nhiều lần không sao."""
+        with self._slot_lock:
+            self._pending = None       # worker đang chạy dừng sau frame hiện tại
+        if self.closed:
+            return
+        self.closed = True
+        self.hands.close()
+
+    def set_target_fps(self, fps):
+        """Client yêu cầu tốc độ xử lý tối đa; None/0 → không giới hạn."""
+        self.target_fps = min(float(fps), MAX_TARGET_FPS) if fps else None
+
+    def _offer(self, frame):
+        """True → caller trở thành worker xử lý frame; False → frame đã vào slot chờ hoặc bị bỏ."""
+        now = time.monotonic()
+        with self._slot_lock:
+            self.received += 1
+            if self.target_fps and now - self._last_accepted < 1.0 / self.target_fps:
+                self.rate_limited += 1
+                self.dropped += 1
+                return False
+            self._last_accepted = now
+            if not self._busy:
+                self._busy = True
+                return True
+            if self._pending is not None:
+                self.dropped += 1          # frame chờ cũ bị thay bằng frame mới hơn
+            self._pending = frame
+            return False
+
+    def _take_next(self):
+        with self._slot_lock:
+            self.processed += 1
+            frame, self._pending = self._pending, None
+            if frame is None:
+                self._busy = False
+            return frame
+
+    def run_latest(self, frame, process):
+        """
+        Xử lý frame theo kiểu "latest frame wins": nếu đang có frame xử lý dở, frame mới chỉ thay
+        frame đang chờ (frame chờ cũ bị drop) → độ trễ không tăng khi client gửi nhanh hơn server.
+        Thread đang xử lý sẽ tự lấy frame chờ mới nhất sau khi xong. Trả False nếu frame không
+        được xử lý ngay bởi caller.
+        """
+        if not self._offer(frame):
+            return False
+        try:
+            while frame is not None:
+                process(frame)
+                frame = self._take_next()
+        except BaseException:
+            with self._slot_lock:
+                self._busy, self._pending = False, None
+            raise
+        return True
+
+    def should_report(self):
+        return FRAME_STATS_EVERY > 0 and self.processed % FRAME_STATS_EVERY == 0
+
+    def frame_stats(self):
+        with self._slot_lock:
+            return {
+                "received": self.received,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "rate_limited": self.rate_limited,
+                "target_fps": self.target_fps,
+                "reused": self.motion.reused,
+                "skip_rate": round(self.motion.skip_rate(), 3),
+                "suppressed": self.suppressed,
+            }
+
+
+class SessionRegistry:
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT, max_sessions=MAX_TRACKING_SESSIONS):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._opened = self._closed = self._evicted = self._rejected = 0
+        self._dropped_closed = 0   # frame dropped của các session đã đóng
+        self._rejected_sids = set()  # sid đã bị từ chối (đếm 1 lần / client, không phải / frame)
+        self._reaper = None
+        self.draining = False
+
+    def open(self, sid):
+        """Tạo session cho sid (gọi lúc connect). Trả None nếu đã đủ MAX_TRACKING_SESSIONS hoặc đang drain."""
+        with self._lock:
+            sess = self._sessions.get(sid)
+            if sess is not None:
+                return sess
+            if self.draining:
+                return None
+            if len(self._sessions) >= self.max_sessions:
+                if sid not in self._rejected_sids:
+                    self._rejected_sids.add(sid)
+                    self._rejected += 1
+                return None
+            sess = self._sessions[sid] = Session(sid)
+            self._rejected_sids.discard(sid)
+            self._opened += 1
+        log.debug("Opened tracking session %s", sid)
+        return sess
+
+    def get(self, sid, create=True):
+        """Session của sid; tạo lại nếu đã bị evict do idle (client vẫn đang gửi frame)."""
+        sess = self._sessions.get(sid)
+        if sess is None and create:
+            sess = self.open(sid)
+        return sess
+
+    def close(self, sid):
+        with self._lock:
+            self._rejected_sids.discard(sid)
+            sess = self._sessions.pop(sid, None)
+            if sess is not None:
+                self._closed += 1
+                self._dropped_closed += sess.dropped
+        if sess is not None:
+            with sess.lock:
+                sess.close()
+            log.debug("Closed tracking session %s", sid)
+
+    def evict_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            idle = [s for s in self._sessions.values() if now - s.last_seen > self.idle_timeout]
+        for sess in idle:
+            if not sess.lock.acquire(blocking=False):
+                continue   # đang xử lý frame → không idle
+            try:
+                with self._lock:
+                    if self._sessions.get(sess.sid) is not sess:
+                        continue
+                    del self._sessions[sess.sid]
+                    self._evicted += 1
+                    self._dropped_closed += sess.dropped
+                sess.close()
+                log.debug("Evicted idle session %s", sess.sid)
+            finally:
+                sess.lock.release()
+        return len(idle)
+
+    def drain(self, timeout=10.0):
+        """
+        Shutdown: ngừng nhận session mới, đợi frame đang xử lý (tối đa `timeout` giây) rồi đóng hết.
+        → số session đã đóng.
+        """
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            pending = list(self._sessions.values())
+            self._sessions.clear()
+            self._closed += len(pending)
+            self._dropped_closed += sum(s.dropped for s in pending)
+        for sess in pending:
+            if not sess.lock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                log.warning("Session %s still busy after drain timeout; leaving its detector open", sess.sid)
+                continue
+            try:
+                sess.close()
+            finally:
+                sess.lock.release()
+        if pending:
+            log.info("Drained %d tracking sessions", len(pending))
+        return len(pending)
+
+    def start_reaper(self, interval=SESSION_REAP_INTERVAL):
+        if self._reaper is not None:
+            return
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.evict_idle()
+                except Exception:
+                    log.exception("Session reaper failed")
+        self._reaper = threading.Thread(target=_loop, name="session-reaper", daemon=True)
+        self._reaper.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_timeout_s": self.idle_timeout,
+                "opened": self._opened,
+                "closed": self._closed,
+                "evicted": self._evicted,
+                "rejected": self._rejected,
+                "draining": self.draining,
+                "frames_dropped": self._dropped_closed + sum(s.dropped for s in self._sessions.values()),
+            }
+
+
+sessions = SessionRegistry()
+sessions.start_reaper()
+metrics_service.register_stats("sessions", sessions.stats, config=("max_sessions", "idle_timeout_s"))
+
+
+@metrics_service.register_gauges
+def _session_gauges():
+    s = sessions.stats()
+    return {
+        "asl_sessions_active": ("Socket sessions holding a tracking detector", s["active"]),
+        "asl_sessions_evicted_total": ("Sessions evicted after SESSION_IDLE_TIMEOUT", s["evicted"]),
+        "asl_sessions_rejected_total": ("Clients that fell back to the static detector pool (once per client)",
+                                        s["rejected"]),
+        "asl_frames_dropped_total": ("Socket frames dropped by latest-frame-wins backpressure", s["frames_dropped"]),
+    }
@@ -0,0 +1,76 @@
+import os
+import sys
+import threading
+from app.services import metrics_service
+from app.services.classifier_service import class_labels
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from smoothing import TemporalSmoother
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+SMOOTHING_ENABLED = os.getenv("SMOOTHING_ENABLED", "1") == "1"
+SMOOTH_WINDOW = int(os.getenv("SMOOTH_WINDOW", "7"))             # số frame bỏ phiếu
+SMOOTH_EMA_ALPHA = float(os.getenv("SMOOTH_EMA_ALPHA", "0.3"))
+PROB_THRESHOLD = float(os.getenv("PROB_THRESHOLD", "0.45"))      # EMA < ngưỡng → UNKNOWN (giống demo.py)
+CONF_BUCKET = float(os.getenv("CONF_BUCKET", "0.1"))             # emit lại khi confidence đổi bucket
+EMIT_ON_CHANGE = os.getenv("EMIT_ON_CHANGE", "1") == "1"         # 0 → vẫn emit mọi frame (đã làm mượt)
+
+_lock = threading.Lock()
+_emitted = _suppressed = 0
+
+
+def new_smoother():
+    """Smoother cho 1 session; None nếu tắt smoothing."""
+    if not SMOOTHING_ENABLED:
+        return None
+    return TemporalSmoother(window=SMOOTH_WINDOW, alpha=SMOOTH_EMA_ALPHA,
+                            prob_threshold=PROB_THRESHOLD, bucket=CONF_BUCKET)
+
+
+def smooth(session, probs, seq):
+    """
+    Đưa xác suất frame (None → không thấy tay) vào smoother của session
+    → payload `prediction` nhãn ổn định, hoặc None nếu không có gì thay đổi để emit.
+    """
+    global _emitted, _suppressed
+    label, conf, changed = session.smoother.update(probs, class_labels())
+    if EMIT_ON_CHANGE and not changed:
+        session.suppressed += 1
+        with _lock:
+            _suppressed += 1
+        return None
+    with _lock:
+        _emitted += 1
+    return {"prediction": label, "confidence": round(conf, 3), **seq}
+
+
+def smoothing_stats():
+    with _lock:
+        emitted, suppressed = _emitted, _suppressed
+    total = emitted + suppressed
+    return {
+        "enabled": SMOOTHING_ENABLED,
+        "window": SMOOTH_WINDOW,
+        "ema_alpha": SMOOTH_EMA_ALPHA,
+        "prob_threshold": PROB_THRESHOLD,
+        "emit_on_change": EMIT_ON_CHANGE,
+        "emitted": emitted,
+        "suppressed": suppressed,
+        "suppressed_ratio": suppressed / total if total else 0.0,
+    }
+
+
+metrics_service.register_stats(
+    "smoothing", smoothing_stats, config=("enabled", "window", "ema_alpha", "prob_threshold", "emit_on_change"),
+    derive=lambda s: {"suppressed_ratio": s["suppressed"] / max(s["emitted"] + s["suppressed"], 1)})
+
+
+@metrics_service.register_gauges
+def _smoothing_gauges():
+    s = smoothing_stats()
+    return {
+        "asl_smoothing_predictions_total": ("Smoothed socket predictions by outcome",
+                                            {'outcome="emitted"': s["emitted"], 'outcome="suppressed"': s["suppressed"]}),
+    }
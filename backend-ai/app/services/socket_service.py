@@ -1,76 +1,128 @@
-import base64
-import cv2
-import numpy as np
 import os
 import absl.logging
 import warnings
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"  # 0=all, 1=info, 2=warning, 3=error only
 absl.logging.set_verbosity(absl.logging.ERROR)
 warnings.filterwarnings("ignore", category=UserWarning)
-import mediapipe as mp
-import time
-from app.services.classifier_service import classifier_predict
+from app.services.classifier_service import classifier_predict, classifier_predict_proba, class_labels
+from app.services.detector_pool import get_hands_pool, DetectorPoolTimeout
+from app.services.log_service import get_logger, StageTimer
+from app.services.session_service import sessions
+from app.services.frame_codec import decode_frame
+from app.services.preprocess_service import detect_keypoints
+from app.services.keypoints_service import keypoints_prediction
+from app.services.smoothing_service import smooth
+from flask import request
 from flask_socketio import emit
 
-mp_hands = mp.solutions.hands
+log = get_logger("socket_service")
 
-def decode_base64_image(base64_string):
-    """Chuyển base64 string → numpy array (ảnh BGR)"""
-    try:
-        img_data = base64.b64decode(base64_string.split(",")[1])
-        np_arr = np.frombuffer(img_data, np.uint8)
-        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        print(f"📸 [socket_service] Ảnh decode thành công: shape={img.shape}")
-        return img
-    except Exception as e:
-        print(f"❌ [socket_service] Lỗi decode base64: {e}")
-        return None
+def extract_keypoints(img, timer=None, session=None):
+    """Extract 21 keypoints bằng Mediapipe (session → detector tracking-mode + ROI của client)"""
+    if session is None:
+        return detect_keypoints(img, get_hands_pool(), timer)
+    return detect_keypoints(img, session, timer, roi=session.roi)
+
+def classify_gated(kps, session, timer):
+    """
+    → (label, conf, probs | None). Dùng lại prediction trước nếu motion gate của session cho phép;
+    probs chỉ cần cho smoothing nên không có session → None.
+    """
+    if session is None:
+        return (*classifier_predict(kps, timer), None)
+    with timer.stage("motion_gate"):
+        cached = session.motion.lookup(kps)
+    if cached is not None:
+        return cached
+    probs = classifier_predict_proba(kps, timer)
+    idx = int(probs.argmax())
+    pred, conf = class_labels()[idx], float(probs[idx])
+    session.motion.update(pred, conf, probs)
+    return pred, conf, probs
 
-def extract_keypoints(img):
-    """Extract 21 keypoints bằng Mediapipe"""
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    with mp_hands.Hands(static_image_mode=True, max_num_hands=1,
-                        min_detection_confidence=0.5) as hands:
-        result = hands.process(img_rgb)
+def frame_prediction(data, session):
+    """
+    Decode → detect → classify 1 frame → payload `prediction` (không emit; dùng được ở process con).
+    Session có smoother → nhãn đã làm mượt, None khi không có gì mới để emit.
+    """
+    timer = StageTimer("socket:frame")
+    with timer.stage("decode"):
+        img, meta = decode_frame(data)
+    seq = {"seq": meta["seq"]} if "seq" in meta else {}
+    if img is None:
+        timer.finish(result="INVALID", bytes=len(data))
+        return {"error": "Invalid image data", **seq}
 
-        if not result.multi_hand_landmarks:
-            print("⚠️ [socket_service] Không phát hiện bàn tay.")
-            return None
+    try:
+        kps = extract_keypoints(img, timer, session)
+    except DetectorPoolTimeout:
+        timer.finish(result="BUSY")
+        return {"prediction": "BUSY", "confidence": 0.0, **seq}
+    smoothing = session is not None and session.smoother is not None
+    if kps is None:
+        if session is not None:
+            session.motion.reset()
+        timer.finish(result="NO_HAND", bytes=len(data))
+        if smoothing:
+            return smooth(session, None, seq)
+        return {"prediction": "NO_HAND", "confidence": 0.0, **seq}
 
-        lm = result.multi_hand_landmarks[0]
-        kps = np.array([[p.x * 200, p.y * 200] for p in lm.landmark])
-        print(f"🖐️ [socket_service] Phát hiện {len(kps)} keypoints.")
-        return kps
+    pred, conf, probs = classify_gated(kps, session, timer)
+    timer.finish(result=pred, confidence=round(conf, 3), bytes=len(data))
+    if smoothing:
+        return smooth(session, probs, seq)
+    return {"prediction": pred, "confidence": round(conf, 3), **seq}
+
+def process_frame(data, session):
+    """Xử lý 1 frame và emit `prediction` cho client hiện tại (bỏ qua nếu nhãn ổn định không đổi)."""
+    payload = frame_prediction(data, session)
+    if payload is not None:
+        emit("prediction", payload)
 
 def register_socket_events(socketio):
     """Đăng ký sự kiện cho Flask-SocketIO"""
 
     @socketio.on("connect")
     def handle_connect():
-        print("✅ [socket_service] Client connected")
+        log.info("Client connected")
+        sessions.open(request.sid)
 
     @socketio.on("disconnect")
     def handle_disconnect():
-        print("❌ [socket_service] Client disconnected")
+        log.info("Client disconnected")
+        sessions.close(request.sid)
+
+    @socketio.on("set_fps")
+    def handle_set_fps(data):
+        """Client yêu cầu tốc độ xử lý tối đa: {"fps": 10}; 0/null → không giới hạn"""
+        session = sessions.get(request.sid)
+        if session is None:
+            return
+        try:
+            session.set_target_fps((data or {}).get("fps"))
+        except (TypeError, ValueError, AttributeError):
+            emit("frame_stats", {"error": "Invalid fps"})
+            return
+        emit("frame_stats", session.frame_stats())
 
     @socketio.on("frame")
     def handle_frame(data):
-        """Nhận 1 frame base64 từ frontend"""
-        print(f"📡 [socket_service] Nhận frame từ FE, kích thước: {len(data)} bytes")
-
-        start = time.time()
-        img = decode_base64_image(data)
-        if img is None:
-            emit("prediction", {"error": "Invalid image data"})
+        """Nhận 1 frame từ frontend: data URL base64 hoặc bytes JPEG/WebP (+ header seq/size)"""
+        session = sessions.get(request.sid)
+        if session is None:
+            process_frame(data, None)
             return
 
-        kps = extract_keypoints(img)
-        if kps is None:
-            emit("prediction", {"prediction": "NO_HAND", "confidence": 0.0})
-            print(f"⏱️ [socket_service] Không có tay — mất {time.time()-start:.2f}s\n")
-            return
+        def _process(f):
+            process_frame(f, session)
+            if session.should_report():
+                emit("frame_stats", session.frame_stats())
 
-        pred, conf = classifier_predict(kps)
-        print(f"🎯 [socket_service] Dự đoán: {pred} ({conf:.2f}) | Tổng thời gian {time.time()-start:.2f}s\n")
+        # đang có frame xử lý dở → frame này chỉ thay frame chờ (latest frame wins)
+        session.run_latest(data, _process)
 
-        emit("prediction", {"prediction": pred, "confidence": round(conf, 3)})
+    @socketio.on("keypoints")
+    def handle_keypoints(data):
+        """21 landmark (x, y) chuẩn hoá do client tự detect (JSON hoặc float32 packed), có thể là batch"""
+        event, payload = keypoints_prediction(data)
+        emit(event, payload)
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.services import metrics_service
+from app.services.log_service import get_logger
+
+log = get_logger("warmup_service")
+
+# =====================================
+# ⚙️ CONFIG
+# =====================================
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1") == "1"   # 0 → load ở request / readiness probe đầu tiên
+
+
+class Warmup:
+    """
+    Load các thành phần nặng (model, detector) trong 1 thread nền sau khi app đã nhận request.
+    Liveness (/healthz) trả lời ngay; readiness (/readyz) chỉ OK khi mọi thành phần đã load xong.
+    """
+
+    def __init__(self):
+        self._components = OrderedDict()   # name → {"fn", "state", "seconds", "error"}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._done = threading.Event()
+        self._started_at = time.time()
+
+    def add(self, name, fn):
+        with self._lock:
+            self._components[name] = {"fn": fn, "state": "pending", "seconds": None, "error": None}
+
+    def record(self, name, seconds):
+        """Ghi thời gian của bước đã chạy xong (vd. import app)."""
+        with self._lock:
+            self._components[name] = {"fn": None, "state": "ready", "seconds": seconds, "error": None}
+
+    def _run(self):
+        for name, comp in list(self._components.items()):
+            if comp["fn"] is None:
+                continue
+            comp["state"] = "loading"
+            start = time.time()
+            try:
+                comp["fn"]()
+                comp["state"] = "ready"
+            except Exception as e:
+                comp["state"], comp["error"] = "failed", str(e)
+                log.exception("Warm-up of %s failed", name)
+            comp["seconds"] = round(time.time() - start, 3)
+            log.info("Warm-up %s: %s in %.2fs", name, comp["state"], comp["seconds"])
+        self._done.set()
+
+    def start(self, background=True):
+        with self._lock:
+            if self._thread is not None or self._done.is_set():
+                return
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        if background:
+            self._thread.start()
+        else:
+            self._run()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def ready(self):
+        with self._lock:
+            return self._done.is_set() and all(c["state"] == "ready" for c in self._components.values())
+
+    def status(self):
+        with self._lock:
+            return {
+                "ready": self._done.is_set() and all(c["state"] == "ready" for c in self._components.values()),
+                "uptime_s": round(time.time() - self._started_at, 3),
+                "components": {
+                    name: {k: v for k, v in c.items() if k != "fn" and v is not None}
+                    for name, c in self._components.items()
+                },
+            }
+
+
+warmup = Warmup()
+
+
+@metrics_service.register_gauges
+def _warmup_gauges():
+    s = warmup.status()
+    return {
+        "asl_ready": ("1 once every warm-up component has loaded", int(s["ready"])),
+        "asl_startup_seconds": ("Load time of each startup component",
+                                {f'component="{k}"': c["seconds"] for k, c in s["components"].items()
+                                 if "seconds" in c}),
+    }
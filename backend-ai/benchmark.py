@@ -1,25 +1,31 @@
 import pandas as pd
 import numpy as np
 import time, json
+from joblib import dump
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.calibration import CalibratedClassifierCV
 from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+from dataset_store import load_frame
+from features import FEATURE_VERSION
 
 # ======================
 # ⚙️ CONFIG
 # ======================
-CSV_PATH = "/home/namdang-fdp/Projects/hand-detect-ai/feature_dataset.csv"
+CSV_PATH = "/home/namdang-fdp/Projects/hand-detect-ai/feature_dataset.csv"  # hoặc feature_dataset.npstore
 OUTPUT_JSON = "/home/namdang-fdp/Projects/hand-detect-ai/model_benchmark.json"
 OUTPUT_CSV  = "/home/namdang-fdp/Projects/hand-detect-ai/model_benchmark.csv"
+# model rẻ cho cascade (cascade.py); scaler giống hệt feature_scaler.pkl vì cùng split + seed
+LR_MODEL_PATH = "/home/namdang-fdp/Projects/hand-detect-ai/lr_l1_feature.pkl"
+ET_MODEL_PATH = "/home/namdang-fdp/Projects/hand-detect-ai/et_shallow_feature.pkl"
 
 # ======================
 # 📦 LOAD DATA
 # ======================
 print("🚀 Loading feature dataset...")
-df = pd.read_csv(CSV_PATH)
+df = load_frame(CSV_PATH, feature_version=FEATURE_VERSION)
 df = df[~df["label"].isin({"space", "nothing", "del"})].reset_index(drop=True)
 X = df.drop(columns=["label"])
 y = df["label"]
@@ -91,6 +97,8 @@ results.append(benchmark_model("Extra Trees (Shallow)", et))
 # 💾 SAVE RESULTS
 # ======================
 pd.DataFrame(results).to_csv(OUTPUT_CSV, index=False)
+dump(lr, LR_MODEL_PATH)
+dump(et, ET_MODEL_PATH)
 with open(OUTPUT_JSON, "w") as f:
     json.dump({"benchmark_results": results}, f, indent=2)
 
@@ -101,4 +109,5 @@ for r in results:
 print("💾 Saved to:")
 print(f"   - {OUTPUT_JSON}")
 print(f"   - {OUTPUT_CSV}")
+print(f"   - {LR_MODEL_PATH}, {ET_MODEL_PATH} (model rẻ cho cascade.py)")
 print("==============================================")
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cascade classifier: model rẻ (LogisticRegression L1 / ExtraTrees nông từ benchmark.py) trả lời trước,
+chỉ mẫu nó không chắc (max proba < threshold) mới chạy qua RandomForest calibrated.
+
+Chọn threshold offline trên tập held-out (cùng split với train/benchmark: test_size=0.2, seed 42):
+    python cascade.py feature_dataset.csv et_shallow_feature.pkl rf_mediapipe_feature_calibrated.pkl \\
+        feature_scaler.pkl cascade.json --budget 0.005
+→ threshold thấp nhất (nhiều mẫu dừng ở model rẻ nhất) mà accuracy cascade ≥ accuracy RF − budget.
+"""
+
+import argparse
+import json
+import threading
+import time
+import numpy as np
+
+DEFAULT_GRID = np.round(np.arange(0.30, 1.0, 0.005), 3)
+
+
+class CascadeClassifier:
+    """Cùng interface clf sklearn (`classes_`, `predict_proba`); đếm số mẫu dừng ở từng stage."""
+
+    def __init__(self, cheap, big, threshold):
+        if not np.array_equal(np.asarray(cheap.classes_), np.asarray(big.classes_)):
+            raise ValueError("Cheap and big models must have identical classes_")
+        self.cheap = cheap
+        self.big = big
+        self.threshold = float(threshold)
+        self.classes_ = big.classes_
+        self._lock = threading.Lock()
+        self.cheap_hits = self.fallthrough = 0
+
+    def predict_proba(self, X, stage_ms=None):
+        """stage_ms (dict, tuỳ chọn) nhận thời gian "cheap" và "predict" (model lớn) theo ms."""
+        t0 = time.perf_counter()
+        probs = self.cheap.predict_proba(X)
+        t1 = time.perf_counter()
+        unsure = probs.max(axis=1) < self.threshold
+        n_unsure = int(unsure.sum())
+        if n_unsure:
+            probs = probs.copy()
+            probs[unsure] = self.big.predict_proba(X[unsure])
+        t2 = time.perf_counter()
+        with self._lock:
+            self.cheap_hits += len(probs) - n_unsure
+            self.fallthrough += n_unsure
+        if stage_ms is not None:
+            stage_ms["cheap"] = (t1 - t0) * 1000
+            stage_ms["predict"] = (t2 - t1) * 1000
+        return probs
+
+    def predict(self, X):
+        return np.asarray(self.classes_)[np.argmax(self.predict_proba(X), axis=1)]
+
+    def stats(self):
+        with self._lock:
+            total = self.cheap_hits + self.fallthrough
+            return {
+                "enabled": True,
+                "threshold": self.threshold,
+                "cheap_model": type(self.cheap).__name__,
+                "cheap_hits": self.cheap_hits,
+                "fallthrough": self.fallthrough,
+                "cheap_hit_rate": self.cheap_hits / total if total else 0.0,
+            }
+
+
+def threshold_table(cheap_proba, big_pred, y_true, classes, grid=DEFAULT_GRID):
+    """Accuracy + tỉ lệ dừng ở model rẻ cho từng threshold trong grid."""
+    classes = np.asarray(classes)
+    conf = cheap_proba.max(axis=1)
+    cheap_pred = classes[np.argmax(cheap_proba, axis=1)]
+    rows = []
+    for t in grid:
+        use_cheap = conf >= t
+        pred = np.where(use_cheap, cheap_pred, big_pred)
+        rows.append({"threshold": float(t), "accuracy": float(np.mean(pred == y_true)),
+                     "cheap_rate": float(use_cheap.mean())})
+    return rows
+
+
+def pick_threshold(table, big_accuracy, budget):
+    """Threshold có cheap_rate cao nhất mà accuracy ≥ big_accuracy − budget (None nếu không có)."""
+    ok = [r for r in table if r["accuracy"] >= big_accuracy - budget]
+    return max(ok, key=lambda r: (r["cheap_rate"], -r["threshold"])) if ok else None
+
+
+def tune(data_path, cheap_path, big_path, scaler_path, out_path, budget):
+    from joblib import load
+    from sklearn.model_selection import train_test_split
+    from dataset_store import load_frame
+    from features import FEATURE_VERSION
+
+    df = load_frame(data_path, feature_version=FEATURE_VERSION)
+    df = df[~df["label"].isin({"space", "nothing", "del"})].reset_index(drop=True)
+    X, y = df.drop(columns=["label"]), df["label"]
+    _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+
+    scaler, cheap, big = load(scaler_path), load(cheap_path), load(big_path)
+    X_test = scaler.transform(X_test)
+    y_test = y_test.to_numpy()
+
+    start = time.perf_counter()
+    big_pred = big.predict(X_test)
+    big_time = time.perf_counter() - start
+    start = time.perf_counter()
+    cheap_proba = cheap.predict_proba(X_test)
+    cheap_time = time.perf_counter() - start
+    big_acc = float(np.mean(big_pred == y_test))
+
+    table = threshold_table(cheap_proba, big_pred, y_test, big.classes_)
+    best = pick_threshold(table, big_acc, budget)
+    if best is None:
+        print(f"❌ Không threshold nào giữ được accuracy ≥ {big_acc - budget:.4f}")
+        return None
+
+    est_speedup = big_time / (cheap_time + (1 - best["cheap_rate"]) * big_time)
+    config = {
+        "cheap_model": cheap_path,
+        "threshold": best["threshold"],
+        "budget": budget,
+        "big_accuracy": big_acc,
+        "cascade_accuracy": best["accuracy"],
+        "cheap_rate": best["cheap_rate"],
+        "estimated_speedup": est_speedup,
+        "n_test": int(len(y_test)),
+    }
+    with open(out_path, "w") as f:
+        json.dump(config, f, indent=2)
+    print(f"✅ threshold={best['threshold']:.3f} | cheap_rate={best['cheap_rate']:.1%} | "
+          f"acc={best['accuracy']:.4f} (RF {big_acc:.4f}) | ~{est_speedup:.1f}x → {out_path}")
+    return config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chọn threshold cho cascade model rẻ → RandomForest")
+    parser.add_argument("data", help="feature_dataset.csv hoặc .npstore")
+    parser.add_argument("cheap", help="Model rẻ (.pkl, vd. et_shallow_feature.pkl từ benchmark.py)")
+    parser.add_argument("big", help="RandomForest calibrated (.pkl)")
+    parser.add_argument("scaler", help="feature_scaler.pkl")
+    parser.add_argument("out", help="cascade.json")
+    parser.add_argument("--budget", type=float, default=0.005, help="Accuracy tối đa được mất so với RF")
+    args = parser.parse_args()
+    tune(args.data, args.cheap, args.big, args.scaler, args.out, args.budget)
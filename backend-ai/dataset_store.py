@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Binary dataset store (thay cho CSV trung gian giữa các bước pipeline)
+
+Một store là 1 thư mục `<name>.npstore/` gồm:
+    data.f32     : float32 row-major (n_rows, n_cols), mở bằng np.memmap → zero-copy
+    labels.npy   : uint16, chỉ số vào meta["classes"]
+    meta.json    : {"columns", "classes", "n_rows", "feature_version", "landmark_scale", ...}
+
+Dùng:
+    python dataset_store.py in.csv out.npstore     # convert CSV (keypoints hoặc features) → store
+"""
+
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+STORE_SUFFIX = ".npstore"
+LANDMARK_SCALE = 200.0         # giống lúc build dataset (lm.x * 200)
+DATA_FILE, LABELS_FILE, META_FILE = "data.f32", "labels.npy", "meta.json"
+
+
+def is_store(path):
+    return str(path).rstrip("/").endswith(STORE_SUFFIX)
+
+
+class StoreWriter:
+    """
+    Ghi store theo từng chunk (append), meta được chốt khi close().
+    Chưa close() → không có meta.json → load_store không mở được store dở dang.
+    """
+
+    def __init__(self, path, columns, **meta):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._remove(META_FILE)   # ghi đè store cũ: meta cũ không được đi kèm data mới
+        self.columns = list(columns)
+        self.meta = {"landmark_scale": LANDMARK_SCALE, **meta}
+        self._data = open(os.path.join(path, DATA_FILE), "wb")
+        self._class_idx = {}
+        self._labels = []
+        self.n_rows = 0
+
+    def append(self, X, labels):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != len(self.columns):
+            raise ValueError(f"Expected (n, {len(self.columns)}) rows, got {X.shape}")
+        codes = [self._class_idx.setdefault(str(l), len(self._class_idx)) for l in labels]
+        self._data.write(X.tobytes())
+        self._labels.extend(codes)
+        self.n_rows += len(X)
+
+    def close(self):
+        self._data.close()
+        np.save(os.path.join(self.path, LABELS_FILE), np.asarray(self._labels, dtype=np.uint16))
+        meta = {
+            **self.meta,
+            "columns": self.columns,
+            "classes": list(self._class_idx),
+            "n_rows": self.n_rows,
+        }
+        with open(os.path.join(self.path, META_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    def abort(self):
+        """Bỏ store đang ghi dở: xoá data / labels, không ghi meta."""
+        self._data.close()
+        for name in (DATA_FILE, LABELS_FILE, META_FILE):
+            self._remove(name)
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def load_store(path, mmap=True):
+    """→ (X (n_rows, n_cols) float32 [memmap nếu mmap=True], labels ndarray[str], meta)."""
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    shape = (meta["n_rows"], len(meta["columns"]))
+    data_path = os.path.join(path, DATA_FILE)
+    if mmap and meta["n_rows"]:
+        X = np.memmap(data_path, dtype=np.float32, mode="r", shape=shape)
+    else:
+        X = np.fromfile(data_path, dtype=np.float32).reshape(shape)
+    codes = np.load(os.path.join(path, LABELS_FILE))
+    labels = np.asarray(meta["classes"], dtype=object)[codes]
+    return X, labels, meta
+
+
+def load_frame(path, feature_version=None):
+    """
+    Đọc CSV hoặc store thành DataFrame `label + columns` (train/benchmark dùng chung).
+    feature_version: nếu store ghi version khác → báo lỗi thay vì train trên feature cũ.
+    """
+    if not is_store(path):
+        return pd.read_csv(path)
+    X, labels, meta = load_store(path)
+    stored = meta.get("feature_version")
+    if feature_version is not None and stored is not None and stored != feature_version:
+        raise ValueError(f"{path} has feature_version={stored}, expected {feature_version}")
+    df = pd.DataFrame(X, columns=meta["columns"], copy=False)
+    df.insert(0, "label", labels)
+    return df
+
+
+def iter_chunks(path, chunksize):
+    """Duyệt CSV hoặc store theo chunk DataFrame (store: slice memmap, không parse)."""
+    if not is_store(path):
+        yield from pd.read_csv(path, chunksize=chunksize)
+        return
+    X, labels, meta = load_store(path)
+    for i in range(0, len(X), chunksize):
+        chunk = pd.DataFrame(X[i:i + chunksize], columns=meta["columns"], copy=False)
+        chunk.insert(0, "label", labels[i:i + chunksize])
+        yield chunk
+
+
+def convert_csv(csv_path, store_path, chunksize=50_000, **meta):
+    """CSV (label + cột số) → store. CSV chỉ có header → store rỗng (0 hàng)."""
+    try:
+        columns = list(pd.read_csv(csv_path, nrows=0).columns)
+    except pd.errors.EmptyDataError:
+        raise ValueError(f"{csv_path} is empty (no header row)") from None
+    if "label" not in columns:
+        raise ValueError(f"{csv_path} has no 'label' column")
+
+    with StoreWriter(store_path, [c for c in columns if c != "label"], **meta) as writer:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            writer.append(chunk[writer.columns].to_numpy(np.float32), chunk["label"].to_numpy())
+    return writer.n_rows
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or not is_store(sys.argv[2]):
+        print(f"Usage: python dataset_store.py <input.csv> <output{STORE_SUFFIX}>")
+        sys.exit(1)
+    n = convert_csv(sys.argv[1], sys.argv[2])
+    print(f"💾 Converted {n:,} rows → {sys.argv[2]}")
@@ -2,20 +2,29 @@
 # -*- coding: utf-8 -*-
 """
 Live ASL Recognition Demo (Mediapipe + Calibrated RandomForest on 57-dim features)
+
+Mặc định chạy pipeline 3 tầng: thread capture → thread inference → render loop, nối với nhau
+bằng slot "giá trị mới nhất" (frame cũ bị ghi đè chứ không xếp hàng) → FPS hiển thị theo
+camera, inference chạy nhanh nhất có thể trên frame mới nhất.
+
+    python demo.py                              # webcam, pipelined
+    python demo.py --sequential                 # vòng lặp tuần tự cũ (để so sánh)
+    python demo.py --source clip.mp4 --headless # benchmark không cần màn hình / camera
 """
 
 import os
 os.environ["QT_QPA_PLATFORM"] = "xcb"
 os.environ["MEDIAPIPE_USE_GPU"] = "true"
 
+import argparse
+import threading
 import cv2
 import mediapipe as mp
 import numpy as np
-import collections
 import time
-import pandas as pd
 from joblib import load
 from features import extract_features  # ✅ dùng lại đúng feature pipeline 57-dim
+from smoothing import TemporalSmoother, UNKNOWN, NO_HAND
 
 # ======================
 # ⚙️ CONFIG
@@ -25,9 +34,16 @@ SCALER_PATH = "/home/namdang-fdp/Projects/hand-detect-ai/feature_scaler.pkl"
 
 PROB_THRESHOLD = 0.45          # < ngưỡng → gán UNKNOWN
 SMOOTH_WINDOW  = 7             # số frame để lấy mode ổn định
+SMOOTH_ALPHA   = 0.3           # EMA xác suất (smoothing.TemporalSmoother)
 DRAW_COLOR     = (0, 255, 0)   # nhãn dự đoán
+RAW_COLOR      = (0, 200, 255) # nhãn thô của frame hiện tại (chưa smoothing)
+INFO_COLOR     = (255, 255, 0) # overlay FPS / timing
 FPS_EVERY_N    = 10            # cập nhật FPS mỗi N frame
+TIMING_EMA     = 0.1           # làm mượt số ms từng stage trên overlay
 LANDMARK_SCALE = 200.0         # giống lúc build dataset
+CAMERA_RETRIES = 50            # đọc camera lỗi liên tiếp N lần → dừng
+CAMERA_RETRY_S = 0.02          # chờ giữa 2 lần đọc lỗi (không quay vòng rỗng)
+WINDOW_NAME    = "ASL Recognition (Mediapipe + RF Calibrated, 57 features)"
 
 # ======================
 # 🧩 INIT MODELS
@@ -37,15 +53,23 @@ clf = load(MODEL_PATH)
 scaler = load(SCALER_PATH)
 print(f"✅ Loaded model with {len(getattr(clf, 'classes_', []))} classes")
 
+# StandardScaler → chuẩn hoá thẳng trên numpy, không dựng DataFrame mỗi frame
+SCALE_MEAN = np.asarray(scaler.mean_, dtype=np.float32)
+SCALE_STD = np.asarray(scaler.scale_, dtype=np.float32)
+CLASSES = list(clf.classes_)
+
 mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(
-    static_image_mode=False,
-    max_num_hands=1,
-    min_detection_confidence=0.40,
-    min_tracking_confidence=0.30
-)
 mp_drawing = mp.solutions.drawing_utils
 
+
+def new_hands():
+    return mp_hands.Hands(
+        static_image_mode=False,
+        max_num_hands=1,
+        min_detection_confidence=0.40,
+        min_tracking_confidence=0.30
+    )
+
 # ======================
 # 🔧 HELPERS
 # ======================
@@ -56,98 +80,337 @@ def draw_label(img, text, org, color=(0, 255, 0)):
     cv2.rectangle(img, (x, y - tht - 12), (x + tw + 10, y), (0, 0, 0), -1)
     cv2.putText(img, text, (x + 5, y - 5), cv2.FONT_HERSHEY_SIMPLEX, fs, color, th, cv2.LINE_AA)
 
-def features_to_df(feats: np.ndarray) -> pd.DataFrame:
-    """
-    Trả về DataFrame 1 hàng với tên cột f1..f57 để
-    khớp với StandardScaler đã fit trên DataFrame (tránh warning).
-    """
-    n = feats.shape[-1]
-    cols = [f"f{i+1}" for i in range(n)]
-    return pd.DataFrame([feats.astype(np.float32)], columns=cols)
+
+def draw_info(img, lines):
+    for i, text in enumerate(lines):
+        cv2.putText(img, text, (20, 40 + i * 28), cv2.FONT_HERSHEY_SIMPLEX, 0.7, INFO_COLOR, 2, cv2.LINE_AA)
+
+
+def open_source(source):
+    """Số → webcam (lật gương), còn lại → file video. → (cap, is_camera)"""
+    is_camera = str(source).isdigit()
+    cap = cv2.VideoCapture(int(source) if is_camera else source)
+    if is_camera:
+        # tuỳ camera:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH,  1280)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+    return cap, is_camera
+
+
+class LatestSlot:
+    """Slot 1 phần tử: put() ghi đè giá trị cũ, get() chờ giá trị mới hơn `after` (theo seq)."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._value = None
+        self.seq = 0
+        self.closed = False
+
+    def put(self, value):
+        with self._cond:
+            self._value = value
+            self.seq += 1
+            self._cond.notify_all()
+
+    def get(self, after=0, timeout=None):
+        """→ (seq, value) mới hơn `after`; (after, None) nếu hết timeout hoặc slot đã đóng."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > after or self.closed, timeout)
+            if self.seq <= after:
+                return after, None
+            return self.seq, self._value
+
+    def peek(self):
+        with self._cond:
+            return self._value
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class Rate:
+    """FPS cập nhật mỗi FPS_EVERY_N lần tick(); `skipped` = frame bị bỏ qua vì đã có frame mới hơn."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.skipped = 0
+        self.fps = 0.0
+        self.start = self._last = time.perf_counter()
+
+    def tick(self):
+        self.count += 1
+        self.total += 1
+        if self.count >= FPS_EVERY_N:
+            now = time.perf_counter()
+            self.fps = self.count / (now - self._last)
+            self._last, self.count = now, 0
+
+    def average(self):
+        elapsed = time.perf_counter() - self.start
+        return self.total / elapsed if elapsed > 0 else 0.0
+
+
+class StageTimes:
+    """ms theo stage: EMA cho overlay + tổng cho bản tóm tắt cuối."""
+
+    def __init__(self):
+        self.ema = {}
+        self.total = {}
+        self.n = 0
+        self._lock = threading.Lock()
+
+    def add(self, stage_ms):
+        with self._lock:
+            self.n += 1
+            for k, v in stage_ms.items():
+                self.ema[k] = v if k not in self.ema else self.ema[k] + TIMING_EMA * (v - self.ema[k])
+                self.total[k] = self.total.get(k, 0.0) + v
+
+    def overlay(self):
+        with self._lock:
+            return " ".join(f"{k} {v:.1f}" for k, v in self.ema.items()) + " ms"
+
+    def averages(self):
+        with self._lock:
+            return {k: v / self.n for k, v in self.total.items()} if self.n else {}
+
+def read_frame(cap, is_camera):
+    """Frame kế tiếp (camera: đã lật gương) hoặc None khi hết file / camera lỗi CAMERA_RETRIES lần liên tiếp."""
+    for _ in range(CAMERA_RETRIES if is_camera else 1):
+        ret, frame = cap.read()
+        if ret:
+            return cv2.flip(frame, 1) if is_camera else frame
+        if is_camera:
+            time.sleep(CAMERA_RETRY_S)
+    if is_camera:
+        print(f"⚠️ Camera returned no frame {CAMERA_RETRIES} times in a row, stopping")
+    return None
 
 # ======================
-# 🎥 MAIN LOOP
+# 🧠 INFERENCE
 # ======================
-def main():
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("❌ Cannot open webcam.")
+def infer(frame, hands, smoother):
+    """1 frame BGR (đã lật) → dict kết quả + ms từng stage."""
+    stage_ms = {}
+    t0 = time.perf_counter()
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    results = hands.process(rgb)
+    t1 = time.perf_counter()
+    stage_ms["detect"] = (t1 - t0) * 1000
+
+    if not results.multi_hand_landmarks:
+        stable, conf, _ = smoother.update(None, CLASSES)
+        stage_ms["smooth"] = (time.perf_counter() - t1) * 1000
+        return {"landmarks": None, "pred": NO_HAND, "prob": 0.0, "stable": stable,
+                "conf": conf, "stage_ms": stage_ms}
+
+    # chỉ lấy bàn tay đầu tiên (max_num_hands=1)
+    hand_landmarks = results.multi_hand_landmarks[0]
+
+    # === 1) Lấy 21 keypoints theo đúng scale như lúc build dataset
+    kps = np.array(
+        [[lm.x * LANDMARK_SCALE, lm.y * LANDMARK_SCALE] for lm in hand_landmarks.landmark],
+        dtype=np.float32
+    )  # shape (21, 2)
+
+    # === 2) Trích 57-dim features đúng pipeline training, chuẩn hoá như lúc train
+    feats = extract_features(kps)                            # shape (57,)
+    t2 = time.perf_counter()
+    X_std = ((feats - SCALE_MEAN) / SCALE_STD)[None, :]      # 1x57
+    t3 = time.perf_counter()
+
+    # === 3) Dự đoán
+    probs = clf.predict_proba(X_std)[0]
+    t4 = time.perf_counter()
+    pred_idx = int(np.argmax(probs))
+    prob = float(probs[pred_idx])
+    pred_label = CLASSES[pred_idx] if prob >= PROB_THRESHOLD else UNKNOWN
+
+    # === 4) Smoothing: vote O(1) + EMA xác suất
+    stable, conf, _ = smoother.update(probs, CLASSES)
+    t5 = time.perf_counter()
+
+    stage_ms.update(features=(t2 - t1) * 1000, scale=(t3 - t2) * 1000,
+                    predict=(t4 - t3) * 1000, smooth=(t5 - t4) * 1000)
+    return {"landmarks": hand_landmarks, "pred": pred_label, "prob": prob, "stable": stable,
+            "conf": conf, "stage_ms": stage_ms}
+
+
+def draw_result(frame, result):
+    hand_landmarks = result["landmarks"]
+    if hand_landmarks is None:
         return
+    mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+    h, w, _ = frame.shape
+    x0 = int(hand_landmarks.landmark[0].x * w)
+    y0 = int(hand_landmarks.landmark[0].y * h)
+    draw_label(frame, f"{result['stable']} ({result['conf']*100:.1f}%)", (x0 + 20, max(30, y0 - 10)), DRAW_COLOR)
+    draw_label(frame, f"raw {result['pred']} ({result['prob']*100:.1f}%)", (x0 + 20, max(70, y0 + 30)), RAW_COLOR)
 
-    # tuỳ camera:
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH,  1280)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+# ======================
+# 🚀 PIPELINED MODE
+# ======================
+def capture_loop(cap, is_camera, frames, pace, max_frames, rate, stop):
+    """Đọc frame liên tục vào slot; file video được đọc theo FPS gốc nếu `pace`."""
+    interval = 0.0
+    if pace and not is_camera:
+        src_fps = cap.get(cv2.CAP_PROP_FPS)
+        interval = 1.0 / src_fps if src_fps > 0 else 0.0
+    next_at = time.perf_counter()
+    while not stop.is_set() and (not max_frames or rate.total < max_frames):
+        frame = read_frame(cap, is_camera)
+        if frame is None:
+            break   # hết file / camera lỗi
+        frames.put((time.perf_counter(), frame))
+        rate.tick()
+        if interval:
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    frames.close()
 
-    history = collections.deque(maxlen=SMOOTH_WINDOW)
-    frame_count = 0
-    last_time = time.time()
 
-    print("🎬 Live demo started (press 'q' to quit)\n")
+def inference_loop(frames, results, times, rate):
+    """Luôn lấy frame mới nhất; frame bị ghi đè khi đang bận → bỏ qua (không xếp hàng)."""
+    hands = new_hands()
+    smoother = TemporalSmoother(window=SMOOTH_WINDOW, alpha=SMOOTH_ALPHA, prob_threshold=PROB_THRESHOLD)
+    seq = 0
+    try:
+        while True:
+            prev = seq
+            seq, item = frames.get(after=seq)
+            if item is None:
+                break   # capture đã dừng
+            rate.skipped += seq - prev - 1
+            captured_at, frame = item
+            result = infer(frame, hands, smoother)
+            result["latency_ms"] = (time.perf_counter() - captured_at) * 1000
+            times.add(result["stage_ms"])
+            results.put(result)
+            rate.tick()
+    finally:
+        hands.close()
+        results.close()
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            continue
-
-        frame = cv2.flip(frame, 1)  # lật gương
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = hands.process(rgb)
-
-        if results.multi_hand_landmarks:
-            # chỉ lấy bàn tay đầu tiên (max_num_hands=1)
-            hand_landmarks = results.multi_hand_landmarks[0]
-
-            # === 1) Lấy 21 keypoints theo đúng scale như lúc build dataset
-            kps = np.array(
-                [[lm.x * LANDMARK_SCALE, lm.y * LANDMARK_SCALE] for lm in hand_landmarks.landmark],
-                dtype=np.float32
-            )  # shape (21, 2)
-
-            # === 2) Trích 57-dim features đúng pipeline training
-            feats = extract_features(kps)                     # shape (57,)
-            X_df  = features_to_df(feats)                    # DataFrame 1x57
-            X_std = scaler.transform(X_df)                   # chuẩn hoá như lúc train
-
-            # === 3) Dự đoán
-            probs = clf.predict_proba(X_std)[0]
-            pred_idx = int(np.argmax(probs))
-            pred_label = clf.classes_[pred_idx]
-            prob = float(probs[pred_idx])
-
-            if prob < PROB_THRESHOLD:
-                pred_label = "UNKNOWN"
-
-            # === 4) Smoothing kết quả
-            history.append(pred_label)
-            stable = max(set(history), key=history.count)
-
-            # === 5) Vẽ landmarks + label
-            mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-            h, w, _ = frame.shape
-            x0 = int(hand_landmarks.landmark[0].x * w)
-            y0 = int(hand_landmarks.landmark[0].y * h)
-            draw_label(frame, f"{stable} ({prob*100:.1f}%)", (x0 + 20, max(30, y0 - 10)), DRAW_COLOR)
-
-            # Log nhẹ cho debug
-            print(f"[Frame] Pred={pred_label}, Stable={stable}, Prob={prob:.3f}")
+
+def run_pipelined(cap, is_camera, headless, pace, max_frames):
+    frames, results = LatestSlot(), LatestSlot()
+    cap_rate, inf_rate, render_rate = Rate(), Rate(), Rate()
+    times = StageTimes()
+    stop = threading.Event()
+
+    capture = threading.Thread(target=capture_loop, name="capture", daemon=True,
+                               args=(cap, is_camera, frames, pace, max_frames, cap_rate, stop))
+    worker = threading.Thread(target=inference_loop, name="inference", daemon=True,
+                              args=(frames, results, times, inf_rate))
+    capture.start()
+    worker.start()
+
+    try:
+        if headless:
+            worker.join()
+        else:
+            seq = 0
+            while worker.is_alive():
+                seq, item = frames.get(after=seq, timeout=0.5)
+                if item is None:
+                    continue
+                frame = item[1].copy()
+                result = results.peek()
+                if result is not None:
+                    draw_result(frame, result)
+                render_rate.tick()
+                draw_info(frame, [
+                    f"capture {cap_rate.fps:.1f} fps | infer {inf_rate.fps:.1f} fps | render {render_rate.fps:.1f} fps",
+                    times.overlay(),
+                    f"latency {result['latency_ms']:.0f} ms | skipped {inf_rate.skipped} frames" if result else "",
+                ])
+                cv2.imshow(WINDOW_NAME, frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        capture.join()   # capture dừng hẳn trước khi main() gọi cap.release()
+        worker.join(timeout=2)
+
+    print("\n📊 Summary (pipelined)")
+    print(f"   capture : {cap_rate.total} frames @ {cap_rate.average():.1f} fps")
+    print(f"   infer   : {inf_rate.total} frames @ {inf_rate.average():.1f} fps "
+          f"(skipped {inf_rate.skipped} stale frames)")
+    for k, v in times.averages().items():
+        print(f"   {k:<8}: {v:.2f} ms")
+
+# ======================
+# 🎥 SEQUENTIAL MODE
+# ======================
+def run_sequential(cap, is_camera, headless, max_frames):
+    """Vòng lặp cũ: capture → inference → vẽ lần lượt; FPS = tổng thời gian mọi stage."""
+    hands = new_hands()
+    smoother = TemporalSmoother(window=SMOOTH_WINDOW, alpha=SMOOTH_ALPHA, prob_threshold=PROB_THRESHOLD)
+    rate, times = Rate(), StageTimes()
+
+    try:
+        while not max_frames or rate.total < max_frames:
+            frame = read_frame(cap, is_camera)
+            if frame is None:
+                break
+
+            result = infer(frame, hands, smoother)
+            times.add(result["stage_ms"])
+            rate.tick()
+            if headless:
+                continue
+
+            draw_result(frame, result)
+            draw_info(frame, [f"FPS: {rate.fps:.1f}", times.overlay()])
+            cv2.imshow(WINDOW_NAME, frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hands.close()
+
+    print("\n📊 Summary (sequential)")
+    print(f"   frames  : {rate.total} @ {rate.average():.1f} fps")
+    for k, v in times.averages().items():
+        print(f"   {k:<8}: {v:.2f} ms")
+
+# ======================
+# 🎬 MAIN
+# ======================
+def main():
+    parser = argparse.ArgumentParser(description="Live ASL recognition demo")
+    parser.add_argument("--source", default="0", help="Chỉ số webcam hoặc đường dẫn file video (mặc định 0)")
+    parser.add_argument("--sequential", action="store_true", help="Chạy tuần tự từng frame thay vì pipeline")
+    parser.add_argument("--headless", action="store_true", help="Không mở cửa sổ, chỉ in thống kê cuối")
+    parser.add_argument("--no-pace", action="store_true",
+                        help="Đọc file video nhanh nhất có thể thay vì theo FPS gốc")
+    parser.add_argument("--max-frames", type=int, default=0, help="Dừng sau N frame capture (0 = không giới hạn)")
+    args = parser.parse_args()
+
+    cap, is_camera = open_source(args.source)
+    if not cap.isOpened():
+        print(f"❌ Cannot open {'webcam' if is_camera else 'video'}: {args.source}")
+        return
+
+    mode = "sequential" if args.sequential else "pipelined"
+    print(f"🎬 Demo started ({mode}{', headless' if args.headless else ''}; press 'q' or Ctrl+C to quit)\n")
+    try:
+        if args.sequential:
+            run_sequential(cap, is_camera, args.headless, args.max_frames)
         else:
-            history.append("NO_HAND")
-            print("🖐️ No hand detected.")
-
-        # === FPS overlay
-        frame_count += 1
-        if frame_count >= FPS_EVERY_N:
-            now = time.time()
-            fps = frame_count / (now - last_time)
-            last_time, frame_count = now, 0
-            cv2.putText(frame, f"FPS: {fps:.1f}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 0), 2)
-
-        cv2.imshow("ASL Recognition (Mediapipe + RF Calibrated, 57 features)", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+            run_pipelined(cap, is_camera, args.headless, not args.no_pace, args.max_frames)
+    finally:
+        cap.release()
+        if not args.headless:
+            cv2.destroyAllWindows()
     print("\n👋 Demo ended.")
 
 if __name__ == "__main__":
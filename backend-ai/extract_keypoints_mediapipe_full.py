@@ -8,30 +8,44 @@ os.environ["TF_XLA_FLAGS"] = "--tf_xla_enable_xla_devices" # toi uu toc do bang
 import absl.logging
 absl.logging.set_verbosity(absl.logging.ERROR)
 
+import argparse # tham so dong lenh
+import collections # deque cho hang doi ket qua
 import cv2 # doc anh csv
 import csv # ghi ket qua ra file csv
+import json # manifest checkpoint
 import mediapipe as mp # thu vien media pipe, trich xuat keypoint tu ban tay
 import numpy as np # xu ly toan hoc, mang
 from tqdm import tqdm # tao thanh progress bar
-import concurrent.futures  # chay nhieu threa song song
+import concurrent.futures  # chay nhieu threa / process song song
 from time import time  # do thoi gian chay
 
 DATASET_DIR = os.path.expanduser("~/Downloads/asl_alphabet_train/asl_alphabet_train/asl_alphabet_train/")
 OUTPUT_CSV = "/home/namdang-fdp/Projects/hand-detect-ai/keypoints_dataset_full_mediapipe.csv"
 MAX_WORKERS = 8
+PROCESS_WORKERS = os.cpu_count() or 4 # so process, moi process 1 Hands rieng
+CHUNK_SIZE = 64 # so anh moi shard gui cho 1 process
+MANIFEST_PATH = OUTPUT_CSV + ".manifest.jsonl" # danh sach anh da xu ly (ke ca that bai)
+FLUSH_EVERY = 500 # so anh giua 2 lan flush + checkpoint
 
 mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(
-    static_image_mode=True,
-    max_num_hands=1,
-    min_detection_confidence=0.3
-)
+hands = None # tao lazy: moi process (hoac main thread) co 1 instance rieng
 
 columns = ["label"] + [f"x{i+1}" for i in range(21)] + [f"y{i+1}" for i in range(21)]
 
+def init_hands():
+    global hands
+    if hands is None:
+        hands = mp_hands.Hands(
+            static_image_mode=True,
+            max_num_hands=1,
+            min_detection_confidence=0.3
+        )
+    return hands
+
+
 def extract_landmarks_from_image(img):
     img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    results = hands.process(img_rgb)
+    results = init_hands().process(img_rgb)
     if not results.multi_hand_landmarks:
         return None
     landmarks = results.multi_hand_landmarks[0]
@@ -44,19 +58,119 @@ def read_image(path):
     return path, img
 
 
-def main():
-    print("🚀 Starting full A–Z extraction with GPU optimization...\n")
-    start = time()
-    total, fail = 0, 0
-    all_rows = []
-
-    classes = sorted([d for d in os.listdir(DATASET_DIR)
-                      if os.path.isdir(os.path.join(DATASET_DIR, d))])
-
+def list_images(classes, skip=frozenset()):
+    """Danh sach (label, path) theo thu tu class → ten file, bo qua anh trong `skip`."""
+    work = []
+    for label in classes:
+        folder = os.path.join(DATASET_DIR, label)
+        img_files = sorted(f for f in os.listdir(folder)
+                           if f.lower().endswith((".jpg", ".jpeg", ".png")))
+        work += [(label, p) for p in (os.path.join(folder, f) for f in img_files) if p not in skip]
+    return work
+
+
+class CheckpointWriter:
+    """
+    Ghi CSV tung hang + manifest checkpoint de co the --resume.
+    Moi checkpoint la 1 dong JSON: {"csv_bytes": kich thuoc CSV da fsync, "done": [path, ...]}.
+    Khi resume, CSV duoc cat ve checkpoint cuoi → khong bi trung hang du crash giua chung.
+    """
+
+    def __init__(self, csv_path, manifest_path, resume=False, flush_every=FLUSH_EVERY):
+        self.csv_path, self.manifest_path = csv_path, manifest_path
+        self.flush_every = flush_every
+        self.done = set()
+        self._pending = []
+
+        csv_bytes = manifest_bytes = 0
+        if resume and os.path.exists(csv_path) and os.path.exists(manifest_path):
+            with open(manifest_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # dong cuoi ghi do dang khi crash
+                    try:
+                        ckpt = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    csv_bytes = ckpt["csv_bytes"]
+                    self.done.update(ckpt["done"])
+                    manifest_bytes += len(line)
+
+        if csv_bytes:
+            self._csv = open(csv_path, "r+", newline="")
+            self._csv.truncate(csv_bytes)
+            self._csv.seek(csv_bytes)
+            # cat bo dong manifest do dang → checkpoint moi khong bi noi vao dong hong
+            self._manifest = open(manifest_path, "r+")
+            self._manifest.truncate(manifest_bytes)
+            self._manifest.seek(manifest_bytes)
+            os.fsync(self._manifest.fileno())
+        else:
+            self.done.clear()
+            self._csv = open(csv_path, "w", newline="")
+            self._manifest = open(manifest_path, "w")
+            csv.writer(self._csv).writerow(columns)
+            self.checkpoint()
+        self._writer = csv.writer(self._csv)
+
+    def write(self, path, row=None):
+        if row is not None:
+            self._writer.writerow(row)
+        self._pending.append(path)
+        if len(self._pending) >= self.flush_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        self._csv.flush()
+        os.fsync(self._csv.fileno())
+        self._manifest.write(json.dumps({"csv_bytes": self._csv.tell(), "done": self._pending}) + "\n")
+        self._manifest.flush()
+        self.done.update(self._pending)
+        self._pending = []
+
+    def close(self):
+        self.checkpoint()
+        self._csv.close()
+        self._manifest.close()
+
+
+def process_shard(shard):
+    """Chay trong worker process: doc + trich keypoint cho 1 shard (label, path)."""
+    out = []
+    for label, path in shard:
+        img = cv2.imread(path)
+        pts = None if img is None else extract_landmarks_from_image(img)
+        out.append((label, path, pts))
+    return out
+
+
+def iter_process_results(work, workers, chunk_size):
+    """
+    Chia work thanh shard, chay tren ProcessPoolExecutor va tra ket qua dung thu tu.
+    So shard dang chay toi da 2*workers → hang doi ket qua bi chan tren, RAM on dinh.
+    """
+    shards = [work[i:i + chunk_size] for i in range(0, len(work), chunk_size)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_hands) as executor:
+        pending = collections.deque()
+        it = iter(shards)
+        for shard in it:
+            pending.append(executor.submit(process_shard, shard))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            yield from pending.popleft().result()
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append(executor.submit(process_shard, nxt))
+
+
+def iter_thread_results(classes, skip=frozenset()):
+    """Che do cu: thread chi doc anh, Mediapipe chay tuan tu tren main thread."""
     for label in classes:
         folder = os.path.join(DATASET_DIR, label)
         img_files = [f for f in os.listdir(folder)
-                     if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+                     if f.lower().endswith((".jpg", ".jpeg", ".png"))
+                     and os.path.join(folder, f) not in skip]
 
         print(f"\n📁 Extracting {label}: {len(img_files)} images")
 
@@ -67,23 +181,53 @@ def main():
                                desc=f"Loading {label}",
                                ncols=80):
                 img_path, img = future.result()
-                if img is None:
-                    fail += 1
-                    continue
+                pts = None if img is None else extract_landmarks_from_image(img)
+                yield label, img_path, pts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract MediaPipe hand keypoints for the ASL dataset")
+    parser.add_argument("--mode", choices=["process", "thread"], default="process",
+                        help="process: moi worker 1 Hands rieng | thread: Mediapipe tuan tu (cu)")
+    parser.add_argument("--workers", type=int, default=PROCESS_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--resume", action="store_true",
+                        help="bo qua anh da co trong manifest, ghi tiep vao OUTPUT_CSV")
+    parser.add_argument("--flush-every", type=int, default=FLUSH_EVERY)
+    return parser.parse_args()
 
-                pts = extract_landmarks_from_image(img)
-                if pts is None:
-                    fail += 1
-                    continue
 
-                row = [label] + pts[:, 0].tolist() + pts[:, 1].tolist()
-                all_rows.append(row)
-                total += 1
+def main():
+    args = parse_args()
+    print(f"🚀 Starting full A–Z extraction ({args.mode} mode)...\n")
+    start = time()
+    total, fail = 0, 0
+    out = CheckpointWriter(OUTPUT_CSV, MANIFEST_PATH, resume=args.resume, flush_every=args.flush_every)
+    if out.done:
+        print(f"♻️ Resuming: {len(out.done):,} images already processed")
+
+    classes = sorted([d for d in os.listdir(DATASET_DIR)
+                      if os.path.isdir(os.path.join(DATASET_DIR, d))])
 
-    with open(OUTPUT_CSV, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(columns)
-        writer.writerows(all_rows)
+    if args.mode == "process":
+        work = list_images(classes, skip=out.done)
+        print(f"📁 {len(work):,} images | {args.workers} workers | chunk={args.chunk_size}")
+        results = tqdm(iter_process_results(work, args.workers, args.chunk_size),
+                       total=len(work), desc="Extracting", ncols=80)
+    else:
+        results = iter_thread_results(classes, skip=out.done)
+
+    try:
+        for label, img_path, pts in results:
+            if pts is None:
+                fail += 1
+                out.write(img_path)
+                continue
+
+            out.write(img_path, [label] + pts[:, 0].tolist() + pts[:, 1].tolist())
+            total += 1
+    finally:
+        out.close()
 
     duration = time() - start
     print("\n==========================================")
@@ -91,9 +235,9 @@ def main():
     print(f"⚠️ Skipped {fail:,} failed detections")
     print(f"🕒 Total time: {duration/60:.1f} minutes ({total/duration:.1f} img/s)")
     print(f"💾 Output CSV: {OUTPUT_CSV}")
+    print(f"📝 Manifest: {MANIFEST_PATH}")
     print("==========================================\n")
 
 
 if __name__ == "__main__":
     main()
-
@@ -1,66 +1,71 @@
 # features.py
 import numpy as np
-from math import atan2, cos, sin
 
 # 21 điểm theo MediaPipe: 0=wrist; thumb:1..4; index:5..8; middle:9..12; ring:13..16; pinky:17..20
 IDX = {"wrist":0,"thumb":[1,2,3,4],"index":[5,6,7,8],"middle":[9,10,11,12],"ring":[13,14,15,16],"pinky":[17,18,19,20]}
 
-def palm_size(kps):
-    w = kps[0]
-    mcps = [kps[5], kps[9], kps[13], kps[17]]
-    return float(np.mean([np.linalg.norm(m-w) for m in mcps]) + 1e-6)
+FINGERS = np.array([IDX[f] for f in ("thumb","index","middle","ring","pinky")])   # (5,4): mcp,pip,dip,tip
+MCPS = [5, 9, 13, 17]
+PAIRS = np.array([(8,12), (4,8), (4,12), (8,0), (12,0)])  # index-mid gap, thumb-index/mid, index-wrist, mid-wrist
+N_FEATURES = 21*2 + 5*2 + len(PAIRS)                      # 57
+FEATURE_VERSION = 1                                        # tăng khi đổi công thức feature
 
-def angle(a,b):
-    na, nb = np.linalg.norm(a), np.linalg.norm(b)
-    if na<1e-6 or nb<1e-6: return 180.0
-    v = np.clip(np.dot(a,b)/(na*nb), -1.0, 1.0)
-    return float(np.degrees(np.arccos(v)))
+def palm_size_batch(k):
+    """k: (N,21,2) đã tịnh tiến về cổ tay → (N,) khoảng cách TB wrist→MCP."""
+    return np.linalg.norm(k[:, MCPS] - k[:, :1], axis=-1).mean(axis=1) + 1e-6
 
-def normalize_xy(kps):
-    """Tịnh tiến về cổ tay, scale theo palm_size, xoay để vector wrist->middle_MCP dọc lên."""
-    k = kps.copy().astype(np.float32)
-    w = k[0]
-    k -= w
-    ps = palm_size(k)
-    k /= ps
+def angle_batch(a, b):
+    """Góc (độ) giữa từng cặp vector a,b (...,2); vector suy biến → 180."""
+    na, nb = np.linalg.norm(a, axis=-1), np.linalg.norm(b, axis=-1)
+    degenerate = (na < 1e-6) | (nb < 1e-6)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        v = np.clip(np.sum(a*b, axis=-1) / (na*nb), -1.0, 1.0)
+    return np.where(degenerate, 180.0, np.degrees(np.arccos(v)))
+
+def normalize_xy_batch(kps):
+    """Tịnh tiến về cổ tay, scale theo palm_size, xoay để vector wrist->middle_MCP dọc lên. (N,21,2)"""
+    k = np.asarray(kps, dtype=np.float32)
+    k = k - k[:, :1]
+    k /= palm_size_batch(k)[:, None, None]
     # hướng trục xoay: wrist -> middle MCP (9)
-    ref = k[9]
-    theta = -atan2(ref[1], ref[0])  # xoay sao cho ref nằm dọc trục x
-    c, s = cos(theta), sin(theta)
-    R = np.array([[c,-s],[s,c]], dtype=np.float32)
-    k = (R @ k.T).T
-    return k  # (21,2)
+    theta = -np.arctan2(k[:, 9, 1].astype(np.float64), k[:, 9, 0])  # xoay sao cho ref nằm dọc trục x
+    c, s = np.cos(theta), np.sin(theta)
+    R = np.stack([np.stack([c,-s], -1), np.stack([s,c], -1)], -2).astype(np.float32)  # (N,2,2)
+    return np.einsum("nij,nkj->nki", R, k)
 
-def finger_metrics(kps, fidx):
-    mcp,pip,dip,tip = kps[fidx[0]], kps[fidx[1]], kps[fidx[2]], kps[fidx[3]]
-    L = np.linalg.norm(tip-mcp)             # (đã chuẩn hoá trong normalize_xy)
-    A = angle(pip-mcp, dip-pip)             # nhỏ → thẳng
-    return L, A
+def finger_metrics_batch(k):
+    """Độ dài mcp→tip + góc tại PIP của 5 ngón → (N,10) theo thứ tự L_t,A_t,L_i,A_i,..."""
+    mcp, pip, dip, tip = (k[:, FINGERS[:, j]] for j in range(4))   # mỗi cái (N,5,2)
+    L = np.linalg.norm(tip - mcp, axis=-1)   # (đã chuẩn hoá trong normalize_xy)
+    A = angle_batch(pip - mcp, dip - pip)    # nhỏ → thẳng
+    return np.stack([L, A], axis=-1).reshape(len(k), -1)
 
-def pairwise_features(k):
+def pairwise_features_batch(k):
     # khoảng cách/tỷ lệ hay dùng
-    def d(i,j): return float(np.linalg.norm(k[i]-k[j]))
-    feats = []
-    feats += [d(8,12), d(4,8), d(4,12), d(8,0), d(12,0)]  # index-mid gap, thumb-index/mid, index-wrist, mid-wrist
-    feats = [f for f in feats]
-    return feats
+    return np.linalg.norm(k[:, PAIRS[:, 0]] - k[:, PAIRS[:, 1]], axis=-1)   # (N,5)
 
-def extract_features(kps_xy):
+def extract_features_batch(kps):
     """
-    Input: kps_xy (21,2) (pixel). Output: 1D vector ~ 21*2 raw + 5*2 metrics + pairwise.
+    Input: kps (N,21,2) (pixel). Output: (N,57) float32 = 21*2 raw + 5*2 metrics + 5 pairwise.
     """
-    k = normalize_xy(kps_xy)             # (21,2) đã chuẩn hoá
-    raw = k.reshape(-1)                  # 42 dims
-
-    # độ dài + góc tại PIP của 5 ngón
-    L_t, A_t = finger_metrics(k, IDX["thumb"])
-    L_i, A_i = finger_metrics(k, IDX["index"])
-    L_m, A_m = finger_metrics(k, IDX["middle"])
-    L_r, A_r = finger_metrics(k, IDX["ring"])
-    L_p, A_p = finger_metrics(k, IDX["pinky"])
-    metrics = np.array([L_t,A_t,L_i,A_i,L_m,A_m,L_r,A_r,L_p,A_p], dtype=np.float32)
+    kps = np.asarray(kps)
+    if kps.ndim != 3 or kps.shape[1:] != (21, 2):
+        raise ValueError(f"Expected keypoints of shape (N,21,2), got {kps.shape}")
+    if len(kps) == 0:
+        return np.empty((0, N_FEATURES), dtype=np.float32)
 
-    pw = np.array(pairwise_features(k), dtype=np.float32)
+    k = normalize_xy_batch(kps)                      # (N,21,2) đã chuẩn hoá
+    return np.concatenate([
+        k.reshape(len(k), -1),                       # 42 dims
+        finger_metrics_batch(k),                     # 10 dims
+        pairwise_features_batch(k),                  # 5 dims
+    ], axis=1).astype(np.float32)
 
-    return np.concatenate([raw, metrics, pw], axis=0)   # ~42 + 10 + 5 = 57 dims
+def normalize_xy(kps):
+    return normalize_xy_batch(np.asarray(kps)[None])[0]  # (21,2)
 
+def extract_features(kps_xy):
+    """
+    Input: kps_xy (21,2) (pixel). Output: (57,) — wrapper 1 mẫu của extract_features_batch.
+    """
+    return extract_features_batch(np.asarray(kps_xy)[None])[0]
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Flat-array forest evaluator cho model RandomForest (Calibrated sigmoid)
+
+Export offline: gộp toàn bộ cây của mọi fold trong CalibratedClassifierCV (3 × 400 cây)
++ các sigmoid calibrator thành vài mảng NumPy liên tục, rồi duyệt tất cả cây cùng lúc
+bằng phép toán vector (không gọi sklearn khi serve).
+
+Mỗi node nén vào 1 int64 → mỗi bước duyệt chỉ 1 lần đọc bộ nhớ / cây:
+    [ threshold float32 (dạng int so sánh được) | feature 8 bit | offset con phải 24 bit ]
+Con trái luôn là node + 1 (thứ tự depth-first của sklearn); lá có threshold = -inf, offset 0
+→ đứng yên. Cây đã tới lá bị loại khỏi tập đang duyệt nên các mức sâu chỉ tốn cho vài cây.
+
+Hiệu năng — mục tiêu < SINGLE_SAMPLE_TARGET_MS (1 ms) / mẫu CHƯA đạt với model hiện tại:
+    3 × 400 cây, sâu tối đa 25, 26 class: apply ~0.8–0.9 ms + gom lá / calibrate ~0.25 ms
+    → ~1.0–1.3 ms / mẫu (sklearn predict_proba 1 mẫu: hàng chục ms). Thời gian chủ yếu là đọc
+    ngẫu nhiên bộ nhớ (1200 cây × mỗi mức sâu); tách mảng node hay duyệt 2 mức / bước không nhanh
+    hơn. Muốn dưới 1 ms cần model nhỏ hơn (ít cây / max_depth thấp hơn), export sẽ báo khi chưa đạt.
+
+Dùng:
+    python flat_forest.py rf_mediapipe_feature_calibrated.pkl rf_flat.npz
+    (sau khi export sẽ kiểm tra sai số so với sklearn + đo latency 1 mẫu)
+"""
+
+import io
+import struct
+import sys
+import time
+import zipfile
+import numpy as np
+
+FLAT_FORMAT_VERSION = 2
+FEATURE_BITS, OFFSET_BITS = 8, 24
+OFFSET_MASK = (1 << OFFSET_BITS) - 1
+FEATURE_MASK = (1 << FEATURE_BITS) - 1
+SINGLE_SAMPLE_TARGET_MS = 1.0   # mục tiêu của request; model 3×400 cây hiện tại chưa đạt (xem docstring)
+
+
+def _sortable(values):
+    """float32 → int64 cùng thứ tự (so sánh float bằng phép so sánh số nguyên); -0.0 coi như 0.0."""
+    bits = (np.asarray(values, dtype=np.float32) + np.float32(0.0)).view(np.int32).astype(np.int64)
+    return np.where(bits >= 0, bits, bits ^ 0x7FFFFFFF)
+
+
+def _threshold_f32(threshold):
+    """float64 → float32 làm tròn xuống: với x float32, x <= t64 ⇔ x <= t32 (khớp đúng sklearn)."""
+    t32 = threshold.astype(np.float32)
+    up = t32.astype(np.float64) > threshold
+    t32[up] = np.nextafter(t32[up], np.float32(-np.inf))
+    return t32
+
+
+def _forest_of(clf):
+    """→ (list[(forest, a (C,), b (C,))], classes); calibrator=None → a,b = None."""
+    if hasattr(clf, "calibrated_classifiers_"):
+        classes = np.asarray(clf.classes_)
+        if len(classes) == 2:
+            raise ValueError("Binary calibrated models are not supported")
+        folds = []
+        for cc in clf.calibrated_classifiers_:
+            if cc.method != "sigmoid":
+                raise ValueError(f"Unsupported calibration method: {cc.method}")
+            if not np.array_equal(cc.estimator.classes_, classes):
+                raise ValueError("Every calibration fold must see all classes")
+            a = np.array([cal.a_ for cal in cc.calibrators], dtype=np.float64)
+            b = np.array([cal.b_ for cal in cc.calibrators], dtype=np.float64)
+            folds.append((cc.estimator, a, b))
+        return folds, classes
+    if hasattr(clf, "estimators_"):
+        return [(clf, None, None)], np.asarray(clf.classes_)
+    raise ValueError(f"Unsupported model type: {type(clf).__name__}")
+
+
+def compile_forest(clf):
+    """sklearn forest / CalibratedClassifierCV(forest, sigmoid) → dict các mảng phẳng."""
+    folds, classes = _forest_of(clf)
+    nodes, leaf_id, leaf_values = [], [], []
+    roots, tree_fold, n_nodes, n_leaves, depth = [], [], 0, 0, 0
+
+    for f, (forest, _, _) in enumerate(folds):
+        for est in forest.estimators_:
+            t = est.tree_
+            is_leaf = t.children_left == -1
+            idx = np.arange(t.node_count)
+            if not np.array_equal(t.children_left[~is_leaf], idx[~is_leaf] + 1):
+                raise ValueError("Trees must be built depth-first (left child = node + 1)")
+            if t.n_features >= 1 << FEATURE_BITS:
+                raise ValueError(f"At most {1 << FEATURE_BITS} features are supported")
+            offset = np.where(is_leaf, 0, t.children_right - idx).astype(np.int64)
+            if offset.max() > OFFSET_MASK:
+                raise ValueError("Tree too large for the packed node format")
+            threshold = np.where(is_leaf, -np.inf, _threshold_f32(t.threshold))
+            feature = np.where(is_leaf, 0, t.feature).astype(np.int64)
+            nodes.append((_sortable(threshold) << 32) | (feature << OFFSET_BITS) | offset)
+            lid = np.full(t.node_count, -1, dtype=np.int32)
+            lid[is_leaf] = np.arange(is_leaf.sum()) + n_leaves
+            leaf_id.append(lid)
+            v = t.value[is_leaf, 0, :]
+            leaf_values.append((v / v.sum(axis=1, keepdims=True)).astype(np.float32))
+            roots.append(n_nodes)
+            tree_fold.append(f)
+            n_nodes += t.node_count
+            n_leaves += int(is_leaf.sum())
+            depth = max(depth, t.max_depth)
+
+    calibrated = folds[0][1] is not None
+    C = len(classes)
+    return {
+        "format_version": np.int32(FLAT_FORMAT_VERSION),
+        "classes": classes.astype(str),
+        "nodes": np.concatenate(nodes),
+        "leaf_id": np.concatenate(leaf_id),
+        "leaf_values": np.concatenate(leaf_values),
+        "roots": np.asarray(roots, dtype=np.int64),
+        "tree_fold": np.asarray(tree_fold, dtype=np.int32),
+        "max_depth": np.int32(depth),
+        "calib_a": np.stack([a for _, a, _ in folds]) if calibrated else np.zeros((0, C)),
+        "calib_b": np.stack([b for _, _, b in folds]) if calibrated else np.zeros((0, C)),
+    }
+
+
+ALIGN = 64
+ZIP_PAD_EXTRA_ID = 0xD935     # extra field padding (giống zipalign)
+
+
+def save_npz_aligned(path, arrays):
+    """
+    Như np.savez (không nén) nhưng dữ liệu từng mảng bắt đầu ở offset chia hết cho ALIGN
+    → np.memmap trả về mảng aligned (.take trên mảng lệch alignment chậm hơn vài lần).
+    """
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as zf:
+        for name, value in arrays.items():
+            buf = io.BytesIO()
+            np.lib.format.write_array(buf, np.asanyarray(value), allow_pickle=False)
+            data = buf.getvalue()
+            info = zipfile.ZipInfo(f"{name}.npy", date_time=(1980, 1, 1, 0, 0, 0))
+            # header .npy đã được numpy pad tới bội số 64 → chỉ cần căn đầu header .npy
+            start = zf.fp.tell() + 30 + len(info.filename) + 4
+            pad = -start % ALIGN
+            info.extra = struct.pack("<HH", ZIP_PAD_EXTRA_ID, pad) + b"\0" * pad
+            zf.writestr(info, data)
+
+
+def _mmap_npz(path, mode="r"):
+    """
+    np.load bỏ qua mmap_mode với .npz → tự tìm offset từng .npy trong zip (ZIP_STORED) rồi np.memmap.
+    Nhiều worker process map cùng file → dùng chung page cache thay vì mỗi process 1 bản copy.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} is compressed; cannot memory-map {path}")
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            with zf.open(info) as f:
+                version = np.lib.format.read_magic(f)
+                read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                               else np.lib.format.read_array_header_2_0)
+                shape, fortran, dtype = read_header(f)
+                header_len = f.tell()
+                if not shape or 0 in shape:                  # memmap không nhận mảng 0-d / rỗng
+                    f.seek(0)
+                    arrays[name] = np.lib.format.read_array(f)
+                    continue
+            # local file header: 30 bytes + tên file + extra field
+            with open(path, "rb") as raw:
+                raw.seek(info.header_offset + 26)
+                name_len, extra_len = struct.unpack("<HH", raw.read(4))
+            offset = info.header_offset + 30 + name_len + extra_len + header_len
+            arr = np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=shape,
+                            order="F" if fortran else "C")
+            # file cũ (np.savez) có thể lệch alignment → copy vào RAM thay vì duyệt mảng lệch
+            arrays[name] = arr if offset % dtype.alignment == 0 else np.array(arr)
+    return arrays
+
+
+class FlatForestClassifier:
+    """Evaluator thay thế cho clf sklearn: có `classes_` và `predict_proba(X)`."""
+
+    def __init__(self, arrays):
+        if int(arrays["format_version"]) != FLAT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported flat forest format {int(arrays['format_version'])}; "
+                             "re-export with: python flat_forest.py <model.pkl> <out.npz>")
+        self.classes_ = np.asarray(arrays["classes"], dtype=object)
+        # memmap → ndarray thường (cùng bộ nhớ, không copy): .take trên subclass memmap chậm hơn nhiều
+        arrays = {k: np.asarray(v) for k, v in arrays.items()}
+        self.nodes = arrays["nodes"]
+        self.leaf_id = arrays["leaf_id"]
+        self.leaf_values = arrays["leaf_values"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"])
+        self.calib_a = arrays["calib_a"]
+        self.calib_b = arrays["calib_b"]
+        self.single_sample_ms = float(arrays["single_sample_ms"]) if "single_sample_ms" in arrays else None
+        # các cây của 1 fold nằm liên tục → trung bình theo fold bằng reduceat
+        tree_fold = arrays["tree_fold"]
+        self.n_folds = int(tree_fold.max()) + 1
+        self._fold_starts = np.searchsorted(tree_fold, np.arange(self.n_folds))
+        self._fold_sizes = np.bincount(tree_fold, minlength=self.n_folds)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """mmap_mode="r" → map thẳng các mảng trong .npz (save_npz_aligned) thay vì copy vào RAM."""
+        if mmap_mode:
+            return cls(_mmap_npz(path, mmap_mode))
+        with np.load(path, allow_pickle=False) as z:
+            return cls({k: z[k] for k in z.files})
+
+    def apply(self, X):
+        """X (n, d) → chỉ số lá (n, n_trees), duyệt mọi cây song song."""
+        X = np.asarray(X, dtype=np.float32)
+        n, d = X.shape
+        T = len(self.roots)
+        xs = _sortable(X).reshape(-1)
+        node = np.tile(self.roots, n)                               # (n*T,) node hiện tại
+        base = None if n == 1 else np.repeat(np.arange(n, dtype=np.int64) * d, T)
+        out = np.empty_like(node)
+        ids = None                                                  # vị trí (trong out) còn đang duyệt
+        for _ in range(self.max_depth):
+            w = self.nodes.take(node)
+            feat = (w >> OFFSET_BITS) & FEATURE_MASK
+            step = w & OFFSET_MASK                                  # sang phải: + offset; lá: 0
+            step[xs.take(feat if base is None else feat + base) <= (w >> 32)] = 1   # sang trái: + 1
+            moving = step != 0
+            n_moving = np.count_nonzero(moving)
+            if n_moving * 4 < len(node) * 3:                        # >25% đã tới lá → thu gọn
+                if ids is None:
+                    ids = np.arange(len(node))
+                out[ids[~moving]] = node[~moving]
+                if not n_moving:
+                    break
+                ids, node, step = ids[moving], node[moving], step[moving]
+                if base is not None:
+                    base = base[moving]
+            node += step
+        if ids is None:
+            out[:] = node
+        else:
+            out[ids] = node
+        return self.leaf_id.take(out).reshape(n, T)
+
+    def forest_proba(self, X):
+        """Xác suất chưa calibrate của từng fold → (n, n_folds, n_classes)."""
+        vals = self.leaf_values[self.apply(X)]                      # (n, T, C)
+        sums = np.add.reduceat(vals, self._fold_starts, axis=1, dtype=np.float64)
+        return sums / self._fold_sizes[None, :, None]
+
+    def predict_proba(self, X):
+        p = self.forest_proba(X)
+        if not len(self.calib_a):
+            return p[:, 0]
+        # sigmoid calibration như sklearn: expit(-(a*p + b)), rồi chuẩn hoá từng fold
+        proba = 1.0 / (1.0 + np.exp(self.calib_a * p + self.calib_b))
+        denom = proba.sum(axis=2, keepdims=True)
+        proba = np.divide(proba, denom, out=np.full_like(proba, 1 / proba.shape[2]), where=denom != 0)
+        proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+        return proba.mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def single_sample_ms(flat, X, n=100):
+    """Latency trung bình predict_proba 1 mẫu (ms), lấy lần đo tốt nhất trong 3 lượt."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for x in X[:n]:
+            flat.predict_proba(x[None])
+        best = min(best, (time.perf_counter() - start) / min(n, len(X)) * 1000)
+    return best
+
+
+def export(model_path, out_path, n_check=500):
+    from joblib import load
+    clf = load(model_path)
+    arrays = compile_forest(clf)
+    flat = FlatForestClassifier(arrays)
+
+    # kiểm tra sai số so với sklearn trên input ngẫu nhiên (model train trên feature đã StandardScaler)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n_check, clf.n_features_in_)).astype(np.float32)
+    err = np.abs(flat.predict_proba(X) - clf.predict_proba(X)).max()
+    latency = single_sample_ms(flat, X)
+    arrays["single_sample_ms"] = np.float64(latency)   # classifier_service log lại khi load
+    save_npz_aligned(out_path, arrays)
+
+    print(f"💾 Exported {len(flat.roots)} trees ({len(flat.nodes):,} nodes, "
+          f"{len(flat.leaf_values):,} leaves) → {out_path}")
+    print(f"✅ max |Δproba| vs sklearn = {err:.2e} | single-sample latency ≈ {latency:.2f} ms")
+    if latency > SINGLE_SAMPLE_TARGET_MS:
+        print(f"❌ KHÔNG đạt mục tiêu < {SINGLE_SAMPLE_TARGET_MS} ms/mẫu ({latency:.2f} ms trên máy này) — "
+              f"cần train ít cây hơn hoặc max_depth thấp hơn; độ trễ tỉ lệ với số cây × độ sâu thực tế")
+    return err
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python flat_forest.py <model.pkl> <out.npz>")
+        sys.exit(1)
+    export(*sys.argv[1:])
@@ -2,46 +2,66 @@
 # -*- coding: utf-8 -*-
 """
 Step 2️⃣: Convert raw keypoints (x,y) → normalized 57-dim feature vector
-Input : keypoints_dataset_full_mediapipe.csv
-Output: feature_dataset.csv
+Input : keypoints_dataset_full_mediapipe.csv (hoặc .npstore)
+Output: feature_dataset.csv + feature_dataset.npstore
 """
 
 import pandas as pd
 import numpy as np
+import time
 from tqdm import tqdm
-from features import extract_features 
+from features import extract_features_batch, N_FEATURES, FEATURE_VERSION
+from dataset_store import StoreWriter, iter_chunks
 
 # ======================
 # ⚙️ CONFIG
 # ======================
 CSV_INPUT = "/home/namdang-fdp/Projects/hand-detect-ai/keypoints_dataset_full_mediapipe.csv"
 CSV_OUTPUT = "/home/namdang-fdp/Projects/hand-detect-ai/feature_dataset.csv"
+STORE_OUTPUT = "/home/namdang-fdp/Projects/hand-detect-ai/feature_dataset.npstore"  # None → chỉ ghi CSV
+CHUNK_SIZE = 20_000            # số hàng đọc/ghi mỗi lần → RAM không phụ thuộc kích thước dataset
 
-# ======================
-# 📦 LOAD DATA
-# ======================
-print(f"🚀 Loading raw dataset: {CSV_INPUT}")
-df = pd.read_csv(CSV_INPUT)
-print(f"✅ Loaded {len(df):,} samples")
+X_COLS = [f"x{i+1}" for i in range(21)]
+Y_COLS = [f"y{i+1}" for i in range(21)]
+FEATURE_COLS = [f"f{i+1}" for i in range(N_FEATURES)]
+
+def chunk_to_keypoints(chunk: pd.DataFrame) -> np.ndarray:
+    """Đọc cột x1..x21 / y1..y21 thành 1 mảng (N,21,2) float32."""
+    return np.stack([chunk[X_COLS].to_numpy(np.float32),
+                     chunk[Y_COLS].to_numpy(np.float32)], axis=-1)
 
 # ======================
-# 🧩 CONVERT TO FEATURES
+# 🧩 CONVERT TO FEATURES (stream theo chunk)
 # ======================
-rows = []
-for _, row in tqdm(df.iterrows(), total=len(df), desc="Extracting features"):
-    label = row["label"]
-    # Tạo mảng (21,2)
-    kps = np.array([[row[f"x{i+1}"], row[f"y{i+1}"]] for i in range(21)], dtype=np.float32)
-    feats = extract_features(kps)
-    rows.append([label] + feats.tolist())
+print(f"🚀 Streaming raw dataset: {CSV_INPUT} (chunk={CHUNK_SIZE:,})")
+start = time.time()
+total = 0
+store = StoreWriter(STORE_OUTPUT, FEATURE_COLS, feature_version=FEATURE_VERSION) if STORE_OUTPUT else None
+reader = iter_chunks(CSV_INPUT, CHUNK_SIZE)
+try:
+    for i, chunk in enumerate(tqdm(reader, desc="Extracting features", unit="chunk")):
+        feats = extract_features_batch(chunk_to_keypoints(chunk))
+        labels = chunk["label"].to_numpy()
+        out = pd.DataFrame(feats, columns=FEATURE_COLS)
+        out.insert(0, "label", labels)
+        out.to_csv(CSV_OUTPUT, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+        if store is not None:
+            store.append(feats, labels)
+        total += len(out)
+except BaseException:
+    if store is not None:
+        store.abort()   # không để lại store dở dang trông như hoàn chỉnh
+    raise
+if store is not None:
+    store.close()
+duration = time.time() - start
 
 # ======================
-# 💾 SAVE FEATURE CSV
+# 💾 SUMMARY
 # ======================
-cols = ["label"] + [f"f{i+1}" for i in range(len(rows[0]) - 1)]
-out_df = pd.DataFrame(rows, columns=cols)
-out_df.to_csv(CSV_OUTPUT, index=False)
-
 print(f"\n💾 Saved normalized feature dataset to:")
 print(f"   {CSV_OUTPUT}")
-print(f"✅ Total samples: {len(out_df):,} | Feature dims: {len(cols)-1}")
+if STORE_OUTPUT:
+    print(f"   {STORE_OUTPUT}")
+print(f"✅ Total samples: {total:,} | Feature dims: {N_FEATURES}")
+print(f"⚡ Throughput: {total/max(duration, 1e-9):,.0f} rows/s ({duration:.1f}s)")
@@ -0,0 +1,86 @@
+# smoothing.py
+"""
+Làm mượt prediction theo thời gian cho stream frame (socket server + demo.py).
+
+- Vote: cửa sổ SMOOTH_WINDOW frame, đếm phiếu tăng/giảm O(1) mỗi frame (thay vì
+  max(set(history), key=history.count) O(window²)).
+- Hoà phiếu → giữ nhãn ổn định trước đó (nếu còn trong nhóm hoà), không thì phiếu gần nhất;
+  không phụ thuộc thứ tự class.
+- EMA xác suất từng class; nhãn ổn định phải có EMA ≥ prob_threshold, ngược lại → UNKNOWN.
+- `changed` chỉ True khi nhãn ổn định hoặc bucket confidence đổi → emit-on-change.
+"""
+from collections import deque
+import numpy as np
+
+UNKNOWN = "UNKNOWN"
+NO_HAND = "NO_HAND"
+
+
+class TemporalSmoother:
+    def __init__(self, window=7, alpha=0.3, prob_threshold=0.45, bucket=0.1):
+        self.window = window
+        self.alpha = alpha
+        self.prob_threshold = prob_threshold
+        self.bucket = bucket
+        self.labels = None          # classes + UNKNOWN + NO_HAND, gán ở frame đầu tiên
+        self.reset()
+
+    def reset(self):
+        self.history = deque()
+        self.counts = None
+        self.ema = None
+        self.stable = None          # index nhãn thắng phiếu ở frame trước
+        self.last = None            # (label, bucket) đã emit gần nhất
+
+    def _bind(self, classes):
+        self.labels = list(classes) + [UNKNOWN, NO_HAND]
+        self.counts = np.zeros(len(self.labels), dtype=np.int64)
+        self.ema = np.zeros(len(classes), dtype=np.float64)
+
+    def _vote(self, idx):
+        if len(self.history) == self.window:
+            self.counts[self.history.popleft()] -= 1
+        self.history.append(idx)
+        self.counts[idx] += 1
+
+    def _winner(self):
+        best = self.counts.max()
+        if self.stable is not None and self.counts[self.stable] == best:
+            return self.stable
+        tied = self.counts == best
+        if tied.sum() == 1:
+            return int(np.argmax(self.counts))
+        return next(i for i in reversed(self.history) if tied[i])
+
+    def update(self, probs, classes):
+        """
+        probs: xác suất class của frame (None → không thấy tay); classes: thứ tự cột của probs.
+        → (label ổn định, confidence EMA, changed).
+        """
+        if self.counts is None:
+            self._bind(classes)
+        n_classes = len(self.ema)
+        if probs is None:
+            self.ema *= 1.0 - self.alpha
+            self._vote(n_classes + 1)                       # NO_HAND
+        else:
+            probs = np.asarray(probs, dtype=np.float64)
+            if not self.history or self.history[-1] == n_classes + 1:
+                self.ema[:] = probs                         # frame đầu / tay vừa xuất hiện lại: khởi tạo EMA
+            else:
+                self.ema += self.alpha * (probs - self.ema)
+            top = int(np.argmax(probs))
+            self._vote(top if probs[top] >= self.prob_threshold else n_classes)   # UNKNOWN
+
+        stable = self.stable = self._winner()
+        if stable < n_classes and self.ema[stable] >= self.prob_threshold:
+            label, conf = self.labels[stable], float(self.ema[stable])
+        elif stable == n_classes + 1:
+            label, conf = NO_HAND, 0.0
+        else:
+            label, conf = UNKNOWN, float(self.ema.max()) if n_classes else 0.0
+
+        key = (label, int(conf / self.bucket) if self.bucket else 0)
+        changed = key != self.last
+        self.last = key
+        return label, conf, changed
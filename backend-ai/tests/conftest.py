@@ -0,0 +1,5 @@
+import os
+import sys
+
+# chạy pytest từ bất kỳ đâu: backend-ai/ (features.py, app/...) nằm trên sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
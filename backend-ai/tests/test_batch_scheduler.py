@@ -0,0 +1,97 @@
+import threading
+import time
+import numpy as np
+import pytest
+
+from app.services.batch_scheduler import MicroBatcher
+
+
+def test_results_return_to_their_callers():
+    batcher = MicroBatcher(lambda X: X * 2, max_batch_size=8, max_wait_ms=5)
+    out = {}
+
+    def call(i):
+        out[i] = batcher(np.array([i, i + 1]), timeout=2)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for i in range(20):
+        np.testing.assert_array_equal(out[i], [2 * i, 2 * i + 2])
+    s = batcher.stats()
+    assert s["items"] == 20 and max(int(k) for k in s["batch_size_histogram"]) <= 8
+
+
+def test_lone_request_does_not_wait_for_max_wait():
+    batcher = MicroBatcher(lambda X: X, max_batch_size=16, max_wait_ms=200)
+    batcher(np.zeros(3), timeout=2)          # khởi động thread
+    start = time.perf_counter()
+    batcher(np.zeros(3), timeout=2)
+    assert time.perf_counter() - start < 0.1
+
+
+def test_errors_propagate_to_every_caller():
+    def boom(X):
+        raise RuntimeError("boom")
+
+    batcher = MicroBatcher(boom)
+    with pytest.raises(RuntimeError, match="boom"):
+        batcher.submit(np.zeros(2)).result(timeout=2)
+
+
+def test_bad_row_fails_its_batch_but_not_the_worker():
+    gate = threading.Event()
+
+    def fn(X):
+        gate.wait(2)
+        return X * 2
+
+    batcher = MicroBatcher(fn, max_batch_size=8)
+    first = batcher.submit(np.zeros(3))               # giữ worker bận để 2 hàng sau vào cùng batch
+    time.sleep(0.05)
+    ok, bad = batcher.submit(np.zeros(3)), batcher.submit(np.zeros(5))
+    gate.set()
+    first.result(timeout=2)
+    for fut in (ok, bad):
+        with pytest.raises(ValueError):               # np.stack lỗi → cả batch nhận exception
+            fut.result(timeout=2)
+    np.testing.assert_array_equal(batcher(np.ones(3), timeout=2), [2, 2, 2])   # thread vẫn sống
+
+
+def test_bounded_wait_raises_timeout_and_skips_cancelled_rows():
+    gate = threading.Event()
+    seen = []
+
+    def slow(X):
+        gate.wait(2)
+        seen.append(len(X))
+        return X
+
+    batcher = MicroBatcher(slow, max_batch_size=1)
+    first = batcher.submit(np.zeros(1))               # giữ worker bận
+    with pytest.raises(TimeoutError):
+        batcher(np.zeros(1), timeout=0.05)
+    gate.set()
+    first.result(timeout=2)
+    batcher(np.zeros(1), timeout=2)
+    assert seen == [1, 1]                             # hàng đã timeout không được chạy
+
+
+def test_malformed_batch_output_does_not_kill_the_worker():
+    outputs = iter([None, np.zeros((2, 1)), np.ones((1, 1))])
+    batcher = MicroBatcher(lambda X: next(outputs))
+    with pytest.raises(TypeError):
+        batcher(np.zeros(1), timeout=2)               # None không có len()
+    with pytest.raises(ValueError, match="2 rows for 1"):
+        batcher(np.zeros(1), timeout=2)
+    np.testing.assert_array_equal(batcher(np.zeros(1), timeout=2), [1])
+
+
+def test_close_finishes_queued_rows_and_stops_thread():
+    batcher = MicroBatcher(lambda X: X + 1, max_batch_size=4, max_wait_ms=1)
+    fut = batcher.submit(np.zeros(2))
+    batcher.close()
+    np.testing.assert_array_equal(fut.result(timeout=2), [1, 1])
+    assert not batcher._thread.is_alive()
@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_store import META_FILE, StoreWriter, convert_csv, iter_chunks, load_frame, load_store
+
+
+def test_convert_csv_roundtrip(tmp_path):
+    csv = tmp_path / "feats.csv"
+    df = pd.DataFrame({"label": list("ABAC"), "f1": [0.1, 0.2, 0.3, 0.4], "f2": [1.0, 2.0, 3.0, 4.0]})
+    df.to_csv(csv, index=False)
+
+    store = str(tmp_path / "feats.npstore")
+    assert convert_csv(str(csv), store, chunksize=3, feature_version=1) == 4
+
+    X, labels, meta = load_store(store)
+    np.testing.assert_allclose(X, df[["f1", "f2"]].to_numpy(np.float32))
+    assert list(labels) == list("ABAC")
+    assert meta["columns"] == ["f1", "f2"] and meta["feature_version"] == 1
+    pd.testing.assert_frame_equal(load_frame(store), df.astype({"f1": np.float32, "f2": np.float32}))
+    assert sum(len(c) for c in iter_chunks(store, 3)) == 4
+
+    with pytest.raises(ValueError):
+        load_frame(store, feature_version=2)
+
+
+def test_convert_header_only_csv_gives_empty_store(tmp_path):
+    csv = tmp_path / "header.csv"
+    csv.write_text("label,f1,f2\n")
+    store = str(tmp_path / "header.npstore")
+    assert convert_csv(str(csv), store) == 0
+    X, labels, meta = load_store(store)
+    assert X.shape == (0, 2) and len(labels) == 0 and meta["columns"] == ["f1", "f2"]
+
+
+def test_convert_rejects_empty_or_unlabeled_csv(tmp_path):
+    empty = tmp_path / "empty.csv"
+    empty.write_text("")
+    with pytest.raises(ValueError, match="empty"):
+        convert_csv(str(empty), str(tmp_path / "a.npstore"))
+
+    unlabeled = tmp_path / "unlabeled.csv"
+    unlabeled.write_text("f1,f2\n1,2\n")
+    with pytest.raises(ValueError, match="label"):
+        convert_csv(str(unlabeled), str(tmp_path / "b.npstore"))
+
+
+def test_failed_write_leaves_no_loadable_store(tmp_path):
+    store = str(tmp_path / "partial.npstore")
+    with StoreWriter(store, ["f1"]) as writer:
+        writer.append(np.ones((2, 1)), ["A", "B"])
+    assert load_store(store)[2]["n_rows"] == 2
+
+    with pytest.raises(RuntimeError):
+        with StoreWriter(store, ["f1"]) as writer:       # ghi đè store cũ rồi lỗi giữa chừng
+            writer.append(np.ones((3, 1)), ["A", "B", "C"])
+            raise RuntimeError("boom")
+    assert not os.path.exists(os.path.join(store, META_FILE))
+    with pytest.raises(FileNotFoundError):
+        load_store(store)
@@ -0,0 +1,99 @@
+from math import atan2, cos, sin
+import numpy as np
+import pytest
+
+from features import (
+    N_FEATURES, extract_features, extract_features_batch, normalize_xy, normalize_xy_batch,
+)
+
+ANGLE_COLS = list(range(43, 52, 2))   # A_t, A_i, A_m, A_r, A_p trong block metrics (42..51)
+
+
+# =====================================
+# 📐 REFERENCE: bản per-sample gốc (trước khi vector hoá), giữ nguyên công thức
+# =====================================
+def _palm_size(kps):
+    w = kps[0]
+    return float(np.mean([np.linalg.norm(kps[i] - w) for i in (5, 9, 13, 17)]) + 1e-6)
+
+
+def _angle(a, b):
+    na, nb = np.linalg.norm(a), np.linalg.norm(b)
+    if na < 1e-6 or nb < 1e-6:
+        return 180.0
+    v = np.clip(np.dot(a, b) / (na * nb), -1.0, 1.0)
+    return float(np.degrees(np.arccos(v)))
+
+
+def _normalize_xy(kps):
+    k = kps.copy().astype(np.float32)
+    k -= k[0]
+    k /= _palm_size(k)
+    theta = -atan2(k[9][1], k[9][0])
+    c, s = cos(theta), sin(theta)
+    R = np.array([[c, -s], [s, c]], dtype=np.float32)
+    return (R @ k.T).T
+
+
+def _extract_features(kps_xy):
+    k = _normalize_xy(kps_xy)
+    metrics = []
+    for f in ([1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12], [13, 14, 15, 16], [17, 18, 19, 20]):
+        mcp, pip, dip, tip = (k[i] for i in f)
+        metrics += [np.linalg.norm(tip - mcp), _angle(pip - mcp, dip - pip)]
+    d = lambda i, j: float(np.linalg.norm(k[i] - k[j]))
+    pw = [d(8, 12), d(4, 8), d(4, 12), d(8, 0), d(12, 0)]
+    return np.concatenate([k.reshape(-1), np.array(metrics, np.float32), np.array(pw, np.float32)])
+
+
+def _random_hands(n, seed=0):
+    """Bàn tay giả trong khung 200×200 (LANDMARK_SCALE): cổ tay + 20 điểm quanh đó."""
+    rng = np.random.default_rng(seed)
+    wrist = rng.uniform(60, 140, size=(n, 1, 2))
+    return (wrist + rng.normal(0, 25, size=(n, 21, 2))).astype(np.float32)
+
+
+# =====================================
+# ✅ TESTS
+# =====================================
+def test_batch_matches_per_sample_reference():
+    kps = _random_hands(500)
+    got = extract_features_batch(kps)
+    ref = np.stack([_extract_features(k) for k in kps])
+
+    assert got.shape == (500, N_FEATURES) and got.dtype == np.float32
+    other = [c for c in range(N_FEATURES) if c not in ANGLE_COLS]
+    np.testing.assert_allclose(got[:, other], ref[:, other], rtol=1e-4, atol=1e-4)
+    # góc PIP: arccos kém ổn định gần 0° → sai khác float32 nhỏ, không được lớn hơn 0.05°
+    np.testing.assert_allclose(got[:, ANGLE_COLS], ref[:, ANGLE_COLS], atol=0.05)
+
+
+def test_single_sample_wrapper_matches_batch():
+    kps = _random_hands(8, seed=1)
+    batch = extract_features_batch(kps)
+    for k, row in zip(kps, batch):
+        np.testing.assert_array_equal(extract_features(k), row)
+    np.testing.assert_array_equal(normalize_xy(kps[0]), normalize_xy_batch(kps[:1])[0])
+
+
+def test_invariant_to_translation_scale_rotation():
+    kps = _random_hands(16, seed=2)
+    theta = 0.7
+    R = np.array([[cos(theta), -sin(theta)], [sin(theta), cos(theta)]], dtype=np.float32)
+    moved = (kps @ R.T) * 1.8 + np.float32(35.0)
+    np.testing.assert_allclose(extract_features_batch(moved), extract_features_batch(kps), atol=2e-3)
+
+
+def test_degenerate_finger_angle_is_180():
+    kps = _random_hands(1, seed=3)
+    kps[0, 6] = kps[0, 5]               # index PIP trùng MCP → vector suy biến
+    assert extract_features_batch(kps)[0, 45] == pytest.approx(180.0)
+    assert _extract_features(kps[0])[45] == pytest.approx(180.0)
+
+
+def test_empty_and_bad_shapes():
+    assert extract_features_batch(np.empty((0, 21, 2))).shape == (0, N_FEATURES)
+    with pytest.raises(ValueError):
+        extract_features_batch(np.zeros((3, 20, 2)))
+    with pytest.raises(ValueError):
+        extract_features_batch(np.zeros((21, 2)))
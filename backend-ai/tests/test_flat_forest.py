@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import RandomForestClassifier
+
+from flat_forest import FlatForestClassifier, _mmap_npz, compile_forest, save_npz_aligned
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(4, 57)) * 1.5
+    y = rng.integers(0, 4, 600)
+    X = (centers[y] + rng.normal(size=(600, 57))).astype(np.float32)
+    return X, np.array(list("ABCD"))[y]
+
+
+@pytest.fixture(scope="module")
+def calibrated(data):
+    X, y = data
+    rf = RandomForestClassifier(n_estimators=15, max_depth=12, random_state=0)
+    return CalibratedClassifierCV(rf, method="sigmoid", cv=3).fit(X, y)
+
+
+def test_calibrated_forest_matches_sklearn(data, calibrated):
+    X, _ = data
+    flat = FlatForestClassifier(compile_forest(calibrated))
+    np.testing.assert_allclose(flat.predict_proba(X), calibrated.predict_proba(X), atol=1e-7)
+    np.testing.assert_array_equal(flat.predict(X), calibrated.predict(X))
+    # 1 mẫu đi qua cùng đường với batch
+    np.testing.assert_allclose(flat.predict_proba(X[:1]), calibrated.predict_proba(X[:1]), atol=1e-7)
+
+
+def test_plain_forest_and_threshold_ties(data):
+    X, y = data
+    rf = RandomForestClassifier(n_estimators=10, random_state=1).fit(X, y)
+    flat = FlatForestClassifier(compile_forest(rf))
+    # input nằm đúng trên threshold: float64 → float32 phải làm tròn xuống để giữ x <= t như sklearn
+    t = rf.estimators_[0].tree_
+    X_tie = np.repeat(X[:1], 20, axis=0)
+    internal = np.flatnonzero(t.children_left != -1)[:20]
+    X_tie[np.arange(len(internal)), t.feature[internal]] = t.threshold[internal].astype(np.float32)
+    for Z in (X, X_tie):
+        np.testing.assert_allclose(flat.predict_proba(Z), rf.predict_proba(Z), atol=1e-7)
+
+
+def test_aligned_npz_memory_maps(tmp_path, data, calibrated):
+    X, _ = data
+    path = str(tmp_path / "rf_flat.npz")
+    save_npz_aligned(path, compile_forest(calibrated))
+
+    arrays = _mmap_npz(path)
+    assert all(a.flags.aligned for a in arrays.values())
+    assert isinstance(arrays["nodes"], np.memmap)
+    with np.load(path) as z:                       # vẫn là .npz hợp lệ
+        np.testing.assert_array_equal(z["nodes"], arrays["nodes"])
+
+    mapped = FlatForestClassifier.load(path, mmap_mode="r")
+    loaded = FlatForestClassifier.load(path)
+    np.testing.assert_allclose(mapped.predict_proba(X), calibrated.predict_proba(X), atol=1e-7)
+    np.testing.assert_array_equal(mapped.predict_proba(X), loaded.predict_proba(X))
+
+
+def test_rejects_other_format_versions(calibrated):
+    arrays = compile_forest(calibrated)
+    arrays["format_version"] = np.int32(1)
+    with pytest.raises(ValueError, match="re-export"):
+        FlatForestClassifier(arrays)
@@ -0,0 +1,50 @@
+import base64
+import cv2
+import numpy as np
+
+from app.services.frame_codec import (
+    FRAME_HEADER, FRAME_MAGIC, decode_base64_image, decode_binary_frame, decode_frame, parse_frame_header,
+)
+
+
+def _jpeg():
+    img = np.zeros((24, 32, 3), np.uint8)
+    img[:, 16:] = (0, 0, 255)
+    ok, buf = cv2.imencode(".jpg", img)
+    assert ok
+    return buf.tobytes()
+
+
+def test_header_roundtrip_and_absent_header():
+    data = FRAME_HEADER.pack(FRAME_MAGIC, 123456, 640, 480) + b"payload"
+    assert parse_frame_header(data) == ({"seq": 123456, "width": 640, "height": 480}, FRAME_HEADER.size)
+    assert parse_frame_header(b"\xff\xd8" + b"x" * 20) == ({}, 0)
+    assert parse_frame_header(FRAME_MAGIC + b"\x00") == ({}, 0)       # ngắn hơn header
+
+
+def test_binary_frame_with_and_without_header():
+    jpeg = _jpeg()
+    img, meta = decode_binary_frame(jpeg)
+    assert img.shape == (24, 32, 3) and meta == {}
+
+    framed = bytearray(FRAME_HEADER.pack(FRAME_MAGIC, 7, 32, 24) + jpeg)
+    for data in (bytes(framed), framed, memoryview(framed)):
+        img, meta = decode_frame(data)
+        assert img.shape == (24, 32, 3) and meta["seq"] == 7
+
+
+def test_base64_data_url_matches_binary():
+    jpeg = _jpeg()
+    url = "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()
+    img, meta = decode_frame(url)
+    np.testing.assert_array_equal(img, decode_binary_frame(jpeg)[0])
+    assert meta == {}
+
+
+def test_invalid_payloads_decode_to_none():
+    assert decode_base64_image("no comma") is None
+    assert decode_base64_image("data:image/jpeg;base64,!!!") is None
+    assert decode_frame(FRAME_HEADER.pack(FRAME_MAGIC, 1, 0, 0)) == (None, {"seq": 1, "width": 0, "height": 0})
+    assert decode_frame(b"not an image")[0] is None
+    assert decode_frame(None) == (None, {})
+    assert decode_frame({"frame": 1}) == (None, {})
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from app.services.frame_codec import FRAME_HEADER, FRAME_MAGIC
+from app.services.keypoints_service import KeypointsError, N_POINTS, parse_keypoints
+
+
+def _hand(offset=0.0):
+    rng = np.random.default_rng(0)
+    return (rng.uniform(0.2, 0.8, (N_POINTS, 2)) + offset).tolist()
+
+
+def test_single_hand_formats_agree():
+    hand = _hand()
+    expected = np.asarray(hand)[None]
+    for body in (hand,
+                 [[x, y, 0.1] for x, y in hand],
+                 [v for p in hand for v in p],
+                 [{"x": x, "y": y, "z": 0.0} for x, y in hand],
+                 {"keypoints": hand, "seq": 7}):
+        kps, batched, _ = parse_keypoints(body)
+        assert not batched
+        np.testing.assert_allclose(kps, expected)
+    assert parse_keypoints({"keypoints": hand, "seq": 7})[2] == {"seq": 7}
+
+
+def test_batch_json_and_packed_bytes():
+    hands = [_hand(), _hand(0.1)]
+    kps, batched, _ = parse_keypoints(hands)
+    assert batched and kps.shape == (2, N_POINTS, 2)
+    kps, batched, _ = parse_keypoints([[{"x": x, "y": y} for x, y in h] for h in hands])
+    assert batched and kps.shape == (2, N_POINTS, 2)
+
+    packed = FRAME_HEADER.pack(FRAME_MAGIC, 42, 0, 0) + np.asarray(hands, "<f4").tobytes()
+    kps, batched, meta = parse_keypoints(packed)
+    assert batched and meta["seq"] == 42
+    np.testing.assert_allclose(kps, hands, atol=1e-6)
+
+
+@pytest.mark.parametrize("body", [
+    {"points": []},
+    [{"x": 1}],
+    [{"x": "a", "y": None}] * N_POINTS,
+    [{"x": 0.5, "y": 0.5}, [1]],
+    [[{"x": 0.5, "y": 0.5}], [[1]]],
+    [[{"x": 0.5}]],
+    [[0.5, 0.5]] * 20,
+    [[0.5, 0.5], [0.5]],
+    [[0.5, 0.5]] * N_POINTS,                  # mọi điểm trùng nhau
+    [[5.0, 0.5]] + _hand()[1:],               # ngoài khoảng chuẩn hoá
+    [[float("nan"), 0.5]] + _hand()[1:],
+    [_hand()] * 300,                          # > KEYPOINTS_MAX_BATCH
+    b"\x00" * 10,
+])
+def test_invalid_input_raises_keypoints_error(body):
+    with pytest.raises(KeypointsError):
+        parse_keypoints(body)
+
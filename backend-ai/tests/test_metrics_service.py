@@ -0,0 +1,89 @@
+import numpy as np
+
+from app.services import metrics_service, offload_service
+
+
+def _lines(text, prefix):
+    return [l for l in text.splitlines() if l.startswith(prefix)]
+
+
+def test_large_counters_keep_full_precision():
+    provider = metrics_service.register_gauges(lambda: {
+        "asl_test_big_total": ("Large counter", 1234567),
+        "asl_test_ratio": ("Float gauge", 0.123456789),
+        "asl_test_labeled_total": ("Labeled counter", {'outcome="a"': 9876543, 'outcome="b"': 2}),
+    })
+    try:
+        text = metrics_service.render_prometheus()
+    finally:
+        metrics_service._gauge_providers.remove(provider)
+
+    assert "asl_test_big_total 1234567" in text
+    assert "asl_test_ratio 0.123456789" in text
+    assert 'asl_test_labeled_total{outcome="a"} 9876543' in text
+    assert "# TYPE asl_test_big_total counter" in text
+    assert "# TYPE asl_test_labeled_total counter" in text
+    assert "# TYPE asl_test_ratio gauge" in text
+    assert "e+" not in text
+
+
+def test_latency_summary_sum_and_quantiles():
+    for ms in range(1, 101):
+        metrics_service.observe("test_entry", "stage", float(ms) * 1e5)
+    text = metrics_service.render_prometheus()
+    labels = 'entry="test_entry",stage="stage"'
+    assert f"asl_stage_latency_ms_sum{{{labels}}} 505000000.0" in text
+    assert f"asl_stage_latency_ms_count{{{labels}}} 100" in text
+    assert len(_lines(text, f"asl_stage_latency_ms{{{labels},quantile=")) == 3
+
+    snap = metrics_service.snapshot()["test_entry"]["stage"]
+    assert snap["count"] == 100 and snap["p50"] == 5050000.0
+
+
+class _FakeWorkers:
+    """Runner giả của app/asgi.py: 2 worker, worker 1 chưa trả lời snapshot nào."""
+    size = 2
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def snapshots(self):
+        return [self._snapshot, None]
+
+
+def _worker_snapshot():
+    return {
+        "pid": 4242,
+        "taken_at": 0.0,
+        "histograms": [(("test_worker", "stage"), np.array([10.0, 20.0]), 2, 30.0)],
+        "gauges": {"asl_test_hits_total": ("Hits", {'outcome="a"': 5}), "asl_test_level": ("Level", 0.5)},
+        "stats": {"test_section": {"size": 4, "hits": 3, "misses": 1, "enabled": True, "hit_ratio": 0.75}},
+    }
+
+
+def test_cpu_worker_snapshots_merge_into_metrics_and_stats(monkeypatch):
+    monkeypatch.setattr(metrics_service, "_stats_providers", {})
+    metrics_service.register_stats(
+        "test_section", lambda: {"size": 4, "hits": 1, "misses": 3, "enabled": False, "hit_ratio": 0.25},
+        config=("size",), derive=lambda s: {"hit_ratio": s["hits"] / max(s["hits"] + s["misses"], 1)})
+    provider = metrics_service.register_gauges(lambda: {"asl_test_hits_total": ("Hits", {'outcome="a"': 1})})
+    metrics_service.observe("test_worker", "stage", 30.0)
+    offload_service.set_runner(_FakeWorkers(_worker_snapshot()))
+    try:
+        text = metrics_service.render_prometheus()
+        stats = metrics_service.stats_snapshot()
+    finally:
+        offload_service.set_runner(None)
+        metrics_service._gauge_providers.remove(provider)
+
+    labels = 'entry="test_worker",stage="stage"'
+    assert f"asl_stage_latency_ms_count{{{labels}}} 3" in text
+    assert f"asl_stage_latency_ms_sum{{{labels}}} 60.0" in text
+    assert f'asl_stage_latency_ms{{{labels},quantile="0.5"}} 20.0' in text
+    assert 'asl_test_hits_total{outcome="a"} 1' in text
+    assert 'asl_test_hits_total{worker="0",outcome="a"} 5' in text
+    assert 'asl_test_level{worker="0"} 0.5' in text
+    assert text.count("# TYPE asl_test_hits_total counter") == 1
+
+    assert stats["test_section"] == {"size": 4, "hits": 4, "misses": 4, "enabled": True, "hit_ratio": 0.5}
+    assert stats["cpu_workers"][0]["pid"] == 4242 and stats["cpu_workers"][1] == {"worker": 1, "pid": None}
@@ -0,0 +1,28 @@
+import numpy as np
+
+from app.services.motion_gate import MotionGate
+
+
+def _hand():
+    return np.random.default_rng(0).uniform(50, 150, (21, 2))
+
+
+def test_still_hand_reuses_until_refresh():
+    gate = MotionGate(threshold=0.05, refresh_every=3)
+    kps = _hand()
+    assert gate.lookup(kps) is None
+    gate.update("A", 0.9)
+    hits = [gate.lookup(kps + 0.01) for _ in range(4)]
+    assert hits[:3] == [("A", 0.9, None)] * 3 and hits[3] is None   # refresh sau 3 frame dùng lại
+    assert gate.reused == 3 and gate.classified == 1
+    assert gate.skip_rate() == 0.75
+
+
+def test_moving_or_lost_hand_forces_classify():
+    gate = MotionGate(threshold=0.05, refresh_every=10)
+    kps = _hand()
+    gate.lookup(kps)
+    gate.update("A", 0.9)
+    assert gate.lookup(kps + np.linspace(0, 40, 42).reshape(21, 2)) is None
+    gate.reset()
+    assert gate.lookup(kps) is None
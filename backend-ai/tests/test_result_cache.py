@@ -0,0 +1,56 @@
+import numpy as np
+
+from app.services import result_cache as rc
+from app.services.result_cache import ENTRY_OVERHEAD, ResultCache, content_key
+
+
+def _kps():
+    return np.zeros((21, 2), np.float32)
+
+
+def test_content_key_is_stable_and_content_based():
+    assert content_key(b"abc") == content_key(bytearray(b"abc"))
+    assert content_key(b"abc") != content_key(b"abd")
+    assert len(content_key(b"")) == 16
+
+
+def test_hit_miss_and_lru_eviction_by_entries():
+    cache = ResultCache(max_entries=2, max_bytes=1 << 20)
+    cache.put("a", (_kps(), "A", 0.9))
+    cache.put("b", (None, "NO_HAND", 0.0))
+    assert cache.get("a")[1] == "A"            # "a" thành mới dùng nhất
+    cache.put("c", (_kps(), "C", 0.8))         # → đẩy "b"
+    assert cache.get("b") is None
+    assert cache.get("c")[1] == "C"
+    s = cache.stats()
+    assert (s["entries"], s["hits"], s["misses"], s["evictions"]) == (2, 2, 1, 1)
+
+
+def test_byte_limit_counts_keypoints_and_replacement():
+    entry = ENTRY_OVERHEAD + _kps().nbytes
+    cache = ResultCache(max_entries=100, max_bytes=2 * entry)
+    for key in "abc":
+        cache.put(key, (_kps(), key.upper(), 0.5))
+    assert cache.stats()["entries"] == 2 and cache.stats()["bytes"] == 2 * entry
+    cache.put("c", (None, "NO_HAND", 0.0))     # ghi đè: bytes trừ entry cũ
+    assert cache.stats()["bytes"] == entry + ENTRY_OVERHEAD
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rc.time, "monotonic", lambda: now[0])
+    cache = ResultCache(max_entries=10, max_bytes=1 << 20, ttl=5)
+    cache.put("a", (None, "NO_HAND", 0.0))
+    now[0] += 4
+    assert cache.get("a") is not None
+    now[0] += 2
+    assert cache.get("a") is None
+    s = cache.stats()
+    assert (s["entries"], s["bytes"], s["expired"]) == (0, 0, 1)
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResultCache(max_entries=0)
+    cache.put("a", (None, "NO_HAND", 0.0))
+    assert cache.get("a") is None
+    assert not cache.stats()["enabled"] and cache.stats()["misses"] == 0
@@ -0,0 +1,58 @@
+import numpy as np
+
+from smoothing import TemporalSmoother, UNKNOWN, NO_HAND
+
+CLASSES = ["A", "B", "C"]
+
+
+def _p(label, conf=0.9):
+    probs = np.full(len(CLASSES), (1.0 - conf) / (len(CLASSES) - 1))
+    probs[CLASSES.index(label)] = conf
+    return probs
+
+
+def _feed(smoother, seq):
+    return [smoother.update(None if x is None else _p(x), CLASSES) for x in seq]
+
+
+def test_single_outlier_does_not_flip_label():
+    s = TemporalSmoother(window=5, alpha=0.5)
+    out = _feed(s, ["A", "A", "A", "B", "A"])
+    assert [label for label, _, _ in out] == ["A"] * 5
+    assert [changed for _, _, changed in out] == [True, False, False, True, True]   # bucket conf đổi
+
+
+def test_emit_only_on_label_or_bucket_change():
+    s = TemporalSmoother(window=3, alpha=0.3, bucket=0.1)
+    out = _feed(s, ["A"] * 6)
+    assert [changed for _, _, changed in out] == [True] + [False] * 5
+
+
+def test_low_confidence_is_unknown_and_missing_hand_is_no_hand():
+    s = TemporalSmoother(window=3, prob_threshold=0.6)
+    for _ in range(3):
+        label, _, _ = s.update(_p("A", 0.4), CLASSES)
+    assert label == UNKNOWN
+    label, conf, _ = _feed(s, [None, None])[-1]
+    assert (label, conf) == (NO_HAND, 0.0)
+
+
+def test_tie_keeps_previous_stable_label():
+    # cửa sổ 4: C C B B → hoà 2-2, "C" đang ổn định → giữ "C" dù index của "B" nhỏ hơn
+    s = TemporalSmoother(window=4, alpha=0.3)
+    out = _feed(s, ["C", "C", "B", "B"])
+    assert out[-1][0] == "C"
+
+
+def test_tie_without_previous_winner_takes_most_recent_vote():
+    # B A C: hoà nhưng giữ "B"; frame 4 đẩy phiếu B ra → hoà A / C / NO_HAND → phiếu gần nhất
+    s = TemporalSmoother(window=3, alpha=0.3)
+    out = _feed(s, ["B", "A", "C", None])
+    assert [label for label, _, _ in out] == ["B", "B", "B", NO_HAND]
+
+
+def test_window_slides():
+    s = TemporalSmoother(window=3, alpha=0.3)
+    out = _feed(s, ["A", "A", "A", "B", "B", "B"])
+    assert [label for label, _, _ in out] == ["A", "A", "A", "A", "B", "B"]
+    assert s.counts.sum() == 3
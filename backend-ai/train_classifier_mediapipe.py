@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 Step 3️⃣: Train RandomForest on normalized 57-dim features
-Input : feature_dataset.csv
+Input : feature_dataset.csv hoặc feature_dataset.npstore
 Output: rf_mediapipe_feature_calibrated.pkl + feature_scaler.pkl
 """
 
@@ -17,11 +17,13 @@ from joblib import dump
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+from dataset_store import load_frame
+from features import FEATURE_VERSION
 
 # ======================
 # ⚙️ CONFIG
 # ======================
-CSV_PATH = "/home/namdang-fdp/Projects/hand-detect-ai/feature_dataset.csv"
+CSV_PATH = "/home/namdang-fdp/Projects/hand-detect-ai/feature_dataset.csv"  # hoặc feature_dataset.npstore
 MODEL_PATH = "/home/namdang-fdp/Projects/hand-detect-ai/rf_mediapipe_feature_calibrated.pkl"
 SCALER_PATH = "/home/namdang-fdp/Projects/hand-detect-ai/feature_scaler.pkl"
 
@@ -29,7 +31,7 @@ SCALER_PATH = "/home/namdang-fdp/Projects/hand-detect-ai/feature_scaler.pkl"
 # 📦 LOAD DATA
 # ======================
 print("🚀 Loading normalized feature dataset...")
-df = pd.read_csv(CSV_PATH)
+df = load_frame(CSV_PATH, feature_version=FEATURE_VERSION)
 
 # 🔹 Giữ lại 26 ký tự A–Z
 exclude = {"space", "nothing", "del"}
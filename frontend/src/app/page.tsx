@@ -11,6 +11,9 @@ import BenchmarkDashboard from "@/components/benchmark";
 
 // ⚙️ Backend Socket URL (Flask-SocketIO server)
 const SOCKET_URL = "http://localhost:8080";
+// 📦 Binary frame header (khớp backend-ai/app/services/frame_codec.py)
+const FRAME_MAGIC = new TextEncoder().encode("ASLF");
+const FRAME_HEADER_SIZE = 12;
 
 export default function Home() {
   const [mode, setMode] = useState<"camera" | "image" | "charts">("camera");
@@ -19,6 +22,8 @@ export default function Home() {
   const [socket, setSocket] = useState<any>(null);
   const videoRef = useRef<HTMLVideoElement>(null);
   const [stream, setStream] = useState<MediaStream | null>(null);
+  const frameSeqRef = useRef(0);
+  const lastLetterRef = useRef<string | null>(null);
 
   // 🎥 Camera states
   const [isCameraActive, setIsCameraActive] = useState(false);
@@ -50,9 +55,14 @@ export default function Home() {
       setCurrentPrediction(data.prediction);
       setConfidence(data.confidence);
 
-      // Nếu độ tin cậy đủ cao => thêm vào text
+      // Server chỉ emit khi nhãn ổn định / bucket confidence đổi → chỉ thêm chữ khi nhãn đổi
       if (data.confidence > 0.5 && data.prediction.length === 1) {
-        setDetectedText((prev) => prev + data.prediction);
+        if (data.prediction !== lastLetterRef.current) {
+          setDetectedText((prev) => prev + data.prediction);
+        }
+        lastLetterRef.current = data.prediction;
+      } else if (data.prediction === "NO_HAND") {
+        lastLetterRef.current = null;   // hạ tay → cho phép lặp lại chữ cái
       }
     });
 
@@ -129,8 +139,23 @@ export default function Home() {
     if (!ctx) return;
 
     ctx.drawImage(video, 0, 0);
-    const frame = canvas.toDataURL("image/jpeg", 0.5);
-    socket.emit("frame", frame);
+    // Gửi JPEG nhị phân (không base64) + header 12 byte: "ASLF" | seq u32 | width u16 | height u16
+    canvas.toBlob(
+      async (blob) => {
+        if (!blob) return;
+        const jpeg = new Uint8Array(await blob.arrayBuffer());
+        const packet = new Uint8Array(FRAME_HEADER_SIZE + jpeg.length);
+        const header = new DataView(packet.buffer);
+        packet.set(FRAME_MAGIC, 0);
+        header.setUint32(4, frameSeqRef.current++, true);
+        header.setUint16(8, canvas.width, true);
+        header.setUint16(10, canvas.height, true);
+        packet.set(jpeg, FRAME_HEADER_SIZE);
+        socket.emit("frame", packet.buffer);
+      },
+      "image/jpeg",
+      0.5,
+    );
   };
 
   // ==========================